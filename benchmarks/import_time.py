@@ -0,0 +1,56 @@
+"""
+Import time benchmark of the data layer entry points.
+Imports every entry module in a fresh interpreter, printing its import time and the heavy ML / plotting
+packages it pulled in. Data-only entry points (statistics, linear models) must not load them, the script exits
+with an error when one of them does.
+
+run from the repository root:
+    python benchmarks/import_time.py
+"""
+import sys
+import os
+import json
+import subprocess
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENTRY_MODULES = ['modules.data.datasets', 'modules.data.preprocessing', 'modules.data.store',
+                 'modules.data.schema', 'modules.data.asc_reader']
+
+# Packages imported only by the code paths that need them
+HEAVY_MODULES = ['tensorflow', 'keras', 'torch', 'sklearn', 'seaborn', 'matplotlib', 'cv2', 'scipy.sparse']
+
+IMPORT_SCRIPT = """
+import sys, time, json
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{'seconds': seconds, 'heavy': [name for name in {heavy!r} if name in sys.modules]}}))
+"""
+
+
+def import_entry(module, repeats=3):
+    # Best of repeats fresh interpreter imports
+    results = []
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, '-c', IMPORT_SCRIPT.format(module=module, heavy=HEAVY_MODULES)],
+                                cwd=REPO_ROOT, check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    return min(result['seconds'] for result in results), results[0]['heavy']
+
+
+def main():
+    failed = []
+    print('%-30s %10s   %s' % ('module', 'import (s)', 'heavy modules loaded'))
+    for module in ENTRY_MODULES:
+        seconds, heavy = import_entry(module)
+        print('%-30s %10.3f   %s' % (module, seconds, ', '.join(heavy) if heavy else '-'))
+        if heavy:
+            failed.append(module)
+    if failed:
+        print('Heavy modules imported by ' + ', '.join(failed))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Ingest and tidying scaling benchmark.
+Parses synthetic EyeLink subjects and tidies growing datasets, printing the cost per trial and per
+subject. Both should stay flat as the data grows, a growing per unit cost means rows are being copied
+again on every append.
+
+run from the repository root:
+    python benchmarks/ingest_scaling.py
+"""
+import sys
+import os
+import io
+import time
+import shutil
+import tempfile
+import warnings
+import contextlib
+import numpy as np
+import pandas as pd
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from modules.data.preprocessing import DataPreprocess
+from modules.data.stim import Stim
+
+SCREEN_RESOLUTION = '1080,1920'
+DATA_DIRECTORY = '/output'
+
+
+def write_synthetic_subject(directory, subject_id, trials, samples_per_trial, seed=0):
+    rng = np.random.RandomState(seed + subject_id)
+    lines = ['** SYNTHETIC\n']
+    timestamp = 1000
+    for trial in range(1, trials + 1):
+        trial_str = 'Trial' + str(trial).zfill(3)
+        lines.append('MSG\t%d TrialStart %s\n' % (timestamp, trial_str))
+        x = rng.uniform(700, 1200, samples_per_trial)
+        y = rng.uniform(300, 800, samples_per_trial)
+        for i in range(samples_per_trial):
+            timestamp += 1
+            lines.append('%d\t %.1f\t %.1f\t 1000.0\t %.1f\t %.1f\t 1000.0\t.....\n' % (timestamp, x[i], y[i], x[i], y[i]))
+        lines.append('EFIX R   %d\t%d\t%d\t %.1f\t %.1f\t 1000\n' % (timestamp - 200, timestamp, 200, x[-1], y[-1]))
+        lines.append('MSG\t%d ScaleStart %s\n' % (timestamp, trial_str))
+    with open(directory + '/' + str(subject_id) + '_synthetic.asc', 'w') as ascFile:
+        ascFile.write(''.join(lines))
+
+    scale = pd.DataFrame({'subjectID': subject_id, 'trial': np.arange(1, trials + 1),
+                          'onsettime': np.arange(trials) * 10, 'stimName': ['1_' + str(t) + '.jpg' for t in range(trials)],
+                          'bid': rng.uniform(1, 10, trials).round(2), 'RT': 500, 'stimType': 'Face', 'stimId': 1})
+    scale.to_csv(directory + '/' + str(subject_id) + '_Scale_synthetic.txt', sep='\t', index=False)
+    personal = pd.DataFrame({'dominant eye (1-right, 2-left)': [1]})
+    personal.to_csv(directory + '/' + str(subject_id) + '_personalDetails_synthetic.txt', sep='\t', index=False)
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()), warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def ingest_per_trial_cost(data_process, root, samples_per_trial):
+    print('Log..... ingest cost per trial (one subject)')
+    for subject_id, trials in zip([101, 102, 103, 104], [40, 80, 160, 320]):
+        write_synthetic_subject(root + DATA_DIRECTORY, subject_id, trials, samples_per_trial)
+        seconds, subject_data = timed(data_process.read_subject_data, DATA_DIRECTORY,
+                                      str(subject_id) + '_synthetic.asc', False, True)
+        print('trials: %4d  rows: %8d  total: %7.3fs  per trial: %6.2fms' %
+              (trials, len(subject_data), seconds, 1000 * seconds / trials))
+
+    return subject_data
+
+
+def tidying_per_subject_cost(data_process, subject_data):
+    print('Log..... tidying cost per subject')
+    subject_data.columns = ['subjectID', 'trialNum', 'onsettime', 'stimName', 'bid', 'RT', 'stimType', 'stimId',
+                            'timeStamp', 'X_axis', 'Y_axis', 'pupil_size', 'dominant_eye']
+    for subjects_count in [5, 10, 20, 40]:
+        subjects = []
+        for subject_id in range(subjects_count):
+            subject = subject_data.copy()
+            subject['subjectID'] = subject_id
+            subjects.append(subject)
+        all_data = pd.concat(subjects, ignore_index=True)
+        seconds, tidy_data = timed(data_process.data_tidying_for_dataset_building, all_data, SCREEN_RESOLUTION)
+        print('subjects: %3d  rows: %9d  total: %7.3fs  per subject: %6.1fms' %
+              (subjects_count, len(all_data), seconds, 1000 * seconds / subjects_count))
+
+
+def main():
+    root = tempfile.mkdtemp()
+    os.makedirs(root + DATA_DIRECTORY)
+    currpath = os.getcwd()
+    try:
+        os.chdir(root)
+        data_process = DataPreprocess('etp', DATA_DIRECTORY, DATA_DIRECTORY, 'TrialStart', 'ScaleStart', None, None,
+                                      [Stim('Face', 1, '480,600'), Stim('Snack', 2, '690,520')])
+        subject_data = ingest_per_trial_cost(data_process, root, 250)
+        tidying_per_subject_cost(data_process, subject_data)
+    finally:
+        os.chdir(currpath)
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
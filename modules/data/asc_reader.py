@@ -0,0 +1,152 @@
+import io
+import re
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+
+
+# One parsed block of an ASC file. Samples are typed arrays, events and messages are kept
+# with the line number they were read from so trials can be sliced by line offsets.
+AscChunk = namedtuple('AscChunk', ['sample_line', 'timestamp', 'values', 'event_line', 'events', 'messages'])
+
+TRIAL_NUM_PATTERN = re.compile(r'Trial(\d+)')
+
+
+def trial_marker(text, trial_start_str, trial_end_str):
+    # (True, trial number) for a trial start MSG text, (False, trial number) for a trial end, None for other messages
+    if trial_start_str in text:
+        is_start = True
+    elif trial_end_str in text:
+        is_start = False
+    else:
+        return None
+    match = TRIAL_NUM_PATTERN.search(text.replace(trial_start_str, '').replace(trial_end_str, ''))
+    if match is None:
+        return None
+    return is_start, int(match.group(1))
+
+
+def records_between(chunks, lineStart, lineEnd):
+    """ This functions returns the AscChunk of the samples and events of chunks found strictly between the lines
+        lineStart and lineEnd, messages are not kept.
+        """
+    sample_lines, timestamps, values, events = [], [], [], []
+    for chunk in chunks:
+        first = np.searchsorted(chunk.sample_line, lineStart, side='right')
+        last = np.searchsorted(chunk.sample_line, lineEnd, side='left')
+        sample_lines.append(chunk.sample_line[first:last])
+        timestamps.append(chunk.timestamp[first:last])
+        values.append(chunk.values[first:last])
+        first = np.searchsorted(chunk.event_line, lineStart, side='right')
+        last = np.searchsorted(chunk.event_line, lineEnd, side='left')
+        events.extend(chunk.events[first:last])
+    if not sample_lines:
+        return AscChunk(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int32), np.empty((0, 0), dtype=np.float32),
+                        np.empty(0, dtype=np.int64), [], [])
+
+    return AscChunk(np.concatenate(sample_lines), np.concatenate(timestamps), np.concatenate(values),
+                    np.asarray([line for line, fields in events], dtype=np.int64), events, [])
+
+
+def iter_trials(chunks, trial_start_str, trial_end_str):
+    """ This functions yields (trial number, AscChunk of the trial records) for every trial of the chunks of an
+        AscReader, as soon as the trial end marker is read. The first start and end markers found for each trial
+        are used.
+        Only the chunks records following the start of a trial not ended yet are held, so the memory used is a
+        chunk and an open trial whatever the file size.
+        """
+    starts = {}
+    ends = {}
+    pending = []
+    for chunk in chunks:
+        pending.append(chunk)
+        for line_num, text in chunk.messages:
+            marker = trial_marker(text, trial_start_str, trial_end_str)
+            if marker is None:
+                continue
+            is_start, trial = marker
+            markers = starts if is_start else ends
+            if trial in markers:
+                continue
+            markers[trial] = line_num
+            if trial in starts and trial in ends:
+                yield trial, records_between(pending, starts[trial], ends[trial])
+        # Records before the first open trial start belong to no trial still to come
+        open_starts = [line_num for trial, line_num in starts.items() if trial not in ends]
+        if open_starts:
+            pending = [records_between(pending, min(open_starts), np.iinfo(np.int64).max)]
+        else:
+            pending = []
+
+
+class AscReader:
+
+    def __init__(self, asc_path, sample_fields, chunk_lines=200000, read_samples=True):
+        """ Streaming reader for EyeLink ASC files.
+            The file is walked once, every line is classified as a sample, EFIX, ESACC or MSG
+            record and sample lines are parsed in chunks of chunk_lines records into typed arrays
+            (int32 timestamps, float32 x/y/pupil), so only one chunk of raw text is held in
+            memory at a time. iter_trials cuts the chunks into trials.
+            sample_fields - number of leading sample columns to keep, 4 for one eye recorded
+            (timestamp, x, y, pupil) and 7 for both eyes recorded.
+            """
+        self.asc_path = asc_path
+        self.sample_fields = sample_fields
+        self.chunk_lines = chunk_lines
+        self.read_samples = read_samples
+
+    def iter_chunks(self):
+        sample_text = []
+        sample_line = []
+        events = []
+        messages = []
+        with open(self.asc_path, encoding='utf-8-sig') as ascFile:
+            for line_num, line in enumerate(ascFile):
+                first_char = line[:1]
+                if first_char.isdigit():
+                    if not self.read_samples:
+                        continue
+                    sample_text.append(line)
+                    sample_line.append(line_num)
+                elif first_char == 'E' and (line.startswith('EFIX') or line.startswith('ESACC')):
+                    events.append((line_num, line.rstrip('\r\n').split('\t')))
+                elif first_char == 'M' and line.startswith('MSG'):
+                    fields = line.rstrip('\r\n').split('\t')
+                    messages.append((line_num, fields[1] if len(fields) > 1 else ''))
+                    continue
+                else:
+                    continue
+                # Events count too, so files read without samples are streamed in chunks as well
+                if len(sample_text) + len(events) >= self.chunk_lines:
+                    yield self._to_chunk(sample_text, sample_line, events, messages)
+                    sample_text, sample_line, events, messages = [], [], [], []
+
+        if sample_text or events or messages:
+            yield self._to_chunk(sample_text, sample_line, events, messages)
+
+    def _to_chunk(self, sample_text, sample_line, events, messages):
+        timestamp, values = self.parse_samples(sample_text)
+        event_line = np.asarray([line for line, fields in events], dtype=np.int64)
+        return AscChunk(np.asarray(sample_line, dtype=np.int64), timestamp, values, event_line, events, messages)
+
+    def parse_samples(self, sample_text):
+        value_fields = self.sample_fields - 1
+        if not sample_text:
+            return np.empty(0, dtype=np.int32), np.empty((0, value_fields), dtype=np.float32)
+        # Let pandas C parser split the buffered lines, missing values ('.') are read as nan
+        dtypes = {0: np.int64}
+        for i in range(1, self.sample_fields):
+            dtypes[i] = np.float32
+        try:
+            samples = pd.read_csv(io.StringIO(''.join(sample_text)), sep='\t', header=None,
+                                  usecols=list(range(self.sample_fields)), na_values=['.'],
+                                  skipinitialspace=True, dtype=dtypes, engine='c')
+        except pd.errors.ParserError:
+            # Sample records of different widths in the same chunk, cut every line to the needed fields
+            rows = [line.rstrip('\r\n').split('\t', self.sample_fields)[:self.sample_fields]
+                    for line in sample_text]
+            samples = pd.DataFrame(rows).apply(pd.to_numeric, errors='coerce')
+        timestamp = samples[0].values.astype(np.int32)
+        values = samples[list(range(1, self.sample_fields))].values.astype(np.float32, copy=False)
+
+        return timestamp, values
@@ -0,0 +1,42 @@
+import zlib
+from multiprocessing import Pool
+import numpy as np
+import cv2
+
+
+def path_colors(n_colors, sampleId, seed=0):
+    # Random RGB colors of a sample, the same for every run and worker (seeded by the sampleId and seed)
+    random_state = np.random.RandomState((zlib.crc32(str(sampleId).encode()) + seed) % (2 ** 32))
+    return random_state.randint(0, 256, size=(n_colors, 3))
+
+
+def colored_path(scanpath, stim_size, timePeriodMilisec, sampleId='', seed=0):
+    """ This functions draws the scanpath (datapoints (x, y) in the last two columns) on a black (height, width, 3)
+        uint8 canvas of the stim size [width, height].
+        The line to every datapoint is colored by its time period - a new random color every timePeriodMilisec
+        datapoints, one color for the whole path when timePeriodMilisec is 0.
+        All lines of a period are drawn at once as one polyline, on the one canvas returned.
+        """
+    canvas = np.zeros((stim_size[1], stim_size[0], 3), np.uint8)
+    points = np.ascontiguousarray(np.asarray(scanpath)[:, -2:], dtype=np.int32)
+    period = timePeriodMilisec if timePeriodMilisec > 0 else max(len(points), 1)
+    colors = path_colors(-(-len(points) // period), sampleId, seed)
+    for colorIndex, start in enumerate(range(0, len(points), period)):
+        # Lines into datapoints start..start+period-1, from the datapoint before the period
+        periodPoints = points[max(start - 1, 0):start + period]
+        if len(periodPoints) < 2:
+            continue
+        cv2.polylines(canvas, [periodPoints.reshape(-1, 1, 2)], False, colors[colorIndex].tolist(),
+                      thickness=3, lineType=8)
+
+    return canvas
+
+
+def colored_paths(scanpaths, stim_size, timePeriodMilisec, sampleIds, seed=0, n_workers=1):
+    # Colored paths of many samples, in n_workers processes
+    paths_args = [(scanpath, stim_size, timePeriodMilisec, sampleId, seed)
+                  for scanpath, sampleId in zip(scanpaths, sampleIds)]
+    if n_workers > 1 and len(paths_args) > 1:
+        with Pool(processes=n_workers) as pool:
+            return pool.starmap(colored_path, paths_args, chunksize=max(1, len(paths_args) // (4 * n_workers)))
+    return [colored_path(*path_args) for path_args in paths_args]
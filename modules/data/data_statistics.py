@@ -2,7 +2,7 @@ from modules.data.datasets import DatasetBuilder
 from matplotlib import pyplot as plt
 import numpy as np
 from scipy.stats import shapiro
-from keras.preprocessing import sequence
+from modules.data.padding import pad_sequences
 from statsmodels.graphics.gofplots import qqplot
 from scipy.stats import ks_2samp
 
@@ -23,32 +23,32 @@ datasetbuilder.summery_statistics_features(stimType)
 print("p")
 
 def fix_bid_corr_by_subject(fixation_event_data):
-    fixation_event_data['x_axis_std'] = fixation_event_data.groupby('sampleId')['avg_X_axis'].transform(np.std)
-    fixation_event_data['y_axis_std'] = fixation_event_data.groupby('sampleId')['avg_Y_axis'].transform(np.std)
-    fixation_event_data['x_axis_mean'] = fixation_event_data.groupby('sampleId')['avg_X_axis'].transform(np.mean)
-    fixation_event_data['y_axis_mean'] = fixation_event_data.groupby('sampleId')['avg_Y_axis'].transform(np.mean)
-    fixation_event_data['x_axis_median'] = fixation_event_data.groupby('sampleId')['avg_X_axis'].transform(np.median)
-    fixation_event_data['y_axis_median'] = fixation_event_data.groupby('sampleId')['avg_Y_axis'].transform(np.median)
-    fixation_event_data['duration_mean'] = fixation_event_data.groupby('sampleId')['duration'].transform(np.mean)
-    fixation_event_data['duration_median'] = fixation_event_data.groupby('sampleId')['duration'].transform(np.median)
-    fixation_event_data['duration_std'] = fixation_event_data.groupby('sampleId')['duration'].transform(np.std)
+    fixation_event_data['x_axis_std'] = fixation_event_data.groupby('sampleId', observed=True)['avg_X_axis'].transform(np.std)
+    fixation_event_data['y_axis_std'] = fixation_event_data.groupby('sampleId', observed=True)['avg_Y_axis'].transform(np.std)
+    fixation_event_data['x_axis_mean'] = fixation_event_data.groupby('sampleId', observed=True)['avg_X_axis'].transform(np.mean)
+    fixation_event_data['y_axis_mean'] = fixation_event_data.groupby('sampleId', observed=True)['avg_Y_axis'].transform(np.mean)
+    fixation_event_data['x_axis_median'] = fixation_event_data.groupby('sampleId', observed=True)['avg_X_axis'].transform(np.median)
+    fixation_event_data['y_axis_median'] = fixation_event_data.groupby('sampleId', observed=True)['avg_Y_axis'].transform(np.median)
+    fixation_event_data['duration_mean'] = fixation_event_data.groupby('sampleId', observed=True)['duration'].transform(np.mean)
+    fixation_event_data['duration_median'] = fixation_event_data.groupby('sampleId', observed=True)['duration'].transform(np.median)
+    fixation_event_data['duration_std'] = fixation_event_data.groupby('sampleId', observed=True)['duration'].transform(np.std)
     fixation_event_data.drop_duplicates(subset=['sampleId'], inplace=True)
-    corr_x_axis_std = fixation_event_data.groupby('subjectID')[['bid', 'x_axis_std']].corr().iloc[0::2, -1]
-    corr_y_axis_std = fixation_event_data.groupby('subjectID')[['bid', 'y_axis_std']].corr().iloc[0::2, -1]
-    corr_x_axis_mean = fixation_event_data.groupby('subjectID')[['bid', 'x_axis_mean']].corr().iloc[0::2, -1]
-    corr_y_axis_mean = fixation_event_data.groupby('subjectID')[['bid', 'y_axis_mean']].corr().iloc[0::2, -1]
-    corr_x_axis_median = fixation_event_data.groupby('subjectID')[['bid', 'x_axis_median']].corr().iloc[0::2, -1]
-    corr_y_axis_median = fixation_event_data.groupby('subjectID')[['bid', 'y_axis_median']].corr().iloc[0::2, -1]
-    corr_duration_mean = fixation_event_data.groupby('subjectID')[['bid', 'duration_mean']].corr().iloc[0::2, -1]
-    corr_duration_median = fixation_event_data.groupby('subjectID')[['bid', 'duration_median']].corr().iloc[0::2, -1]
-    corr_duration_std = fixation_event_data.groupby('subjectID')[['bid', 'duration_std']].corr().iloc[0::2, -1]
+    corr_x_axis_std = fixation_event_data.groupby('subjectID', observed=True)[['bid', 'x_axis_std']].corr().iloc[0::2, -1]
+    corr_y_axis_std = fixation_event_data.groupby('subjectID', observed=True)[['bid', 'y_axis_std']].corr().iloc[0::2, -1]
+    corr_x_axis_mean = fixation_event_data.groupby('subjectID', observed=True)[['bid', 'x_axis_mean']].corr().iloc[0::2, -1]
+    corr_y_axis_mean = fixation_event_data.groupby('subjectID', observed=True)[['bid', 'y_axis_mean']].corr().iloc[0::2, -1]
+    corr_x_axis_median = fixation_event_data.groupby('subjectID', observed=True)[['bid', 'x_axis_median']].corr().iloc[0::2, -1]
+    corr_y_axis_median = fixation_event_data.groupby('subjectID', observed=True)[['bid', 'y_axis_median']].corr().iloc[0::2, -1]
+    corr_duration_mean = fixation_event_data.groupby('subjectID', observed=True)[['bid', 'duration_mean']].corr().iloc[0::2, -1]
+    corr_duration_median = fixation_event_data.groupby('subjectID', observed=True)[['bid', 'duration_median']].corr().iloc[0::2, -1]
+    corr_duration_std = fixation_event_data.groupby('subjectID', observed=True)[['bid', 'duration_std']].corr().iloc[0::2, -1]
 
 
     sList = fixation_event_data.subjectID.unique()
     allCorr= []
     for sId in sList:
         df_by_subject = fixation_event_data[fixation_event_data["subjectID"] == sId]
-        df_by_subject['x_axis_std'] = df_by_subject.groupby('sampleId')['avg_X_axis'].transform(np.std)
+        df_by_subject['x_axis_std'] = df_by_subject.groupby('sampleId', observed=True)['avg_X_axis'].transform(np.std)
 
 
 
@@ -356,8 +356,7 @@ def scanpath_distributions_by_img(df_by_stim):
                 uniques_scanpath1_f = uniques_scanpath1.flatten()
                 scanpathList.append(uniques_scanpath_f)
                 scanpathList.append(uniques_scanpath1_f)
-                np.asanyarray(scanpathList)
-                scanpathList = sequence.pad_sequences(scanpathList, dtype='float32', maxlen=800)
+                scanpathList = pad_sequences(scanpathList, dtype='float32', maxlen=800)
                 statistic, pvalue = ks_2samp(scanpathList[0], scanpathList[1])
                 if pvalue < 0.100:
                     ksTest.append(0)
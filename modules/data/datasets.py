@@ -1,21 +1,18 @@
 import abc
 
 import numpy as np
-import cv2
 import pandas as pd
-from modules.data.visualization import DataVis
-from sklearn.utils import shuffle
-import matplotlib.pyplot as plt
-import seaborn as sns
-from sklearn.model_selection import train_test_split
-from keras.utils import to_categorical
-import scipy.misc
 import os
 from modules.data.stim import Stim
 import yaml
-import random
 from modules.data.preprocessing import DataPreprocess
-from keras.preprocessing import sequence
+from modules.data.store import ProcessedStore
+from modules.data.schema import apply_schema
+from modules.data.stim_images import StimulusImages
+from modules.data.padding import pad_sequences
+from modules.data.split_store import SplitStore, split_key
+# sklearn, keras, cv2 and the image modules are imported by the methods using them, so data-only entry points
+# (summary statistics, linear models) do not load them
 
 
 class DatasetBuilder:
@@ -33,144 +30,176 @@ class DatasetBuilder:
         self.stimFace = Stim(cfg['exp']['etp']['stimFace']['name'], cfg['exp']['etp']['stimFace']['id'],
                         cfg['exp']['etp']['stimFace']['size'])
         self.stims_array = [self.stimFace, self.stimSnack]
+        # Processed subjects data, partitioned by subject and stim type
+        self.store = ProcessedStore(self.datapath + "store/")
+        # Model ready train / val / test datasets, memory mapped by the model runs
+        self.split_store = SplitStore(self.datapath + "splits/")
+        # Stimulus images and saliency maps caches, opened on first use
+        self._stim_cache = None
+        self._saliency_cache = None
+        self.saliency_workers = cfg['exp']['etp'].get('saliency_workers', 1)
+        # Processes drawing the samples colored paths
+        self.render_workers = cfg['exp']['etp'].get('render_workers', 1)
+        # Processes running the experiment grid and threads of every run process
+        self.experiment_workers = cfg['exp']['etp'].get('experiment_workers', 1)
+        self.worker_threads = cfg['exp']['etp'].get('worker_threads', 1)
+        # One copy of every stimulus image loaded, samples refer to their image by stimIndex
+        self.stim_images = None
         self.data_process = DataPreprocess(cfg['exp']['etp']['name'],
                               cfg['exp']['etp']['both_eye_path'],
                               cfg['exp']['etp']['one_eye_path1'],
                               cfg['exp']['etp']['trial_start_str'],
                               cfg['exp']['etp']['trial_end_str'],
                               cfg['exp']['etp']['output_file_both_eye'],
-                              cfg['exp']['etp']['output_file_one_eye1'], [self.stimSnack, self.stimFace])
+                              cfg['exp']['etp']['output_file_one_eye1'], [self.stimSnack, self.stimFace],
+                              cfg['exp']['etp'].get('ingest_workers', 1), self.store)
         self.screen_resolution = cfg['exp']['etp']['screen_resolution']
         self.fixation_only = True
 
 
-    def get_fixation_dataset(self, data_df):
+    @property
+    def stim_cache(self):
+        # Decoded and resized stimulus images, shared by all the loaders and by parallel workers
+        if self._stim_cache is None:
+            from modules.data.stim_cache import StimulusCache
+            self._stim_cache = StimulusCache(self.datapath + "stim_cache/")
+        return self._stim_cache
+
+    @property
+    def saliency_cache(self):
+        # Saliency maps of the stimuli, computed once per stim, size and algorithm
+        if self._saliency_cache is None:
+            from modules.data.saliency_cache import SaliencyCache
+            self._saliency_cache = SaliencyCache(self.datapath + "saliency_cache/", self.stim_cache)
+        return self._saliency_cache
+
+    def get_fixation_dataset(self, data_df, downsample=1):
+        """ This functions builds the fixation map of every sample with 5 datapoints or more.
+            downsample - merge every downsample x downsample pixels into one map bin, 1 keeps one bin per pixel.
+            """
+        from modules.data.fixation_maps import fixation_maps
         print('Log..... Build fixation dataset')
-        fixation_dataset = []
-        for sampleId in data_df.sampleId.unique():
-            sample_data = []
-            bid = data_df[data_df['sampleId'] == sampleId].bid.unique()
-            stimName = data_df[data_df['sampleId'] == sampleId].stimName.unique()
-            stimType = data_df[data_df['sampleId'] == sampleId].stimType.unique()
-            sample = data_df[data_df['sampleId'] == sampleId].sampleId.unique()
-            for stim in self.stims_array:
-                if stim.name == stimType:
-                    fixationMap = self.data_to_fixation_map_by_sampleId(data_df, sampleId, stim)
-
-            if type(fixationMap) is not np.ndarray:
-                continue
-            sample_data.append(stimName[0])
-            sample_data.append(stimType[0])
-            sample_data.append(sample[0])
-            sample_data.append(fixationMap)
-            sample_data.append(bid[0])
-            fixation_dataset.append(sample_data)
-
-        fixation_df = pd.DataFrame(fixation_dataset)
-        fixation_df.columns = ['stimName', 'stimType', 'sampleId', 'fixationMap', 'bid']
+        order, offsets, sampleIds = self.samples_slices(data_df)
+        counts = np.diff(offsets)
+        # Sample of every sorted row and the first row of each sample, holding the sample fields
+        rowsSample = np.repeat(np.arange(len(sampleIds)), counts)
+        firstRows = data_df.iloc[order[offsets[:-1]]]
+        x = data_df['X_axis'].values[order]
+        y = data_df['Y_axis'].values[order]
+
+        samples = []
+        fixationMaps = []
+        for stim in self.stims_array:
+            # Samples of the stim with enough datapoints, all their maps are built in one batch
+            stimSamples = np.flatnonzero((counts >= 5) & (firstRows['stimType'].values == stim.name))
+            isStimSample = np.zeros(len(sampleIds), dtype=bool)
+            isStimSample[stimSamples] = True
+            stimRows = isStimSample[rowsSample]
+            sampleIndex = (np.cumsum(isStimSample) - 1)[rowsSample[stimRows]]
+            samples.extend(stimSamples)
+            fixationMaps.extend(fixation_maps(sampleIndex, x[stimRows], y[stimRows], len(stimSamples), stim.size,
+                                              downsample))
+        print('Log..... Fixation data is None for ' + str(len(sampleIds) - len(samples)) + ' samples')
+
+        # Keep the samples order of data_df
+        samplesOrder = np.argsort(samples, kind='stable')
+        samples = np.asarray(samples, dtype=int)[samplesOrder]
+        firstRows = firstRows.iloc[samples]
+        fixation_df = pd.DataFrame({'stimName': firstRows['stimName'].values,
+                                    'stimType': firstRows['stimType'].values,
+                                    'sampleId': firstRows['sampleId'].values,
+                                    'fixationMap': [fixationMaps[i] for i in samplesOrder],
+                                    'bid': firstRows['bid'].values})
 
         return fixation_df
 
-    def data_to_fixation_map_by_sampleId(self, data_df, sampleId, stim):
-        print('Log..... get fixation map for sampleId: ', sampleId)
-        x = data_df[data_df['sampleId'] == sampleId].X_axis
-        y = data_df[data_df['sampleId'] == sampleId].Y_axis
-        if len(x) | len(y) < 5:
-            print('Fixation data is None for sampleId: ', sampleId)
-            return None
-        xedges = np.arange(stim.size[0])
-        yedges = np.arange(stim.size[1])
-
-        heatmap, xedges, yedges = np.histogram2d(x, y, bins=(xedges, yedges))
-        heatmap = heatmap.T  # Let each row list bins with common y range.
+    def samples_slices(self, data_df):
+        """ This functions sorts the rows by sampleId once, every sample rows are then one contiguous slice.
+            Returns the rows order, the slices offsets (sample i rows are order[offsets[i]:offsets[i+1]]) and the
+            sampleIds in order of their first row.
+            """
+        codes, sampleIds = pd.factorize(data_df['sampleId'])
+        # Stable sort keeps the rows order of each sample, rows with no sampleId (code -1) are left out
+        order = np.argsort(codes, kind='stable')
+        order = order[codes[order] >= 0]
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(codes[order], minlength=len(sampleIds)))])
 
-        return heatmap
+        return order, offsets, sampleIds
 
     def get_scanpath_dataset(self, data_df):
         print('Log..... Build scanpath dataset')
-        scanpath_dataset = []
-        for sampleId in data_df.sampleId.unique():
-            sample_data = []
-            bid = data_df[data_df['sampleId'] == sampleId].bid.unique()
-            subjectID = data_df[data_df['sampleId'] == sampleId].subjectID.unique()
-            stimName = data_df[data_df['sampleId'] == sampleId].stimName.unique()
-            stimType = data_df[data_df['sampleId'] == sampleId].stimType.unique()
-            sample = data_df[data_df['sampleId'] == sampleId].sampleId.unique()
-            scanpath = self.data_to_scanpath(data_df, sampleId)
-            if type(scanpath) is not np.ndarray:
-                continue
-            sample_data.append(subjectID[0])
-            sample_data.append(stimName[0])
-            sample_data.append(stimType[0])
-            sample_data.append(sample[0])
-            sample_data.append(scanpath)
-            sample_data.append(bid[0])
-            scanpath_dataset.append(sample_data)
-
-        scanpath_df = pd.DataFrame(scanpath_dataset)
-        scanpath_df.columns = ['subjectID', 'stimName', 'stimType', 'sampleId', 'scanpath', 'bid']
+        order, offsets, sampleIds = self.samples_slices(data_df)
+        # All samples points (timeStamp, x, y) in one array, every scanpath is a view of its sample rows
+        points = np.empty((len(order), 3), dtype=int)
+        points[:, 0] = data_df['timeStamp'].values[order]
+        points[:, 1] = data_df['X_axis'].values[order]
+        points[:, 2] = data_df['Y_axis'].values[order]
+        # Samples with less than 2 datapoints have no scanpath
+        counts = np.diff(offsets)
+        samples = np.flatnonzero(counts >= 2)
+        print('Log..... Scanpath data is None for ' + str(len(sampleIds) - len(samples)) + ' samples')
+        # First row of each sample holds the sample fields
+        firstRows = data_df.iloc[order[offsets[samples]]]
+
+        scanpath_df = pd.DataFrame({'subjectID': firstRows['subjectID'].values,
+                                    'stimName': firstRows['stimName'].values,
+                                    'stimType': firstRows['stimType'].values,
+                                    'sampleId': firstRows['sampleId'].values,
+                                    'scanpath': [points[offsets[i]:offsets[i + 1]] for i in samples],
+                                    'bid': firstRows['bid'].values})
 
         return scanpath_df
 
-    def data_to_scanpath(self, data_df, sampleId):
-        print('Log..... get scanpath data for sampleId: ', sampleId)
-        # todo - add downsampling option for the data poinnts
-        scanpath = []
-        t = data_df[data_df['sampleId'] == sampleId].timeStamp.astype(int)
-        x = data_df[data_df['sampleId'] == sampleId].X_axis.astype(int)
-        y = data_df[data_df['sampleId'] == sampleId].Y_axis.astype(int)
-        if len(x) | len(y) < 2:
-            print('Scanpath data is None for sampleId: ', sampleId)
-            return None
-        scanpath.append(t)
-        scanpath.append(x)
-        scanpath.append(y)
-
-        scanpath = np.asanyarray(scanpath).T
-
-        return np.asanyarray(scanpath)
-
     def load_fixation_maps_dataset(self, df):
         print("Log.....Loading maps")
-        df['fixationMap'] = df['fixationMap'].apply(lambda x: np.pad(x, [(0, 1), (0, 1)], mode='constant'))
-        df['fixationMap'] = df['fixationMap'].apply(lambda x: cv2.cvtColor(np.uint8(x), cv2.COLOR_GRAY2RGB) * 255)
-        df['fixationMap'] = df['fixationMap'].apply(lambda x: x / 255)
-
+        # Maps are kept sparse, also in the materialized splits, they are densified (padded, scaled and repeated in
+        # the model channels) per batch by the models input pipeline
         return df[["sampleId", "fixationMap"]]
 
     def load_scanpath_dataset(self, df):
         print("Log.....Loading scanpaths")
         return df[["sampleId", "scanpath"]]
 
-    def load_images_dataset(self, currpath, df, img_size):
+    def stimulus_images(self, img_size, channels=3, source='stims'):
+        # Images of another size (another stim type) or saliency maps start a new set of stimulus images
+        if self.stim_images is None or self.stim_images.size != tuple(img_size) or \
+                self.stim_images.images.shape[3] != channels or self.stim_images.source != source:
+            self.stim_images = StimulusImages(img_size, channels, source=source)
+        return self.stim_images
+
+    def load_images_dataset(self, currpath, df, img_size, saliency=False):
+        """ This functions returns the stimIndex of every sample, its stim image index in self.stim_images.
+            Every stim image is held once, images are gathered (and scaled to [0, 1]) per batch from the indices.
+            saliency - the stims saliency maps (read from the saliency cache) instead of the stims images.
+            """
         print("Log.....Loading images")
-        img_dict = {}
-        for image in np.asanyarray(df.stimName.unique()):
-            #print("loading image - " + image)
-            img = DataVis.stimulus(currpath, "Stim_0/", image)
-            img = cv2.resize(img, img_size)
-            img = img / 255
-            img_dict[image] = img
-        img_df = pd.DataFrame(list(img_dict.items()), columns=['stimName', 'img'])
-        #scipy.misc.imsave("../../etp_data/processed/temp0.jpg", img_dict["1_1027.jpg"])
-        newdf = pd.merge(df, img_df, on='stimName', how='left')
-        #x = dfnew[dfnew['stimName'] == "1_1027.jpg"]
-        #scipy.misc.imsave("../../etp_data/processed/temp1.jpg", x["img"].values[0])
-
-        return newdf[["sampleId", "stimName", "img"]]
-
-    def load_images_for_scanpath_dataset(self, currpath, df, img_size):
-        print("Log.....Loading images")
-        img_dict = {}
-        for image in np.asanyarray(df.stimName.unique()):
-            #print("loading image - " + image)
-            img = DataVis.stimulus(currpath, "Stim_0/", image)
-            img = cv2.resize(img, img_size)
-            img_dict[image] = img
-        img_df = pd.DataFrame(list(img_dict.items()), columns=['stimName', 'img'])
-        newdf = pd.merge(df, img_df, on='stimName', how='left')
+        newdf = df[["sampleId", "stimName"]].copy()
+        if saliency:
+            stim_images = self.stimulus_images(img_size, channels=1, source='saliency_fine_grained')
+            newdf["stimIndex"] = stim_images.add(self.saliency_cache, currpath, "Stim_0/", df.stimName)
+        else:
+            stim_images = self.stimulus_images(img_size)
+            newdf["stimIndex"] = stim_images.add(self.stim_cache, currpath, "Stim_0/", df.stimName)
 
-        return newdf[["sampleId", "stimName", "img"]]
+        return newdf
+
+    def load_images_for_scanpath_dataset(self, currpath, df, img_size, saliency=False):
+        # The same stimulus images, the uint8 image of a sample is self.stim_images.images[stimIndex]
+        return self.load_images_dataset(currpath, df, img_size, saliency)
+
+    def precompute_saliency(self, stimType, stimNames=None, algorithm='fine_grained'):
+        """ This functions computes the saliency maps of the Stim_0/ stims (all of them or stimNames only) at the
+            stimType size once, patches and image inputs then read them from the saliency cache.
+            """
+        for stim in self.stims_array:
+            if stim.name == stimType:
+                stim_size = (stim.size[0], stim.size[1])
+        return self.saliency_cache.precompute(self.imgpath, "Stim_0/", stim_size, algorithm, stimNames,
+                                              self.saliency_workers)
+
+    def sample_images(self, df):
+        # Images input of the samples of df, indexed again by stimName so cached splits match the current images
+        return self.stim_images.samples(self.stim_images.indices(df.stimName))
 
     def load_labels_dataset(self, df):
         print("Log.....Loading labels")
@@ -207,7 +236,7 @@ class DatasetBuilder:
         maps = self.load_fixation_maps_dataset(fixation_df_by_stim)
         images = self.load_images_dataset(self.imgpath, fixation_df_by_stim, stim_size)
         labels = self.load_labels_dataset(fixation_df_by_stim)
-        colorpath = self.get_time_colored_dataset(scanpaths, maps, images, labels, stimType, colorpathTimeSet)
+        colorpath = self.get_time_colored_dataset(scanpaths, stimType, colorpathTimeSet)
 
         return scanpaths, maps, colorpath, images, labels, stim_size
 
@@ -246,99 +275,124 @@ class DatasetBuilder:
 
         return scanpaths, images, labels, stim_size
 
-    def train_test_val_split_stratify_by_subject(self, df, seed, is_fixation, is_patch, is_colored_path, binary_bid, binary_bid_n, five_bins_bid):
-
-        try:
-            print("Log... reading train test json files")
-            train = pd.read_json(self.datapath + "train_set.json")
-            test = pd.read_json(self.datapath + "test_set.json")
-        except:
-            print("Building train, val, test datasets...")
-            df["subjectId"] = df['sampleId'].apply(lambda x: x.split("_")[0])
-            train, test = train_test_split(df, stratify=df[['subjectId']],
-                                         test_size=0.20, random_state=seed)
-            train.to_json(self.datapath + "train_set.json")
-            test.to_json(self.datapath + "test_set.json")
-
-        train, val = train_test_split(train, stratify=train[['subjectId']],
-                                     test_size=0.20, random_state=seed)
+    def train_test_val_split_stratify_by_subject(self, df, seed, is_fixation, is_patch, is_colored_path, binary_bid, binary_bid_n, five_bins_bid,
+                                                 dataset_params=None, test_seed=33):
+        """ This functions returns the train, val and test inputs, images and labels of df, split by subject and
+            materialized once per parameters (and source samples) in the split store.
+            """
+        name = self.stratify_by_subject_split(df, seed, is_fixation, is_patch, is_colored_path, binary_bid,
+                                              binary_bid_n, five_bins_bid, dataset_params, test_seed)
+
+        return self.open_stratify_by_subject_split(name)
+
+    def stratify_by_subject_split(self, df, seed, is_fixation, is_patch, is_colored_path, binary_bid, binary_bid_n,
+                                  five_bins_bid, dataset_params=None, test_seed=33):
+        """ This functions materializes the split by subject of df, when it is not materialized yet, and returns
+            its name in the split store.
+            dataset_params - the settings df was built with (patch size and count, saliency source, colored path
+            period and colors seed, ...), part of the materialized dataset name so other settings build a new one.
+            The test split is drawn with test_seed, so every seed trains and validates on its own split of the same
+            train samples and all of them are tested on one test set.
+            """
         if is_patch:
-            trainMapsX = np.asanyarray(train.patch.tolist())
-            valMapsX = np.asanyarray(val.patch.tolist())
-            testMapsX = np.asanyarray(test.patch.tolist())
+            input_column = 'patch'
         elif is_colored_path:
-            trainMapsX = np.asanyarray(train.colored_path.tolist())
-            valMapsX = np.asanyarray(val.colored_path.tolist())
-            testMapsX = np.asanyarray(test.colored_path.tolist())
+            input_column = 'colored_path'
         elif is_fixation:
-            trainMapsX = np.asanyarray(train.fixationMap.tolist())
-            valMapsX = np.asanyarray(val.fixationMap.tolist())
-            testMapsX = np.asanyarray(test.fixationMap.tolist())
+            input_column = 'fixationMap'
         else:
-            trainMapsX = np.asanyarray(train.sacnpath.tolist())
-            valMapsX = np.asanyarray(val.sacnpath.tolist())
-            testMapsX = np.asanyarray(test.sacnpath.tolist())
-        trainImagesX = np.asanyarray(train.img.tolist())
-        valImagesX = np.asanyarray(val.img.tolist())
-        testImagesX = np.asanyarray(test.img.tolist())
+            input_column = 'scanpath'
         if binary_bid:
-            trainY = np.asanyarray(train.binary_bid.tolist())
-            valY = np.asanyarray(val.binary_bid.tolist())
-            testY = np.asanyarray(test.binary_bid.tolist())
+            label_column = 'binary_bid'
         elif five_bins_bid:
-            trainY = np.asanyarray(train.five_bins_bid.tolist())
-            valY = np.asanyarray(val.five_bins_bid.tolist())
-            testY = np.asanyarray(test.five_bins_bid.tolist())
+            label_column = 'five_bins_bid'
         elif binary_bid_n:
-            trainY = np.asanyarray(train.binary_bid_n.tolist())
-            valY = np.asanyarray(val.binary_bid_n.tolist())
-            testY = np.asanyarray(test.binary_bid_n.tolist())
+            label_column = 'binary_bid_n'
+        else:
+            raise ValueError('No label selected, expected one of binary_bid, five_bins_bid or binary_bid_n')
+        for column in (input_column, label_column):
+            if column not in df.columns:
+                raise ValueError('Column ' + column + ' selected as input or label is not in the dataset columns ' +
+                                 ', '.join(map(str, df.columns)))
+        params = {'split': 'stratify_by_subject', 'seed': seed, 'test_seed': test_seed, 'input': input_column,
+                  'label': label_column, 'columns': list(df.columns),
+                  'input_shape': list(np.shape(df[input_column].iloc[0])),
+                  'dataset': dataset_params if dataset_params is not None else {}}
+        if self.stim_images is not None and "stimName" in df:
+            params['stim_images'] = {'size': list(self.stim_images.size), 'source': self.stim_images.source}
+        if input_column == 'fixationMap':
+            # Splits materialized before the maps were kept sparse hold dense maps, they are not reused
+            params['maps'] = 'sparse'
+        name = split_key(params, df)
+        if not self.split_store.exists(name):
+            self.materialize_stratify_by_subject(name, params, df, seed, test_seed, input_column, label_column)
+
+        return name
+
+    def open_stratify_by_subject_split(self, name):
+        # Memory mapped train, val and test inputs, images and labels of a materialized split by subject
+        print("Log... Opening materialized splits " + name)
+        manifest, splits = self.split_store.read(name)
+        images = self.materialized_images(name, manifest, splits)
+        trainMapsX, valMapsX, testMapsX = [splits[split]['inputs'] for split in ('train', 'val', 'test')]
+        trainImagesX, valImagesX, testImagesX = [images[split] for split in ('train', 'val', 'test')]
+        trainY, valY, testY = [splits[split]['labels'] for split in ('train', 'val', 'test')]
 
         return trainMapsX, valMapsX, testMapsX, trainImagesX, valImagesX, testImagesX, trainY, valY, testY
 
+    def materialize_stratify_by_subject(self, name, params, df, seed, test_seed, input_column, label_column):
+        from sklearn.model_selection import train_test_split
+
+        print("Building train, val, test datasets...")
+        df["subjectId"] = df['sampleId'].apply(lambda x: x.split("_")[0])
+        # One test set for all seeds, only the train / val split follows seed
+        train, test = train_test_split(df, stratify=df[['subjectId']],
+                                     test_size=0.20, random_state=test_seed)
+        train, val = train_test_split(train, stratify=train[['subjectId']],
+                                     test_size=0.20, random_state=seed)
+        splits = {}
+        for split, split_df in [('train', train), ('val', val), ('test', test)]:
+            if input_column in ('fixationMap', 'scanpath'):
+                # Sparse maps and variable length scanpaths are kept as they are, batches densify or pad them
+                inputs = split_df[input_column].tolist()
+            else:
+                inputs = np.asanyarray(split_df[input_column].tolist())
+            splits[split] = {'inputs': inputs,
+                             'images': self.sample_images(split_df).stimIndex
+                             if self.stim_images is not None and "stimName" in split_df else None,
+                             'labels': np.asanyarray(split_df[label_column].tolist()),
+                             'sampleIds': split_df.sampleId.values}
+        self.split_store.write(name, splits, params, self.stim_images if 'stim_images' in params else None)
+
+    def materialized_images(self, name, manifest, splits):
+        # Images input of every split of a materialized dataset, gathered from its own memory mapped stims tensor
+        stim_images = self.split_store.read_stim_images(name, manifest)
+        return {split: stim_images.samples(blocks['images']) if stim_images is not None and 'images' in blocks
+                else None for split, blocks in splits.items()}
 
     def create_patches_dataset(self, currpath, scanpaths, images, labels, num_patches, patch_size, saliency):
+        from modules.data.patches import patch_centers, extract_patches
         print("Log.....Building patches")
         df = scanpaths.merge(images, on='sampleId').merge(labels,on='sampleId')
         sparse_indexes = self.find_sparse_samples(df, 2300)
         df.drop(df.index[sparse_indexes], inplace=True)
         df.reset_index(inplace=True)
-        patches_list = []
-        for scanpath, img in zip(df.scanpath, df.img):
-            #scipy.misc.imsave(currpath + "/etp_data/processed/patches/" + "original_img.jpg", img)
-            if saliency:
-                # initialize OpenCV's static saliency spectral residual detector and
-                # compute the saliency map
-                saliency = cv2.saliency.StaticSaliencyFineGrained_create()
-                (success, img) = saliency.computeSaliency(img)
-                img = (img * 255).astype("uint8")
-                #scipy.misc.imsave("../../etp_data/processed/patches/" + "saliency_img.jpg", img)
-            # Compute clusters Means through time
-            fixations_centers = []
-            clusters = np.array_split(scanpath, num_patches)
-            for i in clusters:
-                center = np.mean(i, axis=0).round().astype(int)
-                fixations_centers.append(center)
-            #build patches around the fixations_centers
-            patches = []
-            patch_num = 1
-            for xi, yi in fixations_centers:
-                length = int(patch_size/2)
-                patch = img[yi - length: yi + length, xi - length: xi + length]
-                padx = patch_size - patch.shape[0]
-                pady = patch_size - patch.shape[1]
-                patch = cv2.copyMakeBorder(patch, 0, padx, 0, pady, cv2.BORDER_CONSTANT)
-                #scipy.misc.imsave("../../etp_data/processed/patches/" + str(patch_num) + "_patch_ORG.jpg", patch)
-                patch = patch/255
-                if saliency:
-                    patch = patch[:, :, np.newaxis]
-                patches.append(patch)
-                patch_num += 1
-            patches_list.append(np.asanyarray(patches))
-
-        df["patch"] = patches_list
-        df['img'] = df['img'].apply(lambda x: x / 255)
-        df = df[["sampleId", "patch", "img", "five_bins_bid", "binary_bid", "binary_bid_n"]]
+        # Every stim image (or cached saliency map) used is taken once, the patches of all samples are gathered
+        # from them
+        stims, image_index = np.unique(df.stimIndex.values, return_inverse=True)
+        if saliency and len(stims):
+            stim_images = np.stack([self.saliency_cache.get(self.imgpath, "Stim_0/", self.stim_images.stimNames[stim],
+                                                            self.stim_images.size) for stim in stims])
+        else:
+            stim_images = self.stim_images.images[stims]
+        # Clusters centers of the (x, y) datapoints of all scanpaths
+        points = np.concatenate([scanpath[:, -2:] for scanpath in df.scanpath]) if len(df) else np.empty((0, 2))
+        offsets = np.concatenate([[0], np.cumsum([len(scanpath) for scanpath in df.scanpath])]).astype(int)
+        centers = patch_centers(points, offsets, num_patches)
+        patches = extract_patches(stim_images, image_index, centers, patch_size)
+
+        df["patch"] = list(patches)
+        df = df[["sampleId", "patch", "stimName", "stimIndex", "five_bins_bid", "binary_bid", "binary_bid_n"]]
 
         return df
 
@@ -383,39 +437,22 @@ class DatasetBuilder:
 
         return df
 
-    def get_time_colored_dataset(self, df, stimType, timePeriodMilisec):
-        colored_path_list = []
-
+    def get_time_colored_dataset(self, df, stimType, timePeriodMilisec, seed=0):
+        """ This functions draws the scanpath of every sample with a new color every timePeriodMilisec datapoints
+            (one color when 0), colors are seeded by the sampleId and seed.
+            Samples are drawn in self.render_workers processes.
+            """
+        from modules.data.colored_path import colored_paths
         for stim in self.stims_array:
             if stim.name == stimType:
                 stim_size = stim.size
         print("Log... Building time colored dataset")
-        for scanpath in df.scanpath:
-            blank_img = np.zeros((stim_size[0], stim_size[1], 3), np.uint8)
-            toPlot = [cv2.resize(blank_img, (stim_size[0], stim_size[1]))]
-
-            for i in range(np.shape(scanpath)[0]):
-                if (i % timePeriodMilisec) == 0:
-                    r = random.randint(0, 255)
-                    g = random.randint(0, 255)
-                    b = random.randint(0, 255)
-                    rgb = [r, g, b]
-                fixation = scanpath[i].astype(int)
-
-                frame = np.copy(toPlot[-1]).astype(np.uint8)
+        colored_path_list = colored_paths(df.scanpath.tolist(), stim_size, timePeriodMilisec, df.sampleId.tolist(),
+                                          seed, self.render_workers)
 
-                if i > 0:
-                    prec_fixation = scanpath[i - 1].astype(int)
-                    cv2.line(frame, (prec_fixation[0], prec_fixation[1]), (fixation[0], fixation[1]), rgb,
-                             thickness=3, lineType=8, shift=0)
-
-                toPlot.append(frame)
-
-            colored_path_list.append(frame)
-
-        df["colored_path"] = colored_path_list
-        df['colored_path'] = df['colored_path'].apply(lambda x: x / 255)
-        df.to_json(self.datapath + "colored_path_dataset_" + stimType + "_" + str(timePeriodMilisec) + "_milisec.json")
+        df["colored_path"] = [(path / 255).astype(np.float32) for path in colored_path_list]
+        df[["sampleId", "colored_path"]].to_pickle(self.datapath + "colored_path_dataset_" + stimType + "_" +
+                                                   str(timePeriodMilisec) + "_milisec.pkl")
 
         return df[["sampleId", "colored_path"]]
 
@@ -433,11 +470,7 @@ class DatasetBuilder:
         return self.stims_array, scanpath_df, fixation_df
 
     def raw_data_tidying_for_fix_sacc_statistics(self):
-        try:
-            print("Log... Read data to json...")
-            fix_Df = pd.read_json(self.datapath + "fix_df_101_174_.json")
-            sacc_Df = pd.read_json(self.datapath + "sacc_df_101_174_.json")
-        except:
+        if not self.store.exists("raw_fix_sacc"):
             print("Log... reading raw data csv's")
             data1 = pd.read_csv(self.datapath + "subjects_101_110_fix_sacc_data.csv")
             data2 = pd.read_csv(self.datapath + "subjects_111_116_fix_sacc_data.csv")
@@ -450,18 +483,26 @@ class DatasetBuilder:
             data9 = pd.read_csv(self.datapath + "subjects_161_168_fix_sacc_data.csv")
             data10 = pd.read_csv(self.datapath + "subjects_169_174_fix_sacc_data.csv")
             all_data = pd.concat([data1, data2, data3, data4, data5, data6, data7, data8, data9, data10])
+            all_data.drop(['Unnamed: 0'], axis=1, inplace=True)
+            # Keep the parsed csv's in the store so they are read once
+            self.store.write("raw_fix_sacc", apply_schema(all_data), overwrite=True)
+
+        # Tidy only subjects ingested since the last run
+        new_subjects = self.store.missing_subjects("fix_events", "raw_fix_sacc")
+        if new_subjects:
+            all_data = self.store.read("raw_fix_sacc", subjects=new_subjects)
             fix_Df, sacc_Df = self.data_process.data_tidying_for_analysis_fix_sacc(all_data, self.screen_resolution)
-            print("Log... Saving data to json...")
-            fix_Df.to_json(self.datapath + "fix_df_101_174" + "_.json")
-            sacc_Df.to_json(self.datapath + "sacc_df_101_174" + "_.json")
+            self.store.write("fix_events", fix_Df)
+            self.store.write("sacc_events", sacc_Df)
+            self.store.mark_built("fix_events", new_subjects)
+            self.store.mark_built("sacc_events", new_subjects)
+        fix_Df = self.store.read("fix_events")
+        sacc_Df = self.store.read("sacc_events")
 
         return fix_Df, sacc_Df
 
     def raw_data_tidying(self):
-        try:
-            print("Log... reading tidy json")
-            tidy_data = pd.read_json(self.datapath + "tidy_data_101_174_.json")
-        except:
+        if not self.store.exists("raw_samples"):
             print("Log... reading raw data csv's")
             data1 = pd.read_csv(self.datapath + "subjects_101_128_raw_data.csv")
             data2 = pd.read_csv(self.datapath + "subjects_129_146_both_eye_raw_data.csv")
@@ -471,9 +512,18 @@ class DatasetBuilder:
             data6 = pd.read_csv(self.datapath + "subjects_161_165_raw_data.csv")
             data7 = pd.read_csv(self.datapath + "subjects_166_174_raw_data.csv")
             all_data = pd.concat([data1, data2, data3, data4, data5, data6, data7])
+            all_data.drop(['Unnamed: 0'], axis=1, inplace=True)
+            # Keep the parsed csv's in the store so they are read once
+            self.store.write("raw_samples", apply_schema(all_data), overwrite=True)
+
+        # Tidy only subjects ingested since the last run
+        new_subjects = self.store.missing_subjects("tidy", "raw_samples")
+        if new_subjects:
+            all_data = self.store.read("raw_samples", subjects=new_subjects)
             tidy_data = self.data_process.data_tidying_for_dataset_building(all_data, self.screen_resolution)
-            print("Log... Saving data to json...")
-            tidy_data.to_json(self.datapath + "tidy_data_101_174" + "_.json")
+            self.store.write("tidy", tidy_data)
+            self.store.mark_built("tidy", new_subjects)
+        tidy_data = self.store.read("tidy")
 
         #fixation_df = self.get_fixation_dataset(tidy_data)
         # fixation_df.to_json(self.datapath + "fixation_df_101_174.json")
@@ -496,11 +546,12 @@ class DatasetBuilder:
 
 
     def train_test_val_split(self, stimType, scanpath_df, fixation_df, seed):
+        from sklearn.model_selection import train_test_split
 
         try:
-            print("Log... reading train test json files")
-            train = pd.read_json(self.datapath + stimType + "train_set.json")
-            test = pd.read_json(self.datapath + stimType + "test_set.json")
+            print("Log... reading train test pickle files")
+            train = pd.read_pickle(self.datapath + stimType + "train_set.pkl")
+            test = pd.read_pickle(self.datapath + stimType + "test_set.pkl")
         except:
             print("Log... Building train, val, test datasets...")
             df = scanpath_df.merge(fixation_df, on='sampleId')
@@ -514,9 +565,10 @@ class DatasetBuilder:
             df_by_stim["subjectId"] = df_by_stim['sampleId'].apply(lambda x: x.split("_")[0])
             train, test = train_test_split(df_by_stim, stratify=df_by_stim[['subjectId']], test_size=0.10, random_state=33)
 
-            print("Log... Saving train, test datasets to json...")
-            train.to_json(self.datapath + stimType + "train_set.json")
-            test.to_json(self.datapath + stimType + "test_set.json")
+            print("Log... Saving train, test datasets to pickle...")
+            # Pickled so the sparse fixation maps are kept as they are
+            train.to_pickle(self.datapath + stimType + "train_set.pkl")
+            test.to_pickle(self.datapath + stimType + "test_set.pkl")
 
         train, val = train_test_split(train, stratify=train[['subjectId']],
                                      test_size=0.10, random_state=seed)
@@ -532,13 +584,11 @@ class DatasetBuilder:
         return train, val, test
 
     def load_data_for_fix_sacc_statistics(self, stimType):
-        print("Log... reading fixation and scanpath json's")
-        fixation_event_data = pd.read_json(self.datapath + "fix_df_101_174_.json")
-        saccad_event_data = pd.read_json(self.datapath + "sacc_df_101_174_.json")
-
-        # select only stimType data
-        fixation_event_data = fixation_event_data[fixation_event_data["stimType"] == stimType]
-        saccad_event_data = saccad_event_data[saccad_event_data["stimType"] == stimType]
+        if not self.store.exists("fix_events") or self.store.missing_subjects("fix_events", "raw_fix_sacc"):
+            self.raw_data_tidying_for_fix_sacc_statistics()
+        # read only stimType partitions
+        fixation_event_data = self.store.read("fix_events", stimType=stimType)
+        saccad_event_data = self.store.read("sacc_events", stimType=stimType)
 
         return fixation_event_data, saccad_event_data
 
@@ -561,19 +611,19 @@ class DatasetBuilder:
 
         return fixations_scanpath_df
 
-    def preper_data_for_model(self, df, stimType, scanpath_lan, is_scanpath, is_fixation, is_coloredpath,
-                              color_split, is_img, bin_count):
-
-        for stim in self.stims_array:
-            if stim.name == stimType:
-                stim_size = stim.size
+    def model_blocks(self, df, stimType, scanpath_lan, is_scanpath, is_fixation, is_coloredpath, color_split, is_img,
+                     bin_count):
+        """ This functions returns the model inputs of the samples of df as blocks - inputs, images (the images
+            input), labels, sampleIds and lengths (the scanpaths lengths before padding, None for other inputs).
+            """
         labels = self.load_labels_dataset(df)
         X1 = None
+        lengths = None
         if is_scanpath:
             scanpaths = self.load_scanpath_dataset(df)
             final_df = scanpaths.merge(labels, on='sampleId')
-            X2 = np.asanyarray(final_df.scanpath.tolist())
-            X2 = sequence.pad_sequences(X2, maxlen=scanpath_lan)
+            lengths = np.array([len(scanpath) for scanpath in final_df.scanpath], dtype=np.int64)
+            X2 = pad_sequences(final_df.scanpath.tolist(), maxlen=scanpath_lan)
             ###### add indexing column per x,y coordinates ######
             #index = [i for i in range(X2.shape[1])]
             #X2_indexed = []
@@ -589,15 +639,16 @@ class DatasetBuilder:
         if is_fixation:
             maps = self.load_fixation_maps_dataset(df)
             final_df = maps.merge(labels, on='sampleId')
-            X2 = np.asanyarray(final_df.fixationMap.tolist())
+            # Kept sparse, the models densify the maps of every batch at their input size
+            X2 = final_df.fixationMap.tolist()
         if is_coloredpath:
             colorpath = self.get_time_colored_dataset(df, stimType, color_split)
             final_df = colorpath.merge(labels, on='sampleId')
-            X2 = np.asanyarray(final_df.colorpath.tolist())
+            X2 = np.asanyarray(final_df.colored_path.tolist())
         if is_img:
-            images = self.load_images_dataset(self.imgpath, df, stim_size)
+            images = self.load_images_dataset(self.imgpath, df, self.get_stim_size(stimType))
             final_df = final_df.merge(images, on='sampleId')
-            X1 = np.asanyarray(final_df.img.tolist())
+            X1 = self.sample_images(final_df)
         if bin_count == 2:
             Y = np.asanyarray(final_df.binary_bid.tolist())
         elif bin_count == 5:
@@ -605,31 +656,67 @@ class DatasetBuilder:
         else:
             Y = np.asanyarray(final_df.bid.tolist())
 
-        return X1, X2, np.reshape(Y, (Y.shape[0], 1)), stim_size
+        return {'inputs': X2, 'images': X1, 'labels': np.reshape(Y, (Y.shape[0], 1)),
+                'sampleIds': final_df.sampleId.values, 'lengths': lengths}
+
+    def get_stim_size(self, stimType):
+        for stim in self.stims_array:
+            if stim.name == stimType:
+                return stim.size
+
+    def preper_data_for_model(self, df, stimType, scanpath_lan, is_scanpath, is_fixation, is_coloredpath,
+                              color_split, is_img, bin_count):
+        blocks = self.model_blocks(df, stimType, scanpath_lan, is_scanpath, is_fixation, is_coloredpath, color_split,
+                                   is_img, bin_count)
+
+        return blocks['images'], blocks['inputs'], blocks['labels'], self.get_stim_size(stimType)
 
     def get_train_dev_data_for_model_run(self, stims_array, scanpath_df, fixation_df, stimType, seed, scanpath_lan, color_split,
                                                                                    is_scanpath,
                                                                                    is_fixation,
                                                                                    is_coloredpath,
                                                                                    is_img, bin_count):
-
-        train, val, test = self.train_test_val_split(stimType, scanpath_df, fixation_df, seed)
-        trainImg, trainX, trainY, stim_size = self.preper_data_for_model(train, stimType, scanpath_lan,
-                                                                                   is_scanpath,
-                                                                                   is_fixation,
-                                                                                   is_coloredpath,
-                                                                                   color_split, is_img, bin_count)
-        valImg, valX, valY, stim_size = self.preper_data_for_model(val, stimType, scanpath_lan,
-                                                                             is_scanpath,
-                                                                             is_fixation,
-                                                                             is_coloredpath, color_split,
-                                                                             is_img, bin_count)
-        testImg, testX, testY, stim_size = self.preper_data_for_model(test, stimType, scanpath_lan,
-                                                                                is_scanpath,
-                                                                                is_fixation,
-                                                                                is_coloredpath, color_split,
-                                                                                is_img, bin_count)
-        return trainImg, trainX, trainY, valImg, valX, valY, stim_size
+        """ This functions returns the model ready train and val inputs, materialized once per parameters (and
+            source samples) in the split store and memory mapped by the next runs.
+            """
+        name = self.model_run_split(stims_array, scanpath_df, fixation_df, stimType, seed, scanpath_lan, color_split,
+                                    is_scanpath, is_fixation, is_coloredpath, is_img, bin_count)
+
+        return self.open_model_run_split(name, stimType)
+
+    def model_run_split(self, stims_array, scanpath_df, fixation_df, stimType, seed, scanpath_lan, color_split,
+                        is_scanpath, is_fixation, is_coloredpath, is_img, bin_count):
+        """ This functions materializes the model ready train, val and test blocks, when they are not materialized
+            yet, and returns their name in the split store.
+            """
+        params = {'split': 'model_run', 'stimType': stimType, 'seed': seed, 'scanpath_lan': scanpath_lan,
+                  'color_split': color_split, 'is_scanpath': is_scanpath, 'is_fixation': is_fixation,
+                  'is_coloredpath': is_coloredpath, 'is_img': is_img, 'bin_count': bin_count}
+        if is_fixation:
+            params['maps'] = 'sparse'
+        name = split_key(params, scanpath_df, fixation_df)
+        if not self.split_store.exists(name):
+            train, val, test = self.train_test_val_split(stimType, scanpath_df, fixation_df, seed)
+            splits = {}
+            for split, split_df in [('train', train), ('val', val), ('test', test)]:
+                blocks = self.model_blocks(split_df, stimType, scanpath_lan, is_scanpath, is_fixation,
+                                           is_coloredpath, color_split, is_img, bin_count)
+                if blocks['images'] is not None:
+                    blocks['images'] = blocks['images'].stimIndex
+                splits[split] = blocks
+            self.split_store.write(name, splits, params, self.stim_images if is_img else None)
+
+        return name
+
+    def open_model_run_split(self, name, stimType):
+        # Memory mapped train and val inputs of a materialized model run split
+        print("Log... Opening materialized splits " + name)
+        manifest, splits = self.split_store.read(name)
+        images = self.materialized_images(name, manifest, splits)
+        stim_size = self.get_stim_size(stimType)
+
+        return images['train'], splits['train']['inputs'], splits['train']['labels'], \
+               images['val'], splits['val']['inputs'], splits['val']['labels'], stim_size
 
     @abc.abstractmethod
     def l2_distance(x1, y1, z1, x2, y2, z2):
@@ -644,36 +731,30 @@ class DatasetBuilder:
     def summery_statistics_features(self, stimType):
 
         fixation_event_data, saccad_event_data = self.load_data_for_fix_sacc_statistics(stimType)
-        saccad_event_data['diff_x1_x2'] = saccad_event_data.S_X_axis - saccad_event_data.E_X_axis
-        saccad_event_data['diff_y1_y2'] = saccad_event_data.S_Y_axis - saccad_event_data.E_Y_axis
+        # Coordinates are stored as int16, widen them before squaring
+        saccad_event_data['diff_x1_x2'] = saccad_event_data.S_X_axis.astype(int) - saccad_event_data.E_X_axis.astype(int)
+        saccad_event_data['diff_y1_y2'] = saccad_event_data.S_Y_axis.astype(int) - saccad_event_data.E_Y_axis.astype(int)
         saccad_event_data['avg_l2_dist'] = np.sqrt(np.square(saccad_event_data.diff_x1_x2) + np.square(saccad_event_data.diff_y1_y2))
         #saccad_event_data['avg_l1_dist'] = np.abs(saccad_event_data.diff_x1_x2) + np.abs(saccad_event_data.diff_y1_y2)
 
-        x = fixation_event_data.groupby(['sampleId'])['duration'].mean().reset_index()
-        y = fixation_event_data.groupby(['sampleId'])['duration'].count().reset_index()
-        z = saccad_event_data.groupby(['sampleId'])['duration'].mean().reset_index()
-        t = saccad_event_data.groupby(['sampleId'])['duration'].count().reset_index()
-        a = x.join(z, how='inner', lsuffix='_fix', rsuffix='_sacc')
-        b = y.join(t, how='inner', lsuffix='_fix', rsuffix='_sacc')
-        c = a.join(b, how='inner', lsuffix='_a', rsuffix='_b')
-        c.drop(['sampleId_sacc_a', 'sampleId_fix_b', 'sampleId_sacc_b'], inplace=True, axis=1)
-        c.rename(columns={"sampleId_fix_a": "sampleId", "duration_fix_a": "avg_fix_duration", "duration_sacc_a": "avg_sacc_duration",
-                          "duration_fix_b": "fix_count", "duration_sacc_b": "sacc_count"}, inplace=True)
-        avg_l2_dist = saccad_event_data.groupby(['sampleId'])['avg_l2_dist'].mean().reset_index()
-        #avg_l1_dist = saccad_event_data.groupby(['sampleId'])['avg_l1_dist'].mean().reset_index()
-        e = c.join(avg_l2_dist, how='left',  rsuffix='_b')
-        #c = e.join(avg_l1_dist, how='left', rsuffix='_c')
-        e.drop(['sampleId_b'], inplace=True, axis=1)
-        e.reset_index(drop=True, inplace=True)
+        # The sampleId categories differ between the tables, the statistics are matched by the sampleId strings
+        fix_stats = fixation_event_data.groupby(['sampleId'], observed=True)['duration'].agg(
+            avg_fix_duration='mean', fix_count='count').reset_index()
+        sacc_stats = saccad_event_data.groupby(['sampleId'], observed=True).agg(
+            avg_sacc_duration=('duration', 'mean'), sacc_count=('duration', 'count'),
+            avg_l2_dist=('avg_l2_dist', 'mean')).reset_index()
+        #avg_l1_dist = saccad_event_data.groupby(['sampleId'], observed=True)['avg_l1_dist'].mean().reset_index()
+        fix_stats['sampleId'] = fix_stats['sampleId'].astype(str)
+        sacc_stats['sampleId'] = sacc_stats['sampleId'].astype(str)
+        e = fix_stats.merge(sacc_stats, on='sampleId', how='inner')
+        e = e[['sampleId', 'avg_fix_duration', 'avg_sacc_duration', 'fix_count', 'sacc_count', 'avg_l2_dist']]
         df = fixation_event_data[['sampleId', 'bid', 'subjectID', 'stimType', 'stimId', 'stimName']]
-        df.drop_duplicates(subset='sampleId', inplace=True)
-        df.sort_values(by=['sampleId'], inplace=True)
-        df.reset_index(drop=True, inplace=True)
-        final_df = df.join(e, how='inner', rsuffix='_c')
-        final_df.drop(['sampleId_c'], inplace=True, axis=1)
+        df = df.drop_duplicates(subset='sampleId')
+        df = df.assign(sampleId=df['sampleId'].astype(str))
+        final_df = df.merge(e, on='sampleId', how='inner')
+        final_df.sort_values(by=['sampleId'], inplace=True)
         final_df.reset_index(drop=True, inplace=True)
 
-
         return final_df
 
 
@@ -0,0 +1,72 @@
+import numpy as np
+import cv2
+import scipy.sparse
+
+
+def map_shape(stim_size, downsample=1):
+    # (height, width) of a fixation map of a stim of size [width, height], one bin per pixel by default
+    return -(-(stim_size[1] - 1) // downsample), -(-(stim_size[0] - 1) // downsample)
+
+
+def map_bins(values, size, downsample=1):
+    """ This functions returns the bins of values on the np.histogram2d grid with edges np.arange(size) used for
+        the fixation maps: size-1 bins of width 1, the last bin also holds values equal to size-1, values out of
+        [0, size-1] have no bin (valid is False).
+        With downsample > 1 every downsample consecutive bins are merged into one.
+        """
+    values = np.asarray(values, dtype=np.float64)
+    valid = (values >= 0) & (values <= size - 1)
+    bins = np.minimum(np.floor(np.where(valid, values, 0)).astype(np.int64), size - 2)
+
+    return bins // downsample, valid
+
+
+def fixation_maps(sample_index, x, y, n_samples, stim_size, downsample=1):
+    """ This functions builds the sparse fixation maps of n_samples samples of the same stim.
+        sample_index - the sample (0..n_samples-1) of every datapoint.
+        x, y - the datapoints coordinates within the stim.
+        The datapoints of all samples are counted in one sparse matrix over a combined (sample, y) row index,
+        every map returned is a (height, width) csr_matrix of int32 counts, the same counts as
+        np.histogram2d(x, y, bins=(np.arange(width + 1), np.arange(height + 1)))[0].T
+        """
+    height, width = map_shape(stim_size, downsample)
+    x_bins, x_valid = map_bins(x, stim_size[0], downsample)
+    y_bins, y_valid = map_bins(y, stim_size[1], downsample)
+    valid = x_valid & y_valid
+    rows = np.asarray(sample_index)[valid] * height + y_bins[valid]
+    # Duplicated (row, col) datapoints are summed into counts when converted to csr
+    counts = scipy.sparse.coo_matrix((np.ones(len(rows), dtype=np.int32), (rows, x_bins[valid])),
+                                     shape=(n_samples * height, width)).tocsr()
+
+    return [counts[i * height:(i + 1) * height] for i in range(n_samples)]
+
+
+def map_image(fixation_map):
+    """ This functions returns the uint8 image of a fixation map (sparse or dense), padded by one row and column to
+        the stim size. Counts are scaled as the maps were always converted to images - uint8(count) * 255 wrapping
+        around in uint8, so every visited pixel is bright.
+        """
+    if scipy.sparse.issparse(fixation_map):
+        fixation_map = fixation_map.toarray()
+    image = np.zeros((fixation_map.shape[0] + 1, fixation_map.shape[1] + 1), dtype=np.uint8)
+    image[:-1, :-1] = np.uint8(fixation_map)
+
+    return image * np.uint8(255)
+
+
+def densify(maps, size=None, channels=3, dtype=np.float32):
+    """ This functions returns the dense batch (samples, height, width, channels) of fixation maps (sparse or dense),
+        each map padded to the stim size and scaled to [0, 1] as in map_image / 255.
+        size - (width, height) to resize the maps to, None keeps the stim size.
+        channels - 3 repeats the map in RGB channels, 1 keeps one channel.
+        """
+    batch = np.empty((0, 0, 0, channels), dtype=dtype)
+    for i, fixation_map in enumerate(maps):
+        image = map_image(fixation_map)
+        if size is not None and (image.shape[1], image.shape[0]) != tuple(size):
+            image = cv2.resize(image, tuple(size), interpolation=cv2.INTER_AREA)
+        if i == 0:
+            batch = np.empty((len(maps), image.shape[0], image.shape[1], channels), dtype=dtype)
+        batch[i] = (image / 255)[:, :, np.newaxis]
+
+    return batch
@@ -0,0 +1,71 @@
+import os
+import json
+import hashlib
+
+
+class IngestManifest:
+
+    def __init__(self, manifest_path):
+        """ Record of the source files every ingested subject was parsed from.
+            For each subject id the manifest keeps the data directory and, per source file (asc, scale txt,
+            personal details txt), its size, mtime and sha1 content hash. A subject is parsed again only
+            when one of its files is new or has a different content.
+            """
+        self.manifest_path = manifest_path
+        self.subjects = {}
+        if os.path.isfile(manifest_path):
+            with open(manifest_path, 'r') as manifestFile:
+                self.subjects = json.load(manifestFile)
+
+    @staticmethod
+    def file_hash(file_path, block_size=1 << 20):
+        sha1 = hashlib.sha1()
+        with open(file_path, 'rb') as sourceFile:
+            for block in iter(lambda: sourceFile.read(block_size), b''):
+                sha1.update(block)
+        return sha1.hexdigest()
+
+    def file_entry(self, file_path, recorded=None):
+        stat = os.stat(file_path)
+        entry = {'size': stat.st_size, 'mtime': stat.st_mtime}
+        # Same size and mtime as recorded, the file is not hashed again
+        if recorded is not None and recorded['size'] == entry['size'] and recorded['mtime'] == entry['mtime']:
+            entry['sha1'] = recorded['sha1']
+        else:
+            entry['sha1'] = self.file_hash(file_path)
+        return entry
+
+    def subject_entry(self, subject_id, data_directory, file_paths):
+        recorded_files = self.subjects.get(str(subject_id), {}).get('files', {})
+        files = {}
+        for file_path in file_paths:
+            fileName = os.path.basename(file_path)
+            files[fileName] = self.file_entry(file_path, recorded_files.get(fileName))
+        return {'data_directory': data_directory, 'files': files}
+
+    def is_changed(self, subject_id, entry):
+        recorded = self.subjects.get(str(subject_id))
+        if recorded is None or set(recorded['files']) != set(entry['files']):
+            return True
+        return any(recorded['files'][fileName]['sha1'] != fileEntry['sha1']
+                   for fileName, fileEntry in entry['files'].items())
+
+    def directory_subjects(self, data_directory):
+        return [subject_id for subject_id, recorded in self.subjects.items()
+                if recorded['data_directory'] == data_directory]
+
+    def update(self, subject_id, entry):
+        self.subjects[str(subject_id)] = entry
+
+    def remove(self, subject_id):
+        self.subjects.pop(str(subject_id), None)
+
+    def save(self):
+        manifest_dir = os.path.dirname(self.manifest_path)
+        if manifest_dir and not os.path.isdir(manifest_dir):
+            os.makedirs(manifest_dir)
+        # Write to a temporary file first so an interrupted run never leaves a partial manifest
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w') as manifestFile:
+            json.dump(self.subjects, manifestFile, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
@@ -0,0 +1,64 @@
+import numpy as np
+
+
+def pad_sequences(sequences, maxlen=None, dtype='int32', padding='pre', truncating='pre', value=0., return_mask=False):
+    """ This functions packs ragged sequences (scanpaths) into one (samples, maxlen, ...) array, as
+        keras.preprocessing.sequence.pad_sequences does.
+        maxlen - the length of the packed sequences, the longest sequence length by default.
+        padding / truncating - 'pre' pads / cuts at the start of a sequence, 'post' at its end.
+        return_mask - also return the (samples, maxlen) bool mask of the steps holding sequence values.
+        Every sequence is copied once, as one slice, into the preallocated output.
+        """
+    if padding not in ('pre', 'post') or truncating not in ('pre', 'post'):
+        raise ValueError('padding and truncating must be "pre" or "post"')
+    lengths = np.array([len(sequence) for sequence in sequences], dtype=np.int64)
+    if maxlen is None:
+        maxlen = int(lengths.max()) if len(lengths) else 0
+    sample_shape = next((np.shape(sequence)[1:] for sequence in sequences if len(sequence)), ())
+
+    kept = np.minimum(lengths, maxlen)
+    padded = np.full((len(sequences), maxlen) + sample_shape, value, dtype=dtype)
+    for i, (sequence, length, keep) in enumerate(zip(sequences, lengths, kept)):
+        if keep == 0:
+            continue
+        steps = sequence[length - keep:] if truncating == 'pre' else sequence[:keep]
+        if padding == 'pre':
+            padded[i, maxlen - keep:] = steps
+        else:
+            padded[i, :keep] = steps
+
+    if return_mask:
+        steps = np.arange(maxlen)
+        if padding == 'pre':
+            mask = steps >= (maxlen - kept)[:, np.newaxis]
+        else:
+            mask = steps < kept[:, np.newaxis]
+        return padded, mask
+
+    return padded
+
+
+def length_buckets(lengths, n_buckets=4, maxlen=None):
+    """ This functions splits the samples into n_buckets groups of similar lengths (quantiles of the lengths,
+        capped by maxlen) and returns the samples indices of every non empty bucket, shortest sequences first.
+        """
+    lengths = np.asarray(lengths)
+    if maxlen is not None:
+        lengths = np.minimum(lengths, maxlen)
+    order = np.argsort(lengths, kind='stable')
+    return [bucket for bucket in np.array_split(order, n_buckets) if len(bucket)]
+
+
+def pad_buckets(sequences, n_buckets=4, maxlen=None, **pad_args):
+    """ This functions pads the sequences in buckets of similar lengths, every bucket only to its longest
+        sequence (at most maxlen) instead of padding all samples to the longest one.
+        Returns (indices, padded) for every bucket, (indices, padded, mask) with return_mask.
+        """
+    lengths = [len(sequence) for sequence in sequences]
+    buckets = []
+    for indices in length_buckets(lengths, n_buckets, maxlen):
+        bucketLen = min(max(lengths[i] for i in indices), maxlen) if maxlen is not None else None
+        padded = pad_sequences([sequences[i] for i in indices], maxlen=bucketLen, **pad_args)
+        buckets.append((indices,) + (padded if isinstance(padded, tuple) else (padded,)))
+
+    return buckets
@@ -0,0 +1,49 @@
+import numpy as np
+
+
+def patch_centers(points, offsets, num_patches):
+    """ This functions returns the (samples, num_patches, 2) rounded (x, y) centers of the datapoints clusters of all
+        samples, the clusters np.array_split(scanpath, num_patches) of every sample scanpath.
+        points - the (x, y) datapoints of all samples, sample i datapoints are points[offsets[i]:offsets[i+1]].
+        Every sample needs num_patches datapoints or more (no empty cluster).
+        All clusters means are computed at once with one segment sum over the clusters start rows.
+        """
+    offsets = np.asarray(offsets)
+    counts = np.diff(offsets)
+    if (counts < num_patches).any():
+        raise ValueError('samples with less than ' + str(num_patches) + ' datapoints have empty clusters')
+    # np.array_split sizes - the first count % num_patches clusters of a sample hold one more datapoint
+    clusters = np.arange(num_patches)
+    sizes = counts[:, np.newaxis] // num_patches + (clusters < (counts % num_patches)[:, np.newaxis])
+    starts = offsets[:-1, np.newaxis] + np.cumsum(sizes, axis=1) - sizes
+    sums = np.add.reduceat(np.asarray(points, dtype=np.float64), starts.ravel(), axis=0)
+    centers = sums / sizes.reshape(-1, 1)
+
+    return centers.round().astype(int).reshape(len(counts), num_patches, 2)
+
+
+def extract_patches(images, image_index, centers, patch_size, dtype=np.float32):
+    """ This functions returns the (samples, num_patches, patch_size, patch_size, channels) patches around centers,
+        scaled to [0, 1].
+        images - (stims, height, width, channels) uint8 images, sample i patches are taken from images[image_index[i]].
+        centers - (samples, num_patches, 2) (x, y) patch centers.
+        A patch covers [center - patch_size // 2, center + patch_size // 2) in both axes, pixels out of the image
+        (and the last row and column of odd patch sizes) are black.
+        All patches are gathered in one fancy index over windows of the zero padded images.
+        """
+    length = int(patch_size / 2)
+    n_samples, num_patches = centers.shape[:2]
+    # Padding by the patch size on every side keeps all windows of centers within the image in bounds
+    padded = np.pad(images, [(0, 0), (patch_size, patch_size), (patch_size, patch_size), (0, 0)], mode='constant')
+    x = np.clip(centers[:, :, 0] - length + patch_size, 0, padded.shape[2] - 2 * length)
+    y = np.clip(centers[:, :, 1] - length + patch_size, 0, padded.shape[1] - 2 * length)
+    rows = y[:, :, np.newaxis, np.newaxis] + np.arange(2 * length)[:, np.newaxis]
+    cols = x[:, :, np.newaxis, np.newaxis] + np.arange(2 * length)
+    stims = np.asarray(image_index)[:, np.newaxis, np.newaxis, np.newaxis]
+
+    patches = np.zeros((n_samples, num_patches, patch_size, patch_size, images.shape[3]), dtype=dtype)
+    patches[:, :, :2 * length, :2 * length] = padded[stims, rows, cols]
+    patches /= 255
+
+    return patches
+
@@ -1,12 +1,16 @@
+import numpy as np
 import pandas as pd
-import codecs
 import os
 import glob
+from multiprocessing import Pool
+from modules.data.asc_reader import AscReader, iter_trials
+from modules.data.manifest import IngestManifest
+from modules.data.schema import apply_schema, sample_ids
 
 
 class DataPreprocess:
 
-    def __init__(self, exp_name, both_eye_data_path, one_eye_data_path, trial_start_str, trial_end_str, output_file_both_eye, output_file_one_eye, stimarray):
+    def __init__(self, exp_name, both_eye_data_path, one_eye_data_path, trial_start_str, trial_end_str, output_file_both_eye, output_file_one_eye, stimarray, n_workers=1, store=None):
         self.exp_name = exp_name
         self.both_eye_data_path = both_eye_data_path
         self.one_eye_data_path = one_eye_data_path
@@ -15,92 +19,40 @@ class DataPreprocess:
         self.output_file_both_eye = output_file_both_eye
         self.output_file_one_eye = output_file_one_eye
         self.stimarray = stimarray
+        # Number of processes parsing subjects in parallel, 1 parses the subjects one after another
+        self.n_workers = n_workers
+        # ProcessedStore the parsed subjects are written to, None keeps writing the output csv files
+        self.store = store
 
     def read_eyeTracking_data_both_eye_recorded(self, fixation_saccad_data):
-        flag = 0
         path = os.getcwd()
         # Set directory name that contains output directory with asc and txt files
-        asc_directory = self.both_eye_data_path
-        txt_directory = self.both_eye_data_path
-        excluded_participents = pd.read_table(path + txt_directory + '//' + 'excluded_participents.txt')
-        # Set string represents trail start data records
-        indexStartStr = self.trial_start_str  # 'TrialStart'
-        # Set string represents trail ends data records
-        indexEndStr = self.trial_end_str  # 'ScaleStart'
-        # Run over each Ascii file and open it
-        for ascFile in glob.glob(path + asc_directory + '//*asc'):
-            ascFileName = os.path.basename(ascFile)
-            tempList = ascFileName.split('_')
-            subjectIntId = tempList[0]
-            id = int(subjectIntId)
-            # exclude partcipents
-            if id in excluded_participents.exclude.values:
-                print('Excluded subjectId - ' + subjectIntId)
-                continue
-            # Hack for reading new participents data only #####
-            if id < 169:
-                print('Excluded subjectId - ' + subjectIntId)
-                continue
-            if id > 174:
-                break
-            ##################################################
-            print('Log.....Getting Ascii file data - ' + ascFileName)
-            ascFile = codecs.open(path + asc_directory + '//' + ascFileName, encoding='utf-8-sig')
-            ascData = ascFile.readlines()
-            # Split data to columns and get only relevnt ones
-            ascDf = pd.DataFrame(ascData, columns=['data'])
-            ascDf = pd.DataFrame([x.split('\t') for x in list(ascDf['data'])])
-            ascDf = ascDf[[0, 1, 2, 3, 4, 5, 6]]
-            print('Log.....Getting txt file data for subject id - ' + subjectIntId)
-            # Read txt file of subject same subject as asc file
-            txtFileName = os.path.basename(glob.glob(path + txt_directory + '//*' + subjectIntId + '_Scale' + '*txt')[0])
-            txtData = pd.read_table(path + txt_directory + '//' + txtFileName)
-            # Get number of trials and subject ID
-            trialCount = txtData.count()[0]
-            # subjectId = txtData['subjectID'][0]
-            print('Log.....Runing over all trials of subject id - ' + subjectIntId)
-            # Run over all trials per user and merge the asc data with the txt data
-            for trial in range(trialCount):
-                trial_str = 'Trial' + str(trial + 1).zfill(3)
-                indexStart = ascDf[ascDf[1].str.contains(indexStartStr, na=False) &
-                                   ascDf[1].str.contains(trial_str, na=False)].index[0] + 1
-                indexEnd = ascDf[ascDf[1].str.contains(indexEndStr, na=False) &
-                                 ascDf[1].str.contains(trial_str, na=False)].index[0] - 1
-                # Get the data, starting from 'TrialStart' to subjects 'Response'
-                trialData = ascDf.loc[indexStart:indexEnd]
-                # trialData['subjectID'] = subjectIntId
-                trialData['trial'] = trial + 1
-                mergeData = pd.merge(txtData, trialData, on='trial')
-                if (trial + 1 == 1):
-                    allTrialsData = pd.DataFrame(columns=mergeData.columns)
-                allTrialsData = pd.concat([allTrialsData, mergeData])
-                print('Log.....' + 'Trial' + str(trial + 1).zfill(3))
-
-            # get onlydominant eye data
-            txtFilePersonalDataName = os.path.basename(
-                glob.glob(path + txt_directory + '//*' + subjectIntId + '_personalDetails' + '*txt')[0])
-            txtpersonalData = pd.read_table(path + txt_directory + '//' + txtFilePersonalDataName)
-            dominant_eye = txtpersonalData['dominant eye (1-right, 2-left)'].values[0]
-            if fixation_saccad_data:
-                if dominant_eye == 1:
-                    allTrialsData['dominant_eye'] = 'R'
-                else:
-                    allTrialsData['dominant_eye'] = 'L'
-            else:
-                if dominant_eye == 1:
-                    allTrialsData = allTrialsData.drop([1, 2, 3], axis=1)
-                    allTrialsData.rename(columns={4: 1, 5: 2, 6: 3}, inplace=True)
-                    allTrialsData['dominant_eye'] = 'R'
-                else:
-                    allTrialsData = allTrialsData.drop([4, 5, 6], axis=1)
-                    allTrialsData['dominant_eye'] = 'L'
-
-            # Appending all data to one DataFrame
-            if flag == 0:
-                allSubjectsData = pd.DataFrame(columns=allTrialsData.columns)
-                flag = 1
-            allSubjectsData = pd.concat([allSubjectsData, allTrialsData])
+        data_directory = self.both_eye_data_path
+        ascFileNames = self.subjects_asc_files(data_directory)
+        if self.store is not None:
+            return self.ingest_subjects_data(data_directory, ascFileNames, fixation_saccad_data, True)
+
+        data_csv_path = path + self.output_file_both_eye
+        # Store all subjects data DF as CSV
+        self.write_subjects_csv(data_csv_path, data_directory, ascFileNames, fixation_saccad_data, True)
+        # returns path for data csv file
+        return data_csv_path
+
+    def read_eyeTracking_data_one_eye_recorded(self, fixation_saccad_data):
+        path = os.getcwd()
+        # Set directory name that contains output directory with asc and txt files
+        data_directory = self.one_eye_data_path
+        ascFileNames = self.subjects_asc_files(data_directory)
+        if self.store is not None:
+            return self.ingest_subjects_data(data_directory, ascFileNames, fixation_saccad_data, False)
+
+        data_csv_path = path + self.output_file_one_eye
+        # Store all subjects data DF as CSV
+        self.write_subjects_csv(data_csv_path, data_directory, ascFileNames, fixation_saccad_data, False)
+        # returns path for data csv file
+        return data_csv_path
 
+    def rename_subjects_data_columns(self, allSubjectsData, fixation_saccad_data):
         if fixation_saccad_data:
             #Rename columns
             allSubjectsData.columns = ['subjectID', 'trialNum', 'onsettime', 'stimName', 'bid', 'RT', 'stimType',
@@ -114,109 +66,166 @@ class DataPreprocess:
             allSubjectsData.columns = ['subjectID', 'trialNum', 'onsettime', 'stimName', 'bid', 'RT', 'stimType', 'stimId',
                                        'timeStamp', 'X_axis', 'Y_axis', 'pupil_size', 'dominant_eye']
 
-        # Store all subjects data DF as CSV
-        allSubjectsData.to_csv(path + self.output_file_both_eye)
-        data_csv_path = path + self.output_file_both_eye
-        # returns path for data csv file
-        return data_csv_path
+    def ingest_subjects_data(self, data_directory, ascFileNames, fixation_saccad_data, both_eye):
+        # Fixations and saccades events and raw samples are kept in separate store tables
+        table = 'raw_fix_sacc' if fixation_saccad_data else 'raw_samples'
+        manifest = IngestManifest(self.store.table_path(table) + '_manifest.json')
+        # Parse only subjects with new or changed source files since the last ingest
+        subjectsEntries = {}
+        changedAscFileNames = []
+        for ascFileName in ascFileNames:
+            subjectIntId = ascFileName.split('_')[0]
+            entry = manifest.subject_entry(subjectIntId, data_directory, self.subject_files(data_directory, ascFileName))
+            subjectsEntries[subjectIntId] = entry
+            if manifest.is_changed(subjectIntId, entry):
+                changedAscFileNames.append(ascFileName)
+            else:
+                manifest.update(subjectIntId, entry)
+        # Subjects removed or excluded since the last ingest are removed from the store
+        removedSubjects = [subjectIntId for subjectIntId in manifest.directory_subjects(data_directory)
+                           if subjectIntId not in subjectsEntries]
+        self.store.delete_subjects(table, removedSubjects)
+        for subjectIntId in removedSubjects:
+            print('Log.....Removing subject id - ' + subjectIntId)
+            manifest.remove(subjectIntId)
+
+        print('Log.....' + str(len(changedAscFileNames)) + ' new or changed subjects out of ' + str(len(ascFileNames)))
+        # Every subject is written as soon as it is parsed, an interrupted ingest keeps the subjects written so far
+        subjectsData = self.iter_subjects_data(data_directory, changedAscFileNames, fixation_saccad_data, both_eye)
+        for ascFileName, subjectData in zip(changedAscFileNames, subjectsData):
+            subjectIntId = ascFileName.split('_')[0]
+            self.rename_subjects_data_columns(subjectData, fixation_saccad_data)
+            self.store.write(table, apply_schema(subjectData))
+            manifest.update(subjectIntId, subjectsEntries[subjectIntId])
+            manifest.save()
+        manifest.save()
+        # returns path for data store table
+        return self.store.table_path(table)
+
+    def subject_files(self, data_directory, ascFileName):
+        # Source files of a subject - asc file, scale txt file and personal details txt file
+        path = os.getcwd()
+        subjectIntId = ascFileName.split('_')[0]
+        txtFile = glob.glob(path + data_directory + '//*' + subjectIntId + '_Scale' + '*txt')[0]
+        txtPersonalDataFile = glob.glob(path + data_directory + '//*' + subjectIntId + '_personalDetails' + '*txt')[0]
+        return [path + data_directory + '//' + ascFileName, txtFile, txtPersonalDataFile]
 
-    def read_eyeTracking_data_one_eye_recorded(self, fixation_saccad_data):
-        flag = 0
+    def subjects_asc_files(self, data_directory):
         path = os.getcwd()
-        # Set directory name that contains output directory with asc and txt files
-        asc_directory = self.one_eye_data_path
-        txt_directory = self.one_eye_data_path
-        excluded_participents = pd.read_table(path + txt_directory + '//' + 'excluded_participents.txt')
-        # Set string represents trail start data records
-        indexStartStr = self.trial_start_str  # 'TrialStart'
-        # Set string represents trail ends data records
-        indexEndStr = self.trial_end_str  # 'ScaleStart'
-        # Run over each Ascii file and open it
-        for ascFile in glob.glob(path + asc_directory + '//*asc'):
+        excluded_participents = pd.read_table(path + data_directory + '//' + 'excluded_participents.txt')
+        ascFileNames = []
+        # Run over each Ascii file ordered by subject id, so subjects are always merged in the same order
+        ascFiles = sorted(glob.glob(path + data_directory + '//*asc'),
+                          key=lambda ascFile: int(os.path.basename(ascFile).split('_')[0]))
+        for ascFile in ascFiles:
             ascFileName = os.path.basename(ascFile)
             tempList = ascFileName.split('_')
             subjectIntId = tempList[0]
             id = int(subjectIntId)
+            # exclude partcipents
             if id in excluded_participents.exclude.values:
                 print('Excluded subjectId - ' + subjectIntId)
                 continue
-            # Hack for reading new participents data only #####
-            if id <= 128:
-                print('Excluded subjectId - ' + subjectIntId)
+            ascFileNames.append(ascFileName)
+
+        return ascFileNames
+
+    def iter_subjects_data(self, data_directory, ascFileNames, fixation_saccad_data, both_eye):
+        """ This functions yields the data of every subject in ascFileNames order, as soon as it is parsed, so only
+            the subjects being parsed are held in memory.
+            """
+        subjects_args = [(data_directory, ascFileName, fixation_saccad_data, both_eye) for ascFileName in ascFileNames]
+        if self.n_workers > 1:
+            print('Log.....Parsing ' + str(len(ascFileNames)) + ' subjects with ' + str(self.n_workers) + ' workers')
+            # Each subject files are independent, imap returns the results in subjects order
+            with Pool(processes=self.n_workers) as pool:
+                for subjectData in pool.imap(self.read_subject_data_args, subjects_args, chunksize=1):
+                    yield subjectData
+        else:
+            for subject_args in subjects_args:
+                yield self.read_subject_data(*subject_args)
+
+    def write_subjects_csv(self, csv_path, data_directory, ascFileNames, fixation_saccad_data, both_eye):
+        # Subjects are appended to the csv one after another, rows keep their index within their subject
+        header = True
+        for subjectData in self.iter_subjects_data(data_directory, ascFileNames, fixation_saccad_data, both_eye):
+            self.rename_subjects_data_columns(subjectData, fixation_saccad_data)
+            subjectData.to_csv(csv_path, mode='w' if header else 'a', header=header)
+            header = False
+
+    def read_subject_data_args(self, subject_args):
+        return self.read_subject_data(*subject_args)
+
+    def read_subject_data(self, data_directory, ascFileName, fixation_saccad_data, both_eye):
+        path = os.getcwd()
+        asc_directory = data_directory
+        txt_directory = data_directory
+        # Set string represents trail start data records
+        indexStartStr = self.trial_start_str  # 'TrialStart'
+        # Set string represents trail ends data records
+        indexEndStr = self.trial_end_str  # 'ScaleStart'
+        subjectIntId = ascFileName.split('_')[0]
+        print('Log.....Getting txt file data for subject id - ' + subjectIntId)
+        # Read txt file of subject same subject as asc file
+        txtFileName = os.path.basename(glob.glob(path + txt_directory + '//*' + subjectIntId + '_Scale' + '*txt')[0])
+        txtData = pd.read_table(path + txt_directory + '//' + txtFileName)
+        # Get number of trials and subject ID
+        trialCount = txtData.count()[0]
+        # subjectId = txtData['subjectID'][0]
+        print('Log.....Getting Ascii file data - ' + ascFileName)
+        # Stream the asc file once, samples of the recorded eyes come as typed arrays
+        if both_eye or fixation_saccad_data:
+            ascFields = 7
+        else:
+            ascFields = 4
+        ascReader = AscReader(path + asc_directory + '//' + ascFileName, ascFields,
+                              read_samples=not fixation_saccad_data)
+        print('Log.....Runing over all trials of subject id - ' + subjectIntId)
+        # Trials come one by one while the file is read, only the trials records are kept
+        trialsData = {}
+        for trialNum, trialRecords in iter_trials(ascReader.iter_chunks(), indexStartStr, indexEndStr):
+            if trialNum > trialCount:
                 continue
-            if id > 146:
-                break
-            ##################################################
-            print('Log.....Getting Ascii file data - ' + ascFileName)
-            ascFile = codecs.open(path + asc_directory + '//' + ascFileName, encoding='utf-8-sig')
-            ascData = ascFile.readlines()
-            # Split data to columns and get only relevnt ones
-            ascDf = pd.DataFrame(ascData, columns=['data'])
-            ascDf = pd.DataFrame([x.split('\t') for x in list(ascDf['data'])])
-            if fixation_saccad_data:
-                ascDf = ascDf[[0, 1, 2, 3, 4, 5, 6]]
-            else:
-                ascDf = ascDf[[0, 1, 2, 3]]
-            print('Log.....Getting txt file data for subject id - ' + subjectIntId)
-            # Read txt file of subject same subject as asc file
-            txtFileName = os.path.basename(glob.glob(path + txt_directory + '//*' + subjectIntId + '_Scale' + '*txt')[0])
-            txtData = pd.read_table(path + txt_directory + '//' + txtFileName)
-            # Get number of trials and subject ID
-            trialCount = txtData.count()[0]
-            # subjectId = txtData['subjectID'][0]
-            print('Log.....Runing over all trials of subject id - ' + subjectIntId)
-            # Run over all trials per user and merge the asc data with the txt data
-            for trial in range(trialCount):
-                trial_str = 'Trial' + str(trial + 1).zfill(3)
-                indexStart = ascDf[ascDf[1].str.contains(indexStartStr, na=False) &
-                                   ascDf[1].str.contains(trial_str, na=False)].index[0] + 1
-                indexEnd = ascDf[ascDf[1].str.contains(indexEndStr, na=False) &
-                                 ascDf[1].str.contains(trial_str, na=False)].index[0] - 1
-                # Get the data, starting from 'TrialStart' to subjects 'Response'
-                trialData = ascDf.loc[indexStart:indexEnd]
-                # trialData['subjectID'] = subjectIntId
-                trialData['trial'] = trial + 1
-                mergeData = pd.merge(txtData, trialData, on='trial')
-                if (trial + 1 == 1):
-                    allTrialsData = pd.DataFrame(columns=mergeData.columns)
-                allTrialsData = pd.concat([allTrialsData, mergeData])
-                print('Log.....' + 'Trial' + str(trial + 1).zfill(3))
-
-            # add dominant eye field
-            txtFilePersonalDataName = os.path.basename(
-                glob.glob(path + txt_directory + '//*' + subjectIntId + '_personalDetails' + '*txt')[0])
-            txtpersonalData = pd.read_table(path + txt_directory + '//' + txtFilePersonalDataName)
-            dominant_eye = txtpersonalData['dominant eye (1-right, 2-left)'].values[0]
+            # Get the data, starting from 'TrialStart' to subjects 'Response'
+            trialData = self.asc_trial_data(trialRecords, fixation_saccad_data, ascFields)
+            # trialData['subjectID'] = subjectIntId
+            trialData['trial'] = trialNum
+            trialsData[trialNum] = trialData
+            print('Log.....' + 'Trial' + str(trialNum).zfill(3))
+        # Merge the trials asc data once with the txt data, in trials order
+        trialsData = [trialsData[trial + 1] for trial in range(trialCount)]
+        allTrialsData = pd.merge(txtData, pd.concat(trialsData, ignore_index=True), on='trial')
+
+        # add dominant eye field
+        txtFilePersonalDataName = os.path.basename(
+            glob.glob(path + txt_directory + '//*' + subjectIntId + '_personalDetails' + '*txt')[0])
+        txtpersonalData = pd.read_table(path + txt_directory + '//' + txtFilePersonalDataName)
+        dominant_eye = txtpersonalData['dominant eye (1-right, 2-left)'].values[0]
+        if both_eye and not fixation_saccad_data:
+            # get only dominant eye data
             if dominant_eye == 1:
-                allTrialsData['dominant_eye'] = 'R'
+                allTrialsData = allTrialsData.drop([1, 2, 3], axis=1)
+                allTrialsData.rename(columns={4: 1, 5: 2, 6: 3}, inplace=True)
             else:
-                allTrialsData['dominant_eye'] = 'L'
+                allTrialsData = allTrialsData.drop([4, 5, 6], axis=1)
+        if dominant_eye == 1:
+            allTrialsData['dominant_eye'] = 'R'
+        else:
+            allTrialsData['dominant_eye'] = 'L'
 
-            # Appending all data to one DataFrame
-            if flag == 0:
-                allSubjectsData = pd.DataFrame(columns=allTrialsData.columns)
-                flag = 1
-            allSubjectsData = pd.concat([allSubjectsData, allTrialsData])
+        return allTrialsData
 
+    def asc_trial_data(self, trialRecords, fixation_saccad_data, ascFields):
+        # Records found strictly between the trial start and end markers lines
         if fixation_saccad_data:
-            # Rename columns if needed
-            allSubjectsData.columns = ['subjectID', 'trialNum', 'onsettime', 'stimName', 'bid', 'RT', 'stimType',
-                                       'stimId', '0', '1', '2', '3', '4',
-                                       '5', '6', '7']
-        elif self.exp_name == 'weizmann':
-            # Rename columns if needed
-            allSubjectsData.columns = ['subjectID', 'trialNum', 'onsettime', 'stimName', 'bid', 'RT', 'stimType', 'stimId',
-                                       'runNum', 'timeStamp', 'X_axis', 'Y_axis', 'pupil_size', 'dominant_eye']
+            # EFIX / ESACC records are kept as raw fields, padded to the requested columns count
+            events = [(fields + [None] * ascFields)[:ascFields] for line, fields in trialRecords.events]
+            trialData = pd.DataFrame(events, columns=list(range(ascFields)))
         else:
-            # Rename columns if needed
-            allSubjectsData.columns = ['subjectID', 'trialNum', 'onsettime', 'stimName', 'bid', 'RT', 'stimType', 'stimId',
-                                       'timeStamp', 'X_axis', 'Y_axis', 'pupil_size', 'dominant_eye']
+            trialData = pd.DataFrame(trialRecords.values, columns=list(range(1, ascFields)))
+            trialData.insert(0, 0, trialRecords.timestamp)
 
-        # Store all subjects data DF as CSV
-        allSubjectsData.to_csv(path + self.output_file_one_eye)
-        data_csv_path = path + self.output_file_one_eye
-        # returns path for data csv file
-        return data_csv_path
+        return trialData
 
     def find_stim_boundaries(self, screen_resolution, stim_resolution):
         min_x = (screen_resolution[1] / 2) - (stim_resolution[0] / 2)
@@ -226,12 +235,36 @@ class DataPreprocess:
 
         return min_x, max_x, min_y, max_y
 
+    def stim_boundaries_lookup(self, screen_resolution):
+        # Stims boundaries indexed by stimId - rows of min_x, max_x, min_y, max_y, ids with no stim have nan boundaries
+        boundaries = np.full((max(int(stim.id) for stim in self.stimarray) + 1, 4), np.nan)
+        for stim in self.stimarray:
+            boundaries[int(stim.id)] = self.find_stim_boundaries(screen_resolution, stim.size)
+
+        return boundaries
+
+    def stim_region_mask(self, df, boundaries, x_fields, y_fields):
+        """ This functions returns the mask of datapoints within their stim boundaries, all the x_fields and y_fields
+            of a row are checked against the boundaries of the row stimId, and the boundaries of each row.
+            """
+        stimIds = pd.to_numeric(df['stimId'], errors='coerce').fillna(-1).values.astype(int)
+        known = (stimIds >= 0) & (stimIds < len(boundaries))
+        rowBoundaries = boundaries[np.where(known, stimIds, 0)]
+        rowBoundaries[~known] = np.nan
+        # Comparing with nan boundaries is always False, so unknown stims are filtered out
+        mask = known
+        for field in x_fields:
+            mask = mask & (df[field].values >= rowBoundaries[:, 0]) & (df[field].values <= rowBoundaries[:, 1])
+        for field in y_fields:
+            mask = mask & (df[field].values >= rowBoundaries[:, 2]) & (df[field].values <= rowBoundaries[:, 3])
+
+        return mask, rowBoundaries
+
     def data_tidying_for_dataset_building(self, df, screen_resolution):
         print('Log..... Data tidying')
-        flag = 0
         screen_resolution = [int(x) for x in screen_resolution.split(',')]
         # add 'sampleId' field for each uniqe sample
-        df['sampleId'] = df['subjectID'].astype(str) + '_' + df['stimName'].astype(str)
+        df['sampleId'] = sample_ids(df)
 
         # Change X, Y and timeStamp data from String to Numeric changing strings " . ", "EBLINK", FIX", "SACC" to nan
         df.X_axis = pd.to_numeric(df.X_axis, errors='coerce')
@@ -246,31 +279,21 @@ class DataPreprocess:
         df.timeStamp = df.timeStamp.astype(int)
         df = df[df.bid != 999]
         df.reset_index(drop=True, inplace=True)
-        for stim in self.stimarray:
-            stim_id = int(stim.id)
-            stim_resolution = stim.size
-            min_x, max_x, min_y, max_y = self.find_stim_boundaries(screen_resolution, stim_resolution)
-            # get only datapoints within stim boundaries
-            stimRegion = df[((df['stimId'] == stim_id) & (df['X_axis'] >= min_x) & (df['X_axis'] <= max_x) &
-                                    (df['Y_axis'] >= min_y) & (df['Y_axis'] <= max_y)) == True]
-            # Shifting x,y datapoint to start from (0,0) point
-            stimRegion.X_axis = stimRegion.X_axis - min_x
-            stimRegion.Y_axis = stimRegion.Y_axis - min_y
-
-            # Appending all stims to one DataFrame
-            if flag == 0:
-                byRegionDf = pd.DataFrame(columns=stimRegion.columns)
-                flag = 1
-            byRegionDf = pd.concat([byRegionDf, stimRegion])
-
+        # Get only datapoints within their stim boundaries, all stims in one pass
+        mask, rowBoundaries = self.stim_region_mask(df, self.stim_boundaries_lookup(screen_resolution),
+                                                    ['X_axis'], ['Y_axis'])
+        byRegionDf = df[mask]
+        # Shifting x,y datapoint to start from (0,0) point
+        byRegionDf = byRegionDf.assign(X_axis=byRegionDf.X_axis.values - rowBoundaries[mask, 0],
+                                       Y_axis=byRegionDf.Y_axis.values - rowBoundaries[mask, 2])
         byRegionDf.reset_index(drop=True, inplace=True)
-        byRegionDf.drop(byRegionDf.columns[[0]], axis=1, inplace=True)
+        # Drop the index column written by to_csv, data read from the store has none
+        byRegionDf.drop(['Unnamed: 0'], axis=1, inplace=True, errors='ignore')
 
-        return byRegionDf
+        return apply_schema(byRegionDf)
 
     def data_tidying_for_fixation_dataset_building(self, df, screen_resolution):
         print('Log..... Data tidying')
-        flag = 0
         screen_resolution = [int(x) for x in screen_resolution.split(',')]
         # Get relevant raw data for fixations and saccades
         df = df[df['action'].str.contains('EFIX', na=False)]
@@ -289,7 +312,7 @@ class DataPreprocess:
         df_fields = ['timeStamp', 'duration', 'avg_X_axis', 'avg_Y_axis', 'avg_pupil_size']
 
         # add 'sampleId' field for each uniqe sample
-        df['sampleId'] = df['subjectID'].astype(str) + '_' + df['stimName'].astype(str)
+        df['sampleId'] = sample_ids(df)
         # Removes data with no bid value
         fix_df = df[df.bid != 999]
         # For each field update relevant type and clean not relevant data
@@ -306,64 +329,43 @@ class DataPreprocess:
                     df.reset_index(drop=True, inplace=True)
 
 
-        # In this section for each stim get the datapoints within the stim boundaries
-        for stim in self.stimarray:
-            stim_id = stim.id
-            stim_resolution = (stim.size)
-            min_x, max_x, min_y, max_y = self.find_stim_boundaries(screen_resolution, stim_resolution)
-            # get only datapoints within stim boundaries
-            stimRegion = df[
-                ((df['stimId'] == stim_id) & (df['avg_X_axis'] >= min_x) & (df['avg_X_axis'] <= max_x) &
-                 (df['avg_Y_axis'] >= min_y) & (df['avg_Y_axis'] <= max_y)) == True]
-
-            # Shifting x,y datapoint to start from (0,0) point
-            stimRegion.X_axis = stimRegion.X_axis - min_x
-            stimRegion.Y_axis = stimRegion.Y_axis - min_y
-
-            # Appending all stims to one DataFrame
-            if flag == 0:
-                byRegionDf = pd.DataFrame(columns=stimRegion.columns)
-                flag = 1
-            byRegionDf = pd.concat([byRegionDf, stimRegion])
-
+        # Get the datapoints within their stim boundaries, all stims in one pass
+        mask, rowBoundaries = self.stim_region_mask(df, self.stim_boundaries_lookup(screen_resolution),
+                                                    ['avg_X_axis'], ['avg_Y_axis'])
+        byRegionDf = df[mask]
+        # Shifting x,y datapoint to start from (0,0) point. The fixation records have avg_X_axis / avg_Y_axis only,
+        # shifting the X_axis / Y_axis fields as the raw samples tidying does failed on the missing columns
+        byRegionDf = byRegionDf.assign(avg_X_axis=byRegionDf.avg_X_axis.values - rowBoundaries[mask, 0],
+                                       avg_Y_axis=byRegionDf.avg_Y_axis.values - rowBoundaries[mask, 2])
         byRegionDf.reset_index(drop=True, inplace=True)
         byRegionDf.drop(byRegionDf.columns[[0]], axis=1, inplace=True)
 
-        return byRegionDf
+        return apply_schema(byRegionDf)
 
     def data_tidying_for_analysis_fix_sacc(self, df, screen_resolution):
         print('Log..... Data tidying')
         screen_resolution = [int(x) for x in screen_resolution.split(',')]
         # Get relevant raw data for fixations and saccades
+        # Trial fields kept for every event, columns are selected by name so the input columns order does not matter
+        trial_fields = ['RT', 'bid', 'onsettime', 'stimId', 'stimName', 'stimType', 'subjectID', 'trialNum']
         Efix_df = df[df['0'].str.contains('EFIX', na=False)]
-
-        Efix_df.dropna(inplace=True, axis=1)
-        fix_action = Efix_df["0"].str.split(expand=True)
-        fix_df = pd.concat([fix_action, Efix_df], axis=1)
-        """
-        fix_df.columns = ['action', 'eye', 'S_timeStamp', 'to_remove1', 'subjectID',
-                          'trialNum', 'onsettime', 'stimName',
-                          'bid', 'RT', 'stimType', 'stimId', 'to_remove',  'E_timeStamp',
-                          'duration', 'avg_X_axis', 'avg_Y_axis', 'avg_pupil_size',
-                          'dominant_eye']
-        """
-        fix_df.columns = ['action', 'eye', 'S_timeStamp', 'to_remove1', 'E_timeStamp',
-                          'duration', 'avg_X_axis', 'avg_Y_axis', 'avg_pupil_size',
-                          'RT', 'to_remove', 'bid', 'onsettime', 'stimId', 'stimName',
-                          'stimType',  'subjectID', 'trialNum']
-
-        fix_df.drop(['to_remove1', 'to_remove'], inplace=True, axis=1)
+        # EFIX record - "EFIX <eye> <start>", end, duration, avg x, avg y, avg pupil size
+        fix_action = Efix_df['0'].str.split(expand=True).iloc[:, :3]
+        fix_action.columns = ['action', 'eye', 'S_timeStamp']
+        Efix_df = Efix_df.rename(columns={'1': 'E_timeStamp', '2': 'duration', '3': 'avg_X_axis', '4': 'avg_Y_axis',
+                                          '5': 'avg_pupil_size'})
+        fix_df = pd.concat([fix_action, Efix_df[['E_timeStamp', 'duration', 'avg_X_axis', 'avg_Y_axis',
+                                                 'avg_pupil_size'] + trial_fields]], axis=1)
         fix_df.reset_index(drop=True, inplace=True)
 
         Esacc_df = df[df['0'].str.contains('ESACC', na=False)]
-        Esacc_df.dropna(inplace=True, axis=1)
-        sacc_action = Esacc_df["0"].str.split(expand=True)
-        sacc_df = pd.concat([sacc_action, Esacc_df], axis=1)
-        sacc_df.columns = ['action', 'eye', 'S_timeStamp', 'to_remove1', 'E_timeStamp',
-                           'duration', 'S_X_axis', 'S_Y_axis', 'E_X_axis', 'E_Y_axis',
-                           'RT', 'to_remove', 'bid', 'onsettime', 'stimId', 'stimName',
-                           'stimType', 'subjectID', 'trialNum']
-        sacc_df.drop(['to_remove1', 'to_remove'], inplace=True, axis=1)
+        # ESACC record - "ESACC <eye> <start>", end, duration, start x, start y, end x, end y
+        sacc_action = Esacc_df['0'].str.split(expand=True).iloc[:, :3]
+        sacc_action.columns = ['action', 'eye', 'S_timeStamp']
+        Esacc_df = Esacc_df.rename(columns={'1': 'E_timeStamp', '2': 'duration', '3': 'S_X_axis', '4': 'S_Y_axis',
+                                            '5': 'E_X_axis', '6': 'E_Y_axis'})
+        sacc_df = pd.concat([sacc_action, Esacc_df[['E_timeStamp', 'duration', 'S_X_axis', 'S_Y_axis', 'E_X_axis',
+                                                    'E_Y_axis'] + trial_fields]], axis=1)
         sacc_df.reset_index(drop=True, inplace=True)
 
         # List of all fields that will be updated for later use (fixation and saccade)
@@ -371,7 +373,7 @@ class DataPreprocess:
                      'S_Y_axis', 'E_X_axis', 'E_Y_axis']
 
         # add 'sampleId' field for each uniqe sample
-        fix_df['sampleId'] = fix_df['subjectID'].astype(str) + '_' + fix_df['stimName'].astype(str)
+        fix_df['sampleId'] = sample_ids(fix_df)
         # Removes data with no bid value
         fix_df = fix_df[fix_df.bid != 999]
         # For each field update relevant type and clean not relevant data
@@ -390,7 +392,7 @@ class DataPreprocess:
                 fix_df.reset_index(drop=True, inplace=True)
 
         # add 'sampleId' field for each uniqe sample
-        sacc_df['sampleId'] = sacc_df['subjectID'].astype(str) + '_' + sacc_df['stimName'].astype(str)
+        sacc_df['sampleId'] = sample_ids(sacc_df)
         # Removes data with no bid value
         sacc_df = sacc_df[sacc_df.bid != 999]
         # For each field update relevant type and clean not relevant data
@@ -407,56 +409,22 @@ class DataPreprocess:
                 sacc_df.reset_index(drop=True, inplace=True)
 
 
-        # In this section for each stim get the datapoints within the stim boundaries
+        # Get the datapoints within their stim boundaries, all stims in one pass
+        boundaries = self.stim_boundaries_lookup(screen_resolution)
         # For fixation dataset
-        flag = 0
-        for stim in self.stimarray:
-            stim_id = stim.id
-            stim_resolution = (stim.size)
-            min_x, max_x, min_y, max_y = self.find_stim_boundaries(screen_resolution, stim_resolution)
-            # get only datapoints within stim boundaries
-            stimRegion_fix_df = fix_df[
-                ((fix_df['stimId'] == stim_id) & (fix_df['avg_X_axis'] >= min_x) & (fix_df['avg_X_axis'] <= max_x) &
-                 (fix_df['avg_Y_axis'] >= min_y) & (fix_df['avg_Y_axis'] <= max_y)) == True]
-
-            # Shifting x,y datapoint to start from (0,0) point
-            #stimRegion_fix_df.X_axis = stimRegion_fix_df.X_axis - min_x
-            #byRegion_fix_Df.Y_axis = stimRegion_fix_df.Y_axis - min_y
-
-            # Appending all stims to one DataFrame
-            if flag == 0:
-                byRegion_fix_Df = pd.DataFrame(columns=stimRegion_fix_df.columns)
-                flag = 1
-            byRegion_fix_Df = pd.concat([byRegion_fix_Df, stimRegion_fix_df])
-
-        byRegion_fix_Df.reset_index(drop=True, inplace=True)
-        byRegion_fix_Df.drop(byRegion_fix_Df.columns[[0]], axis=1, inplace=True)
+        fix_mask, _ = self.stim_region_mask(fix_df, boundaries, ['avg_X_axis'], ['avg_Y_axis'])
+        byRegion_fix_Df = fix_df[fix_mask].reset_index(drop=True)
+        byRegion_fix_Df.drop(['action'], axis=1, inplace=True)
 
         #for saccade dataset
-        flag = 0
-        for stim in self.stimarray:
-            stim_id = stim.id
-            stim_resolution = (stim.size)
-            min_x, max_x, min_y, max_y = self.find_stim_boundaries(screen_resolution, stim_resolution)
-            # get only datapoints within stim boundaries
-            stimRegion_sacc_df = sacc_df[
-                ((sacc_df['stimId'] == stim_id) & (sacc_df['S_X_axis'] >= min_x) & (sacc_df['S_X_axis'] <= max_x) &
-                 (sacc_df['S_Y_axis'] >= min_y) & (sacc_df['S_Y_axis'] <= max_y) & (sacc_df['E_X_axis'] >= min_x) & (
-                         sacc_df['E_X_axis'] <= max_x) &
-                 (sacc_df['E_Y_axis'] >= min_y) & (sacc_df['E_Y_axis'] <= max_y)) == True]
-            # Appending all stims to one DataFrame
-            if flag == 0:
-                byRegion_sacc_Df = pd.DataFrame(columns=stimRegion_sacc_df.columns)
-                flag = 1
-            byRegion_sacc_Df = pd.concat([byRegion_sacc_Df, stimRegion_sacc_df])
-
-        byRegion_sacc_Df.reset_index(drop=True, inplace=True)
-        byRegion_sacc_Df.drop(byRegion_sacc_Df.columns[[0]], axis=1, inplace=True)
-
-        return byRegion_fix_Df, byRegion_sacc_Df
+        sacc_mask, _ = self.stim_region_mask(sacc_df, boundaries, ['S_X_axis', 'E_X_axis'], ['S_Y_axis', 'E_Y_axis'])
+        byRegion_sacc_Df = sacc_df[sacc_mask].reset_index(drop=True)
+        byRegion_sacc_Df.drop(['action'], axis=1, inplace=True)
+
+        return apply_schema(byRegion_fix_Df), apply_schema(byRegion_sacc_Df)
 
     def participents_data(self):
-        flag = 0
+        subjectsPersonalData = []
         path = os.getcwd()
         # Set directory name that contains output directory with asc and txt files
         asc_directory = '/etp_data/Output'
@@ -481,13 +449,10 @@ class DataPreprocess:
             txtFilePersonalDataName = os.path.basename(
                 glob.glob(path + txt_directory + '//*' + subjectIntId + '_personalDetails' + '*txt')[0])
             txtpersonalData = pd.read_table(path + txt_directory + '//' + txtFilePersonalDataName)
+            subjectsPersonalData.append(txtpersonalData)
 
-            # Appending all data to one DataFrame
-            if flag == 0:
-                allSubjectsPersonalData = pd.DataFrame(columns=txtpersonalData.columns)
-                flag = 1
-            allSubjectsPersonalData = pd.concat([allSubjectsPersonalData, txtpersonalData])
-
+        # Appending all data to one DataFrame
+        allSubjectsPersonalData = pd.concat(subjectsPersonalData)
         # Store all subjects data DF as CSV
         allSubjectsPersonalData.to_csv(path + 'etp_data/processed/' + 'participents_personal_data.csv')
         print('p')
@@ -0,0 +1,89 @@
+import os
+from collections import OrderedDict
+from multiprocessing import Pool
+import numpy as np
+import cv2
+from modules.data.stim_cache import StimulusCache
+
+
+# OpenCV static saliency detectors by algorithm name
+SALIENCY_ALGORITHMS = {'fine_grained': 'StaticSaliencyFineGrained_create',
+                       'spectral_residual': 'StaticSaliencySpectralResidual_create'}
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+class SaliencyCache:
+
+    def __init__(self, cache_dir, stim_cache, max_items=512):
+        """ Cache of stimulus saliency maps, keyed by (stim directory, stimName, size, algorithm).
+            A saliency map depends on the stimulus only, it is computed once from the stim image (resized to size)
+            and saved as a (height, width, 1) uint8 .npy file under cache_dir, later loads memory map the file.
+            The last max_items maps used are also kept in an in-process LRU.
+            """
+        self.cache_dir = cache_dir
+        self.stim_cache = stim_cache
+        self.max_items = max_items
+        self.maps = OrderedDict()
+
+    def map_path(self, stim_dir, stimName, size, algorithm):
+        stim_dir_name = os.path.basename(os.path.normpath(stim_dir))
+        sizeName = 'orig' if size is None else str(size[0]) + 'x' + str(size[1])
+        mapName = os.path.splitext(stimName)[0] + '_' + sizeName + '_' + algorithm + '.npy'
+        return os.path.join(self.cache_dir, stim_dir_name, mapName)
+
+    @staticmethod
+    def saliency_map(image, algorithm='fine_grained'):
+        # uint8 (height, width, 1) saliency map of an RGB image
+        detector = getattr(cv2.saliency, SALIENCY_ALGORITHMS[algorithm])()
+        (success, saliencyMap) = detector.computeSaliency(np.ascontiguousarray(image))
+        return (saliencyMap * 255).astype("uint8")[:, :, np.newaxis]
+
+    def build(self, currpath, dataset_name, stimName, size=None, algorithm='fine_grained'):
+        """ This functions computes and saves the saliency map of stimName unless it is cached already,
+            returns its cache file path.
+            """
+        map_path = self.map_path(currpath + dataset_name, stimName, size, algorithm)
+        if not os.path.isfile(map_path):
+            image = self.stim_cache.get(currpath, dataset_name, stimName, size)
+            StimulusCache.save_image(map_path, self.saliency_map(image, algorithm))
+        return map_path
+
+    def get(self, currpath, dataset_name, stimName, size=None, algorithm='fine_grained'):
+        """ This functions returns the read only (height, width, 1) uint8 saliency map of stimName resized to size
+            (width, height), None keeps the original size.
+            """
+        key = (currpath + dataset_name, stimName, None if size is None else tuple(size), algorithm)
+        if key in self.maps:
+            self.maps.move_to_end(key)
+            return self.maps[key]
+
+        saliencyMap = np.load(self.build(currpath, dataset_name, stimName, size, algorithm), mmap_mode='r')
+
+        self.maps[key] = saliencyMap
+        if len(self.maps) > self.max_items:
+            self.maps.popitem(last=False)
+
+        return saliencyMap
+
+    def precompute(self, currpath, dataset_name, size=None, algorithm='fine_grained', stimNames=None, n_workers=1):
+        """ This functions computes the saliency maps of all the stims in the stim directory (or of stimNames only)
+            not cached yet, in n_workers processes. Returns the number of maps computed.
+            """
+        if stimNames is None:
+            stimNames = sorted(fileName for fileName in os.listdir(currpath + dataset_name)
+                               if fileName.lower().endswith(IMAGE_EXTENSIONS))
+        stimNames = [stimName for stimName in stimNames
+                     if not os.path.isfile(self.map_path(currpath + dataset_name, stimName, size, algorithm))]
+        print('Log.....Computing ' + algorithm + ' saliency maps of ' + str(len(stimNames)) + ' stims')
+        maps_args = [(currpath, dataset_name, stimName, size, algorithm) for stimName in stimNames]
+        if n_workers > 1 and len(maps_args) > 1:
+            # Every map is written to its own file, workers share nothing but the stim images cache directory
+            worker_cache = SaliencyCache(self.cache_dir, StimulusCache(self.stim_cache.cache_dir))
+            with Pool(processes=n_workers) as pool:
+                pool.starmap(worker_cache.build, maps_args, chunksize=1)
+        else:
+            for map_args in maps_args:
+                self.build(*map_args)
+
+        return len(stimNames)
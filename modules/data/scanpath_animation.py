@@ -0,0 +1,134 @@
+import os
+from multiprocessing import Pool
+import numpy as np
+import cv2
+
+
+VIDEO_CODECS = {'.mp4': 'mp4v', '.avi': 'MJPG'}
+
+
+def write_image(path, image):
+    # Saves an RGB (or gray) uint8 image, in place of the removed scipy.misc.imsave
+    image = np.asarray(image)
+    if image.ndim == 3 and image.shape[2] == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+    if not cv2.imwrite(path, image):
+        raise IOError('Could not write image ' + path)
+
+
+class ImageSequenceWriter:
+
+    def __init__(self, dest_dir, suffix='_scanPathEX.jpg'):
+        # Every frame is saved as dest_dir/<frame number><suffix>
+        self.dest_dir = dest_dir
+        self.suffix = suffix
+        if not os.path.isdir(dest_dir):
+            os.makedirs(dest_dir, exist_ok=True)
+
+    def write(self, frame_number, frame):
+        write_image(os.path.join(self.dest_dir, str(frame_number) + self.suffix), frame)
+
+    def close(self):
+        return
+
+
+class VideoFileWriter:
+
+    def __init__(self, path, fps=10):
+        # .mp4 or .avi video, opened with the size of the first frame
+        self.path = path
+        self.fps = fps
+        self.writer = None
+
+    def write(self, frame_number, frame):
+        if self.writer is None:
+            fourcc = cv2.VideoWriter_fourcc(*VIDEO_CODECS[os.path.splitext(self.path)[1].lower()])
+            self.writer = cv2.VideoWriter(self.path, fourcc, self.fps, (frame.shape[1], frame.shape[0]))
+            if not self.writer.isOpened():
+                raise IOError('Could not open video writer ' + self.path)
+        self.writer.write(cv2.cvtColor(frame, cv2.COLOR_RGB2BGR))
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.release()
+
+
+class GifWriter:
+
+    def __init__(self, path, fps=10):
+        # imageio is needed for GIF output only
+        try:
+            import imageio
+        except ImportError:
+            raise ImportError('GIF export needs imageio, save to an .mp4/.avi video or an image sequence instead')
+        self.writer = imageio.get_writer(path, mode='I', duration=1.0 / fps)
+
+    def write(self, frame_number, frame):
+        self.writer.append_data(np.asarray(frame))
+
+    def close(self):
+        self.writer.close()
+
+
+def frame_writer(dest, fps=10):
+    """ This functions returns the frames writer of dest - a video for .mp4 / .avi, a GIF for .gif and an image
+        sequence in the dest directory otherwise.
+        """
+    extension = os.path.splitext(dest)[1].lower()
+    if extension in VIDEO_CODECS:
+        return VideoFileWriter(dest, fps)
+    if extension == '.gif':
+        return GifWriter(dest, fps)
+    return ImageSequenceWriter(dest)
+
+
+def render_scanpath(image, scanpath, writer, putNumbers=True, putLines=True, animation=True, every=50):
+    """ This functions draws the scanpath (datapoints (x, y) in the last two columns) on the image, one datapoint
+        at a time on a single canvas.
+        animation - every every-th frame (frame 0 is the image, frame i has i datapoints drawn) is handed to the
+        writer as soon as it is drawn, otherwise only the final frame is written (as frame 0).
+        Frames are never kept, memory does not grow with the scanpath length.
+        Returns the number of frames written.
+        """
+    canvas = np.array(image, dtype=np.uint8)
+    points = np.asarray(scanpath)[:, -2:].astype(int)
+    written = 0
+    if animation:
+        writer.write(0, canvas)
+        written += 1
+    for i in range(len(points)):
+        fixation = points[i]
+        cv2.circle(canvas, (fixation[0], fixation[1]), 5, (0, 0, 0), 1)
+        if putNumbers:
+            cv2.putText(canvas, str(i + 1), (fixation[0], fixation[1]), cv2.FONT_HERSHEY_SIMPLEX,
+                        1, (0, 0, 255), thickness=2)
+        if putLines and i > 0:
+            prec_fixation = points[i - 1]
+            cv2.line(canvas, (prec_fixation[0], prec_fixation[1]), (fixation[0], fixation[1]), (0, 0, 255),
+                     thickness=1, lineType=8, shift=0)
+        if animation and (i + 1) % every == 0:
+            writer.write(i + 1, canvas)
+            written += 1
+    if not animation:
+        writer.write(0, canvas)
+        written += 1
+    writer.close()
+
+    return written
+
+
+def export_scanpath(image, scanpath, dest, fps=10, **render_args):
+    # Renders one scanpath animation to dest (video, GIF or image sequence directory)
+    return render_scanpath(image, scanpath, frame_writer(dest, fps), **render_args)
+
+
+def export_scanpaths(jobs, n_workers=1, fps=10, **render_args):
+    """ This functions renders many scanpath animations, jobs is a list of (image, scanpath, dest),
+        in n_workers processes. Returns the number of frames written per job.
+        """
+    if n_workers > 1 and len(jobs) > 1:
+        with Pool(processes=n_workers) as pool:
+            results = [pool.apply_async(export_scanpath, (image, scanpath, dest, fps), render_args)
+                       for image, scanpath, dest in jobs]
+            return [result.get() for result in results]
+    return [export_scanpath(image, scanpath, dest, fps, **render_args) for image, scanpath, dest in jobs]
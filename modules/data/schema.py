@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+
+
+# Names and ids repeat for every row of a sample, they are kept as categories (integer codes + one copy of each value)
+CATEGORICAL_FIELDS = ['subjectID', 'stimName', 'stimType', 'dominant_eye', 'eye', 'sampleId']
+
+# Compact numeric types of the gaze tables fields, screen coordinates fit int16 and EyeLink timestamps int32
+NUMERIC_FIELDS = {'trialNum': np.int16, 'stimId': np.int16,
+                  'timeStamp': np.int32, 'S_timeStamp': np.int32, 'E_timeStamp': np.int32, 'duration': np.int32,
+                  'X_axis': np.int16, 'Y_axis': np.int16, 'avg_X_axis': np.int16, 'avg_Y_axis': np.int16,
+                  'S_X_axis': np.int16, 'S_Y_axis': np.int16, 'E_X_axis': np.int16, 'E_Y_axis': np.int16,
+                  'pupil_size': np.float32, 'avg_pupil_size': np.float32, 'bid': np.float32}
+
+
+def apply_schema(df):
+    """ This functions converts the columns of a raw, tidy, fixation events or saccade events table to their compact
+        types, columns missing from df are skipped.
+        Integer fields holding nan or fractional values are kept as float32, fields not parsed to numbers
+        (raw fixation and saccade records) are kept as they are.
+        """
+    for field in CATEGORICAL_FIELDS:
+        if field in df.columns and not isinstance(df[field].dtype, pd.CategoricalDtype):
+            df[field] = df[field].astype('category')
+    for field, dtype in NUMERIC_FIELDS.items():
+        if field not in df.columns or not pd.api.types.is_numeric_dtype(df[field].dtype):
+            continue
+        values = df[field].values
+        if np.issubdtype(dtype, np.integer) and np.issubdtype(values.dtype, np.floating) and \
+                not (np.isfinite(values).all() and (np.mod(values, 1) == 0).all()):
+            dtype = np.float32
+        if values.dtype != dtype:
+            df[field] = values.astype(dtype)
+
+    return df
+
+
+def sample_ids(df):
+    """ This functions returns the categorical sampleId ('<subjectID>_<stimName>') of every row.
+        The id string is built once for each subject and stim pair instead of once for each row.
+        """
+    codes, pairs = pd.MultiIndex.from_arrays([df['subjectID'], df['stimName']]).factorize()
+    categories = [str(subjectID) + '_' + str(stimName) for subjectID, stimName in pairs]
+
+    return pd.Categorical.from_codes(codes, categories=categories)
@@ -0,0 +1,225 @@
+import os
+import json
+import shutil
+import hashlib
+import numpy as np
+import pandas as pd
+from modules.data.stim_images import StimulusImages
+
+
+MANIFEST_NAME = 'manifest.json'
+
+
+def split_key(params, *frames):
+    """ This functions returns the name of a materialized dataset - a hash of the parameters it was built with
+        and of the sampleIds of the source dataframes, so a new ingest or other parameters build a new one.
+        """
+    sha1 = hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode())
+    for frame in frames:
+        sha1.update(pd.util.hash_pandas_object(frame['sampleId'].astype(str), index=False).values.tobytes())
+    return sha1.hexdigest()[:16]
+
+
+class RaggedBlock:
+
+    def __init__(self, values, offsets):
+        """ Variable length rows (scanpaths) stored as one values array, row i is values[offsets[i]:offsets[i + 1]].
+            Rows are views of the (memory mapped) values, nothing is copied until they are used.
+            """
+        self.values = values
+        self.offsets = offsets
+
+    @property
+    def lengths(self):
+        return np.diff(self.offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.values[self.offsets[i]:self.offsets[i + 1]]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+class SparseMapsBlock:
+
+    def __init__(self, data, indices, indptr, shapes):
+        """ Sparse fixation maps stored as the concatenated csr data, indices and indptr of all the maps, the
+            (height, width) of map i is shapes[i]. Map i is a csr_matrix over the (memory mapped) arrays slices,
+            maps are densified per batch by the model input pipeline.
+            """
+        self.data = data
+        self.indices = indices
+        self.indptr = indptr
+        self.shapes = shapes
+        # Map i rows pointers are indptr[row_offsets[i]:row_offsets[i + 1] + 1]
+        self.row_offsets = np.concatenate([[0], np.cumsum(shapes[:, 0])]).astype(np.int64)
+
+    @property
+    def filename(self):
+        return getattr(self.data, 'filename', None)
+
+    @property
+    def shape(self):
+        return (len(self),) + (tuple(int(size) for size in self.shapes[0]) if len(self) else ())
+
+    def __len__(self):
+        return len(self.shapes)
+
+    def __getitem__(self, i):
+        import scipy.sparse
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        indptr = np.asarray(self.indptr[self.row_offsets[i]:self.row_offsets[i + 1] + 1])
+        return scipy.sparse.csr_matrix((self.data[indptr[0]:indptr[-1]], self.indices[indptr[0]:indptr[-1]],
+                                        indptr - indptr[0]), shape=tuple(self.shapes[i]))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+class SplitStore:
+
+    def __init__(self, root):
+        """ Model ready train / val / test datasets, materialized once and memory mapped by the runs using them.
+            Every dataset is a directory under root holding one .npy file per block of every split (inputs,
+            images stimIndex, labels, sampleIds, lengths) and a manifest.json of the blocks dtypes and shapes and
+            of the parameters the dataset was built with:
+                root/<name>/<split>_<block>.npy
+            Variable length blocks are saved as their concatenated values and the rows offsets, sparse fixation
+            maps as their concatenated csr arrays and the maps shapes.
+            Blocks are opened with mmap_mode='r', no parsing and no copy happen before a batch is read.
+            """
+        self.root = root
+
+    def dataset_path(self, name):
+        return os.path.join(self.root, name)
+
+    def exists(self, name):
+        return os.path.isfile(os.path.join(self.dataset_path(name), MANIFEST_NAME))
+
+    def manifest(self, name):
+        with open(os.path.join(self.dataset_path(name), MANIFEST_NAME), 'r') as manifestFile:
+            return json.load(manifestFile)
+
+    def write(self, name, splits, params=None, stim_images=None):
+        """ This functions materializes splits - {split name: {block name: array}} where a block is an array
+            or a list of variable length arrays - as the dataset name.
+            stim_images - the StimulusImages the images stimIndex blocks refer to, saved once with the dataset.
+            """
+        print('Log..... Materializing ' + name + ' splits')
+        # Written to a temporary directory first so an interrupted run never leaves a partial dataset
+        tmp_path = self.dataset_path(name) + '.tmp'
+        if os.path.isdir(tmp_path):
+            shutil.rmtree(tmp_path)
+        os.makedirs(tmp_path)
+
+        manifest = {'params': params if params is not None else {}, 'splits': {}}
+        for split, blocks in splits.items():
+            manifest['splits'][split] = {}
+            for block, data in blocks.items():
+                if data is None:
+                    continue
+                manifest['splits'][split][block] = self.write_block(tmp_path, split + '_' + block, data)
+        if stim_images is not None:
+            np.save(os.path.join(tmp_path, 'stim_images.npy'), stim_images.images)
+            manifest['stim_images'] = {'size': list(stim_images.size), 'stimNames': list(stim_images.stimNames),
+                                       'source': stim_images.source}
+
+        with open(os.path.join(tmp_path, MANIFEST_NAME), 'w') as manifestFile:
+            json.dump(manifest, manifestFile, indent=2, sort_keys=True)
+        if os.path.isdir(self.dataset_path(name)):
+            shutil.rmtree(self.dataset_path(name))
+        os.replace(tmp_path, self.dataset_path(name))
+
+        return manifest
+
+    @staticmethod
+    def write_block(dataset_path, fileName, data):
+        import scipy.sparse
+        if isinstance(data, (list, tuple, np.ndarray)) and len(data) and scipy.sparse.issparse(data[0]):
+            return SplitStore.write_sparse_block(dataset_path, fileName, data)
+        # Lists and object arrays of arrays are variable length rows, object arrays of ids are saved as strings
+        # and object arrays of numbers as numbers
+        if isinstance(data, (list, tuple)) or (isinstance(data, np.ndarray) and data.dtype == object and data.size and
+                                               np.ndim(data.flat[0]) > 0):
+            rows = [np.asarray(row) for row in data]
+            lengths = np.array([len(row) for row in rows], dtype=np.int64)
+            offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+            rowShape = next((row.shape[1:] for row in rows if len(row)), ())
+            values = np.concatenate(rows) if len(rows) else np.empty((0,) + rowShape)
+            np.save(os.path.join(dataset_path, fileName + '.npy'), values)
+            np.save(os.path.join(dataset_path, fileName + '_offsets.npy'), offsets)
+            return {'ragged': True, 'dtype': str(values.dtype), 'shape': [len(rows)] + list(rowShape)}
+
+        data = np.asarray(data)
+        if data.dtype == object:
+            inferred = pd.api.types.infer_dtype(data.ravel(), skipna=False)
+            if inferred == 'string':
+                data = data.astype(str)
+            else:
+                # Numbers held as objects (labels from categories) are saved with their numeric type
+                data = np.array(data.tolist())
+                if data.dtype.kind not in 'biuf':
+                    raise ValueError('Block ' + fileName + ' holds ' + inferred + ' values, expected strings or '
+                                     'numbers')
+        np.save(os.path.join(dataset_path, fileName + '.npy'), data)
+        return {'ragged': False, 'dtype': str(data.dtype), 'shape': list(data.shape)}
+
+    @staticmethod
+    def write_sparse_block(dataset_path, fileName, maps):
+        import scipy.sparse
+        # Maps stacked as one csr matrix, every map keeps its own rows and width
+        maps = [scipy.sparse.csr_matrix(fixation_map) for fixation_map in maps]
+        shapes = np.array([fixation_map.shape for fixation_map in maps], dtype=np.int64)
+        nnz = np.concatenate([[0], np.cumsum([fixation_map.nnz for fixation_map in maps])])
+        indptr = np.concatenate([fixation_map.indptr[:-1] + offset for fixation_map, offset in zip(maps, nnz)] +
+                                [nnz[-1:]]).astype(np.int64)
+        data = np.concatenate([fixation_map.data for fixation_map in maps])
+        np.save(os.path.join(dataset_path, fileName + '.npy'), data)
+        np.save(os.path.join(dataset_path, fileName + '_indices.npy'),
+                np.concatenate([fixation_map.indices for fixation_map in maps]).astype(np.int32))
+        np.save(os.path.join(dataset_path, fileName + '_indptr.npy'), indptr)
+        np.save(os.path.join(dataset_path, fileName + '_shapes.npy'), shapes)
+        return {'ragged': False, 'sparse': True, 'dtype': str(data.dtype), 'shape': [len(maps)]}
+
+    def read(self, name):
+        """ This functions opens the dataset name and returns its manifest and {split name: {block name: array}},
+            memory mapped arrays, RaggedBlock for the variable length blocks and SparseMapsBlock for the sparse maps.
+            """
+        dataset_path = self.dataset_path(name)
+        manifest = self.manifest(name)
+        splits = {}
+        for split, blocks in manifest['splits'].items():
+            splits[split] = {}
+            for block, entry in blocks.items():
+                values = np.load(os.path.join(dataset_path, split + '_' + block + '.npy'), mmap_mode='r')
+                if entry['ragged']:
+                    offsets = np.load(os.path.join(dataset_path, split + '_' + block + '_offsets.npy'))
+                    values = RaggedBlock(values, offsets)
+                elif entry.get('sparse'):
+                    blockPath = os.path.join(dataset_path, split + '_' + block)
+                    values = SparseMapsBlock(values, np.load(blockPath + '_indices.npy', mmap_mode='r'),
+                                             np.load(blockPath + '_indptr.npy'), np.load(blockPath + '_shapes.npy'))
+                splits[split][block] = values
+
+        return manifest, splits
+
+    def read_stim_images(self, name, manifest=None):
+        # The stimulus images tensor saved with the dataset, memory mapped
+        manifest = self.manifest(name) if manifest is None else manifest
+        if 'stim_images' not in manifest:
+            return None
+        images = np.load(os.path.join(self.dataset_path(name), 'stim_images.npy'), mmap_mode='r')
+        # Datasets materialized before the source was recorded hold stims images or 1 channel saliency maps
+        source = manifest['stim_images'].get('source', 'stims' if images.shape[3] == 3 else 'saliency_fine_grained')
+        return StimulusImages(manifest['stim_images']['size'], images.shape[3], images,
+                              manifest['stim_images']['stimNames'], source)
+
+    def delete(self, name):
+        if os.path.isdir(self.dataset_path(name)):
+            shutil.rmtree(self.dataset_path(name))
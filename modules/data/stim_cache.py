@@ -0,0 +1,66 @@
+import os
+from collections import OrderedDict
+import numpy as np
+import cv2
+from modules.data.visualization import DataVis
+
+
+class StimulusCache:
+
+    def __init__(self, cache_dir, max_items=512):
+        """ Cache of decoded stimulus images, keyed by (stim directory, stimName, size, normalization).
+            Every image file is decoded once, the original and every resized / normalized version are saved as .npy
+            files under cache_dir and later loads (in this process or in parallel workers) memory map the file
+            instead of decoding the image again.
+            The last max_items images used are also kept in an in-process LRU.
+            """
+        self.cache_dir = cache_dir
+        self.max_items = max_items
+        self.images = OrderedDict()
+
+    def image_path(self, stim_dir, stimName, size, normalize):
+        stim_dir_name = os.path.basename(os.path.normpath(stim_dir))
+        sizeName = 'orig' if size is None else str(size[0]) + 'x' + str(size[1])
+        imageName = os.path.splitext(stimName)[0] + '_' + sizeName + ('_norm' if normalize else '_raw') + '.npy'
+        return os.path.join(self.cache_dir, stim_dir_name, imageName)
+
+    def get(self, currpath, dataset_name, stimName, size=None, normalize=False):
+        """ This functions returns the read only (height, width, 3) RGB image of stimName resized to size (width, height),
+            None keeps the original size, uint8 or float32 in [0, 1] when normalize is set.
+            """
+        stim_dir = currpath + dataset_name
+        key = (stim_dir, stimName, None if size is None else tuple(size), normalize)
+        if key in self.images:
+            self.images.move_to_end(key)
+            return self.images[key]
+
+        image_path = self.image_path(stim_dir, stimName, size, normalize)
+        if not os.path.isfile(image_path):
+            if size is None and not normalize:
+                image = DataVis.stimulus(currpath, dataset_name, stimName)
+            else:
+                # Resized and normalized images are built from the cached original, the image file is decoded once
+                image = self.get(currpath, dataset_name, stimName)
+                if size is not None:
+                    image = cv2.resize(np.asarray(image), tuple(size))
+                if normalize:
+                    image = image.astype(np.float32) / 255
+            self.save_image(image_path, image)
+        image = np.load(image_path, mmap_mode='r')
+
+        self.images[key] = image
+        if len(self.images) > self.max_items:
+            self.images.popitem(last=False)
+
+        return image
+
+    @staticmethod
+    def save_image(image_path, image):
+        image_dir = os.path.dirname(image_path)
+        if not os.path.isdir(image_dir):
+            os.makedirs(image_dir, exist_ok=True)
+        # Write to a temporary file first, workers never memory map a partially written image
+        tmp_path = image_path + '.' + str(os.getpid()) + '.tmp'
+        with open(tmp_path, 'wb') as imageFile:
+            np.save(imageFile, image)
+        os.replace(tmp_path, image_path)
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+
+
+class StimulusImages:
+
+    def __init__(self, size, channels=3, images=None, stimNames=None, source='stims'):
+        """ One copy of every stimulus image used by a dataset, stacked in a single (stims, height, width, channels)
+            uint8 tensor of stims resized to size (width, height), RGB images or 1 channel saliency maps.
+            Samples refer to their stimulus by its index in the tensor (stimIndex) instead of holding an image copy,
+            images are gathered and scaled to [0, 1] only for the samples of a batch.
+            images, stimNames - an existing tensor (e.g. memory mapped from a materialized dataset) and its stims.
+            source - what the images are, 'stims' for the stims images or 'saliency_<algorithm>' for saliency maps.
+            """
+        self.size = tuple(size)
+        self.source = source
+        self.stimNames = list(stimNames) if stimNames is not None else []
+        if images is None:
+            images = np.empty((0, self.size[1], self.size[0], channels), dtype=np.uint8)
+        self.images = images
+
+    def add(self, image_cache, currpath, dataset_name, stimNames):
+        """ This functions adds the images of stimNames not held yet and returns the stimIndex of every stimName.
+            image_cache - StimulusCache for the stims images or SaliencyCache for their saliency maps.
+            Added stims are appended, indices returned before stay valid.
+            """
+        held = set(self.stimNames)
+        newNames = [stimName for stimName in pd.unique(np.asarray(stimNames, dtype=object)) if stimName not in held]
+        if newNames:
+            newImages = np.stack([image_cache.get(currpath, dataset_name, stimName, self.size)
+                                  for stimName in newNames])
+            self.images = np.concatenate([self.images, newImages])
+            self.stimNames.extend(newNames)
+
+        return self.indices(stimNames)
+
+    def indices(self, stimNames):
+        return pd.Index(self.stimNames).get_indexer(np.asarray(stimNames, dtype=object)).astype(np.int32)
+
+    def gather(self, stimIndex, normalize=True):
+        # (len(stimIndex), height, width, channels) batch, float32 in [0, 1] when normalize is set
+        batch = self.images[np.asarray(stimIndex)]
+        if normalize:
+            return batch.astype(np.float32) / 255
+        return batch
+
+    def samples(self, stimIndex):
+        return SampleImages(self, stimIndex)
+
+
+class SampleImages:
+
+    def __init__(self, stim_images, stimIndex, normalize=True):
+        """ The images input of a set of samples - the stimIndex of every sample into the shared StimulusImages.
+            Indexing returns the gathered images of the indexed samples only, as indexing an images array would.
+            """
+        self.stim_images = stim_images
+        self.stimIndex = np.asarray(stimIndex, dtype=np.int32)
+        self.normalize = normalize
+
+    @property
+    def shape(self):
+        return (len(self.stimIndex),) + self.stim_images.images.shape[1:]
+
+    def __len__(self):
+        return len(self.stimIndex)
+
+    def __getitem__(self, key):
+        stimIndex = self.stimIndex[key]
+        if np.ndim(stimIndex) == 0:
+            return self.stim_images.gather([stimIndex], self.normalize)[0]
+        return self.stim_images.gather(stimIndex, self.normalize)
+
+    def __array__(self, dtype=None):
+        # Materializes the images of all the samples, models should gather them per batch instead
+        images = self.stim_images.gather(self.stimIndex, self.normalize)
+        return images if dtype is None else images.astype(dtype)
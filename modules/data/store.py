@@ -0,0 +1,115 @@
+import os
+import json
+import shutil
+import pandas as pd
+from modules.data.schema import apply_schema
+
+
+class ProcessedStore:
+
+    # Tables built from the subjects of another table, their subjects partitions are removed whenever the source
+    # subjects are written again so they are rebuilt from the new data
+    derived_tables = {'raw_samples': ['tidy'], 'raw_fix_sacc': ['fix_events', 'sacc_events']}
+
+    def __init__(self, root, partition_cols=('subjectID', 'stimType')):
+        """ Columnar store for processed subjects data.
+            Every table (raw_samples, raw_fix_sacc, tidy, fix_events, sacc_events) is a parquet
+            dataset under root, partitioned by subject and stim type:
+                root/<table>/subjectID=<id>/stimType=<type>/*.parquet
+            so loads read only the columns and the partitions they ask for.
+            """
+        self.root = root
+        self.partition_cols = list(partition_cols)
+
+    def table_path(self, table):
+        return os.path.join(self.root, table)
+
+    def exists(self, table):
+        return os.path.isdir(self.table_path(table)) and len(os.listdir(self.table_path(table))) > 0
+
+    def subjects(self, table):
+        # Subjects ids stored in table, read from the partitions directories names only
+        if not self.exists(table):
+            return []
+        partition_prefix = self.partition_cols[0] + '='
+        return sorted(int(name[len(partition_prefix):]) for name in os.listdir(self.table_path(table))
+                      if name.startswith(partition_prefix))
+
+    def write(self, table, df, overwrite=False):
+        """ Write df to table.
+            Partitions of the subjects in df are replaced, other subjects are kept unless overwrite is set.
+            """
+        if overwrite:
+            self.delete_table(table)
+            for derived_table in self.derived_tables.get(table, []):
+                self.delete_table(derived_table)
+        else:
+            self.delete_subjects(table, df[self.partition_cols[0]].unique())
+        print('Log..... Writing ' + str(len(df)) + ' rows to ' + table + ' store')
+        if len(df) == 0:
+            return
+        df.to_parquet(self.table_path(table), engine='pyarrow', compression='snappy',
+                      partition_cols=self.partition_cols, index=False)
+
+    def read(self, table, columns=None, subjects=None, stimType=None):
+        """ Read table, only columns (all by default) of the given subjects and stim type (all by default).
+            """
+        filters = []
+        if subjects is not None:
+            filters.append((self.partition_cols[0], 'in', [int(subject) for subject in subjects]))
+        if stimType is not None:
+            filters.append((self.partition_cols[1], '=', stimType))
+        if columns is not None:
+            columns = list(columns)
+        print('Log..... Reading ' + table + ' store')
+        df = pd.read_parquet(self.table_path(table), engine='pyarrow', columns=columns,
+                             filters=filters if filters else None)
+
+        # Partition keys are read back as categories of the partitions values, other columns keep their written types
+        return apply_schema(df)
+
+    def delete_subjects(self, table, subjects):
+        subjects = [int(subject) for subject in subjects]
+        for subject in subjects:
+            subject_path = os.path.join(self.table_path(table), self.partition_cols[0] + '=' + str(subject))
+            if os.path.isdir(subject_path):
+                shutil.rmtree(subject_path)
+        if os.path.isfile(self.built_path(table)):
+            self.save_built_subjects(table, set(self.built_subjects(table)) - set(subjects))
+        for derived_table in self.derived_tables.get(table, []):
+            self.delete_subjects(derived_table, subjects)
+
+    def built_path(self, table):
+        return self.table_path(table) + '_built.json'
+
+    def built_subjects(self, table):
+        """ Source subjects already built into a derived table, subjects whose data gave no rows in table included.
+            Tables built before the record was kept fall back to their partitions subjects.
+            """
+        if not os.path.isfile(self.built_path(table)):
+            return self.subjects(table)
+        with open(self.built_path(table), 'r') as builtFile:
+            return json.load(builtFile)
+
+    def save_built_subjects(self, table, subjects):
+        if not os.path.isdir(self.root):
+            os.makedirs(self.root, exist_ok=True)
+        # Write to a temporary file first so an interrupted run never leaves a partial record
+        tmp_path = self.built_path(table) + '.tmp'
+        with open(tmp_path, 'w') as builtFile:
+            json.dump(sorted(int(subject) for subject in subjects), builtFile)
+        os.replace(tmp_path, self.built_path(table))
+
+    def mark_built(self, table, subjects):
+        # Record source subjects as built into table, so they are not built again even when they gave no rows
+        self.save_built_subjects(table, set(self.built_subjects(table)) | set(int(subject) for subject in subjects))
+
+    def missing_subjects(self, table, source_table):
+        # Subjects of source_table not built into table yet
+        return sorted(set(self.subjects(source_table)) - set(self.built_subjects(table)))
+
+    def delete_table(self, table):
+        if os.path.isdir(self.table_path(table)):
+            shutil.rmtree(self.table_path(table))
+        if os.path.isfile(self.built_path(table)):
+            os.remove(self.built_path(table))
@@ -0,0 +1,103 @@
+import os
+from multiprocessing import Pool
+from modules.data.visualization import DataVis
+from modules.data.stim_cache import StimulusCache
+from modules.data.scanpath_animation import write_image, export_scanpath
+
+
+VIS_KINDS = ('map', 'heatmap', 'scanpath')
+
+# Stimulus images cache of a worker process, opened once by the pool initializer
+worker_stim_cache = None
+
+
+def init_worker(cache_dir):
+    global worker_stim_cache
+    worker_stim_cache = StimulusCache(cache_dir)
+
+
+def render_sample(job):
+    """ This functions renders the visualizations (kinds) of one sample and returns the paths written.
+        Outputs are named by the sampleId, <dest_dir>/<sampleId>_fixation_map.jpg, _heatmap.jpg and
+        _scanpath<scanpath_format> (a directory of frames when scanpath_format is empty).
+        """
+    stimulus = worker_stim_cache.get(job['currpath'], job['dataset_name'], job['stimName'], job['size'])
+    sampleName = os.path.join(job['dest_dir'], os.path.splitext(str(job['sampleId']))[0])
+    written = []
+    if 'map' in job['kinds'] and job['fixationMap'] is not None:
+        write_image(sampleName + '_fixation_map.jpg', DataVis.map_on_stimulus(job['fixationMap'], stimulus))
+        written.append(sampleName + '_fixation_map.jpg')
+    if 'heatmap' in job['kinds'] and job['scanpath'] is not None:
+        write_image(sampleName + '_heatmap.jpg', DataVis.heatmap_on_stimulus(job['scanpath'], stimulus))
+        written.append(sampleName + '_heatmap.jpg')
+    if 'scanpath' in job['kinds'] and job['scanpath'] is not None:
+        dest = sampleName + '_scanpath' + job['scanpath_format']
+        export_scanpath(stimulus, job['scanpath'], dest, putNumbers=False, animation=job['animation'])
+        written.append(dest)
+
+    return written
+
+
+class BatchVisualizer:
+
+    def __init__(self, currpath, stimpath, vispath, stimarray, cache_dir, n_workers=1):
+        """ Renders the fixation maps, heatmaps and scanpaths of many samples, in n_workers processes.
+            Stimulus images are read from the stimulus images cache at cache_dir, outputs are written under
+            vispath/<stimType>/ named by sampleId.
+            """
+        self.currpath = currpath
+        self.stimpath = stimpath
+        self.vispath = vispath
+        self.stimarray = stimarray
+        self.cache_dir = cache_dir
+        self.n_workers = n_workers
+
+    def stim_size(self, stimType):
+        for stim in self.stimarray:
+            if stim.name == stimType:
+                return stim.size[0], stim.size[1]
+
+    def samples(self, fixation_df, scanpath_df, stimType=None, sampleIds=None):
+        # One row per sample with its fixation map and scanpath (None when the sample has no such data)
+        fixations = fixation_df[['sampleId', 'stimName', 'stimType', 'fixationMap']]
+        scanpaths = scanpath_df[['sampleId', 'stimName', 'stimType', 'scanpath']]
+        samples_df = fixations.merge(scanpaths, on=['sampleId', 'stimName', 'stimType'], how='outer')
+        if stimType is not None:
+            samples_df = samples_df[samples_df['stimType'] == stimType]
+        if sampleIds is not None:
+            samples_df = samples_df[samples_df['sampleId'].isin(sampleIds)]
+        samples_df = samples_df.copy()
+        for field in ['fixationMap', 'scanpath']:
+            samples_df[field] = samples_df[field].astype(object).where(samples_df[field].notnull(), None)
+        return samples_df
+
+    def run(self, fixation_df, scanpath_df, stimType=None, sampleIds=None, kinds=VIS_KINDS, scanpath_format='.mp4',
+            animation=True):
+        """ This functions renders the kinds visualizations of the samples of stimType and / or sampleIds (all the
+            samples by default) and returns the paths written.
+            """
+        samples_df = self.samples(fixation_df, scanpath_df, stimType, sampleIds)
+        print('Log..... Visualizing ' + str(len(samples_df)) + ' samples with ' + str(self.n_workers) + ' workers')
+
+        # Stims images are cached once here, workers only memory map them
+        stim_cache = StimulusCache(self.cache_dir)
+        for (stimName, sampleStimType), _ in samples_df.groupby(['stimName', 'stimType'], observed=True):
+            stim_cache.get(self.currpath, self.stimpath, stimName, self.stim_size(sampleStimType))
+        jobs = []
+        for sample in samples_df.itertuples(index=False):
+            dest_dir = os.path.join(self.vispath, str(sample.stimType))
+            if not os.path.isdir(dest_dir):
+                os.makedirs(dest_dir, exist_ok=True)
+            jobs.append({'sampleId': sample.sampleId, 'stimName': sample.stimName, 'currpath': self.currpath,
+                         'dataset_name': self.stimpath, 'size': self.stim_size(sample.stimType),
+                         'fixationMap': sample.fixationMap, 'scanpath': sample.scanpath, 'dest_dir': dest_dir,
+                         'kinds': tuple(kinds), 'scanpath_format': scanpath_format, 'animation': animation})
+
+        if self.n_workers > 1 and len(jobs) > 1:
+            with Pool(processes=self.n_workers, initializer=init_worker, initargs=(self.cache_dir,)) as pool:
+                written = pool.map(render_sample, jobs, chunksize=max(1, len(jobs) // (4 * self.n_workers)))
+        else:
+            init_worker(self.cache_dir)
+            written = [render_sample(job) for job in jobs]
+
+        return [path for paths in written for path in paths]
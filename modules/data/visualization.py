@@ -1,7 +1,8 @@
 import cv2
 import numpy as np
 import os
-import scipy.misc
+from modules.data.fixation_maps import map_image
+from modules.data.scanpath_animation import write_image, frame_writer, render_scanpath
 
 
 class DataVis:
@@ -26,37 +27,55 @@ class DataVis:
 
         return image
 
-    def heatmap(self, SCANPATH, imgToPlot_size, path, stimulus_name, dest_fn):
-        stimulus = self.stimulus(path, stimulus_name)
+    @staticmethod
+    def heatmap_on_stimulus(SCANPATH, stimulus, sigma=25, alpha=0.6):
+        """ This functions returns the stimulus with the gaze density of the scanpath datapoints (x, y in the last
+            two columns) on top, datapoints counts smoothed by a gaussian of sigma pixels and colored by the jet
+            colormap.
+            """
+        points = np.asarray(SCANPATH)[:, -2:].astype(int)
+        height, width = stimulus.shape[:2]
+        inside = (points[:, 0] >= 0) & (points[:, 0] < width) & (points[:, 1] >= 0) & (points[:, 1] < height)
+        density = np.bincount(points[inside, 1] * width + points[inside, 0],
+                              minlength=height * width).reshape(height, width).astype(np.float32)
+        density = cv2.GaussianBlur(density, (0, 0), sigma)
+        if density.max() > 0:
+            density = density / density.max()
+        heatmap = cv2.cvtColor(cv2.applyColorMap(np.uint8(density * 255), cv2.COLORMAP_JET), cv2.COLOR_BGR2RGB)
+
+        return cv2.addWeighted(heatmap, alpha, stimulus, 1 - alpha, 0)
+
+    @staticmethod
+    def map_on_stimulus(FIXATION_MAP, stimulus):
+        # The stimulus with the fixation map (sparse or dense counts) on top
+        fixation_map = cv2.cvtColor(map_image(FIXATION_MAP), cv2.COLOR_GRAY2RGB)
+        return cv2.addWeighted(fixation_map, 1, stimulus, 0.8, 0)
+
+    def heatmap(self, SCANPATH, imgToPlot_size, path, stimulus_name, dest_fn='heatMapEX.jpg'):
+        stimulus = self.stimulus(self.currpath, path, stimulus_name)
         stimulus = cv2.resize(stimulus, imgToPlot_size)
-        example_points = SCANPATH
-        example_img = stimulus
-        heatmapper = Heatmapper()
-        heatmap = heatmapper.heatmap_on_img(example_points, example_img)
+        heatmap = self.heatmap_on_stimulus(SCANPATH, stimulus)
 
-        scipy.misc.imsave(self.currpath + self.vispath + 'heatMapEX.jpg', heatmap)
+        write_image(self.currpath + self.vispath + dest_fn, heatmap)
 
         return
 
-    def map(self, FIXATION_MAP, imgToPlot_size, path, stimulus_name):
+    def map(self, FIXATION_MAP, imgToPlot_size, path, stimulus_name, dest_fn='5_10_2020_fixationMapEX.jpg'):
         """
         This functions visualize a specified stimulus adding the fixation map on top.
         """
 
         stimulus = self.stimulus(self.currpath, path, stimulus_name)
 
-        toPlot = stimulus
-        fixation_map = FIXATION_MAP
-        fixation_map = np.pad(fixation_map, [(0, 1), (0, 1)], mode='constant')
-        fixation_map = cv2.cvtColor(np.uint8(fixation_map), cv2.COLOR_GRAY2RGB) * 255
-        toPlot = cv2.resize(toPlot, imgToPlot_size)
-        fin = cv2.addWeighted(fixation_map, 1, toPlot, 0.8, 0)
+        toPlot = cv2.resize(stimulus, imgToPlot_size)
+        fin = self.map_on_stimulus(FIXATION_MAP, toPlot)
 
-        scipy.misc.imsave(self.currpath + self.vispath + '5_10_2020_fixationMapEX.jpg', fin)
+        write_image(self.currpath + self.vispath + dest_fn, fin)
 
         return
 
-    def map_with_clusters(self, FIXATION_MAP, imgToPlot_size, path, stimulus_name, clusters):
+    def map_with_clusters(self, FIXATION_MAP, imgToPlot_size, path, stimulus_name, clusters,
+                          dest_fn='5_10_2020_fixationMapEX.jpg'):
         """
         This functions visualize a specified stimulus adding the fixation map on top.
         """
@@ -64,111 +83,47 @@ class DataVis:
         fixationMap = FIXATION_MAP['fixationMap'].sum()
 
         stimulus = self.stimulus(self.currpath, path, stimulus_name)
-        toPlot = stimulus
-        fixation_map = fixationMap
-        fixation_map = np.pad(fixation_map, [(0, 1), (0, 1)], mode='constant')
-        fixation_map = cv2.cvtColor(np.uint8(fixation_map), cv2.COLOR_GRAY2RGB) * 255
-        toPlot = cv2.resize(toPlot, imgToPlot_size)
-        fin = cv2.addWeighted(fixation_map, 1, toPlot, 0.8, 0)
+        toPlot = cv2.resize(stimulus, imgToPlot_size)
+        fin = self.map_on_stimulus(fixationMap, toPlot)
         for cluster in clusters:
             x = int(cluster[0])
             y = int(cluster[1])
             fin[x-5:x+5, y-5:y+5] = (255, 0, 0)
 
-        vis_img_name = '5_10_2020_fixationMapEX.jpg'
-
-        scipy.misc.imsave(self.currpath + self.vispath + vis_img_name, fin)
+        write_image(self.currpath + self.vispath + dest_fn, fin)
 
         return
 
-    def scanpath(self, SCANPATH, imgToPlot_size, path, stimulus_name, putNumbers=True, putLines=True, animation=True):
+    def scanpath(self, SCANPATH, imgToPlot_size, path, stimulus_name, putNumbers=True, putLines=True, animation=True,
+                 dest=None, fps=10):
 
         """ This functions uses cv2 standard library to visualize the scanpath
             of a specified stimulus.
             It is possible to visualize it as an animation by setting the additional
             argument animation=True.
+            Frames are streamed to dest - a .mp4 / .avi video, a .gif or an image sequence directory (the
+            visualization directory by default).
            """
 
         stimulus = self.stimulus(self.currpath, path, stimulus_name)
-
-        scanpath = SCANPATH
-
-        # toPlot = [cv2.resize(stimulus, (520, 690)),] # look, it is a list!
-        toPlot = [cv2.resize(stimulus, imgToPlot_size)]  # look, it is a list!
-
-        for i in range(np.shape(scanpath)[0]):
-
-            fixation = scanpath[i].astype(int)
-
-            frame = np.copy(toPlot[-1]).astype(np.uint8)
-
-            cv2.circle(frame,
-                       (fixation[0], fixation[1]),
-                       5, (0, 0, 0), 1)
-            if putNumbers:
-                cv2.putText(frame, str(i + 1),
-                            (fixation[0], fixation[1]),
-                            cv2.FONT_HERSHEY_SIMPLEX,
-                            1, (0, 0, 255), thickness=2)
-            if putLines and i > 0:
-                prec_fixation = scanpath[i - 1].astype(int)
-                cv2.line(frame, (prec_fixation[0], prec_fixation[1]), (fixation[0], fixation[1]), (0, 0, 255),
-                         thickness=1, lineType=8, shift=0)
-
-            # if animation is required, frames are attached in a sequence
-            # if not animation is required, older frames are removed
-            toPlot.append(frame)
-            if not animation: toPlot.pop(0)
-
-        for i in range(len(toPlot)):
-            if (i % 50) == 0:
-                figName = str(i) + '_scanPathEX.jpg'
-                scipy.misc.imsave(self.currpath + self.vispath + figName, toPlot[i])
+        writer = frame_writer(self.currpath + self.vispath if dest is None else dest, fps)
+        render_scanpath(cv2.resize(stimulus, imgToPlot_size), SCANPATH, writer, putNumbers, putLines, animation)
 
         return
 
     @staticmethod
-    def scanpath_by_img(path, SCANPATH, imgToPlot_size, stimulus, putNumbers=True, putLines=True, animation=True):
+    def scanpath_by_img(path, SCANPATH, imgToPlot_size, stimulus, putNumbers=True, putLines=True, animation=True,
+                        fps=10):
 
         """ This functions uses cv2 standard library to visualize the scanpath
             of a specified stimulus.
             It is possible to visualize it as an animation by setting the additional
             argument animation=True.
+            Frames are streamed to path - a .mp4 / .avi video, a .gif or an image sequence directory.
            """
 
-        scanpath = SCANPATH
-
-        # toPlot = [cv2.resize(stimulus, (520, 690)),] # look, it is a list!
-        toPlot = [cv2.resize(stimulus, imgToPlot_size)]  # look, it is a list!
-
-        for i in range(np.shape(scanpath)[0]):
-
-            fixation = scanpath[i].astype(int)
-
-            frame = np.copy(toPlot[-1]).astype(np.uint8)
-
-            cv2.circle(frame,
-                       (fixation[0], fixation[1]),
-                       5, (0, 0, 0), 1)
-            if putNumbers:
-                cv2.putText(frame, str(i + 1),
-                            (fixation[0], fixation[1]),
-                            cv2.FONT_HERSHEY_SIMPLEX,
-                            1, (0, 0, 255), thickness=2)
-            if putLines and i > 0:
-                prec_fixation = scanpath[i - 1].astype(int)
-                cv2.line(frame, (prec_fixation[0], prec_fixation[1]), (fixation[0], fixation[1]), (0, 0, 255),
-                         thickness=1, lineType=8, shift=0)
-
-            # if animation is required, frames are attached in a sequence
-            # if not animation is required, older frames are removed
-            toPlot.append(frame)
-            if not animation: toPlot.pop(0)
-
-        for i in range(len(toPlot)):
-            if (i % 50) == 0:
-                figName = str(i) + '_scanPathEX.jpg'
-                scipy.misc.imsave(path + figName, toPlot[i])
+        render_scanpath(cv2.resize(stimulus, imgToPlot_size), SCANPATH, frame_writer(path, fps), putNumbers, putLines,
+                        animation)
 
         return
 
@@ -0,0 +1,175 @@
+import os
+import json
+import hashlib
+import numpy as np
+# keras is imported by the functions building the models, the features cache keys are computed without it
+
+
+# Only backbones the cnn towers keep frozen can be cached, cnn.image_resNet and cnn.map_resNet fine tune their
+# ResNet50 (only its input layer is frozen), so it is not cached
+BACKBONES = ('vgg16',)
+
+
+def backbone(name, width, height, depth):
+    """ This functions returns the frozen ImageNet backbone of the cnn towers with its pooled output - VGG16
+        followed by a global average pooling, as in cnn.image_vggNet and cnn.map_vggNet.
+        """
+    from keras.applications import VGG16
+    from keras.layers import GlobalAveragePooling2D
+    from keras.models import Model
+
+    inputShape = (height, width, depth)
+    if name == 'vgg16':
+        base_model = VGG16(weights='imagenet', include_top=False, input_shape=inputShape)
+        x = GlobalAveragePooling2D()(base_model.output)
+    else:
+        raise ValueError('Unknown backbone ' + str(name) + ', expected one of ' + ', '.join(BACKBONES))
+    model = Model(base_model.input, x)
+    for layer in model.layers:
+        layer.trainable = False
+
+    return model
+
+
+def feature_head(features_dim, name, trainable=True):
+    """ This functions returns the dense head of a vggNet tower, fed by the cached pooled backbone features
+        instead of the images.
+        trainable - False keeps the head frozen as cnn.image_vggNet does.
+        """
+    from keras.layers import Input, Dense, BatchNormalization
+    from keras.models import Model
+
+    chanDim = -1
+    inputs = Input(shape=(features_dim,), name=name + "_features")
+    x = Dense(512, activation='relu', name=name + "_dense_512")(inputs)
+    x = Dense(128, activation='relu', name=name + "_dense_128")(x)
+    x = BatchNormalization(axis=chanDim, name=name + "_batch_norm")(x)
+    model = Model(inputs, x)
+    for layer in model.layers:
+        layer.trainable = trainable
+
+    return model
+
+
+def content_key(inputs):
+    """ This functions returns the sha1 hex digest of the content of inputs - the data, indices, indptr and shape
+        of every sparse map of a list of maps or a SparseMapsBlock, or the values and shape of an array, so the same
+        inputs built twice have the same key.
+        """
+    import scipy.sparse
+    sha1 = hashlib.sha1()
+    if isinstance(inputs, (list, tuple)) or hasattr(inputs, 'indptr'):
+        sha1.update(('rows' + str(len(inputs))).encode())
+        for sample in inputs:
+            if scipy.sparse.issparse(sample):
+                # Copied as csr with sorted, summed indices, so equal maps have the same arrays
+                sample = scipy.sparse.csr_matrix(sample, copy=True)
+                sample.sum_duplicates()
+                sha1.update(('csr' + str(sample.shape) + str(sample.dtype)).encode())
+                for array in (sample.data, sample.indices.astype(np.int64), sample.indptr.astype(np.int64)):
+                    sha1.update(np.ascontiguousarray(array).tobytes())
+            else:
+                sample = np.ascontiguousarray(sample)
+                sha1.update(('array' + str(sample.shape) + str(sample.dtype)).encode())
+                sha1.update(sample.tobytes())
+    else:
+        inputs = np.ascontiguousarray(inputs)
+        sha1.update(('array' + str(inputs.shape) + str(inputs.dtype)).encode())
+        sha1.update(inputs.tobytes())
+
+    return sha1.hexdigest()
+
+
+class SampleFeatures:
+
+    def __init__(self, features, stimIndex):
+        """ The image features input of a set of samples - the backbone features of every stimulus and the stimIndex
+            of every sample, features are gathered per batch as SampleImages gathers the images.
+            """
+        self.features = features
+        self.stimIndex = np.asarray(stimIndex, dtype=np.int32)
+
+    @property
+    def shape(self):
+        return (len(self.stimIndex),) + self.features.shape[1:]
+
+    def __len__(self):
+        return len(self.stimIndex)
+
+    def __getitem__(self, key):
+        return np.asarray(self.features[self.stimIndex[key]])
+
+
+class FeatureCache:
+
+    def __init__(self, cache_dir, batch_size=32):
+        """ Pooled features of the frozen backbones, computed once and saved under cache_dir:
+                cache_dir/<backbone>/<key>.npy
+            Stimulus images features are computed once per stimulus (samples share them through their stimIndex),
+            maps features once per map. Models then train their heads only, on the memory mapped features.
+            """
+        self.cache_dir = cache_dir
+        self.batch_size = batch_size
+        self.backbones = {}
+
+    def feature_path(self, backbone_name, key):
+        return os.path.join(self.cache_dir, backbone_name, key + '.npy')
+
+    def backbone(self, backbone_name, shape):
+        # One backbone model per name and input shape, built on first use
+        if (backbone_name, shape) not in self.backbones:
+            self.backbones[(backbone_name, shape)] = backbone(backbone_name, shape[1], shape[0], shape[2])
+        return self.backbones[(backbone_name, shape)]
+
+    def features(self, images, backbone_name, key, transform=None):
+        """ This functions returns the (len(images), features) pooled backbone features of images (an array,
+            memory mapped block or SampleImages, float images in [0, 1]), computed once and memory mapped.
+            transform - applied to every batch of images before the backbone (DensifyBatch for sparse maps).
+            """
+        path = self.feature_path(backbone_name, key)
+        if not os.path.isfile(path):
+            print('Log..... Computing ' + backbone_name + ' features of ' + str(len(images)) + ' images')
+            model = None
+            features = []
+            for start in range(0, len(images), self.batch_size):
+                batch = images[start:start + self.batch_size]
+                batch = np.asarray(transform(batch) if transform is not None else batch, dtype=np.float32)
+                if model is None:
+                    model = self.backbone(backbone_name, tuple(batch.shape[1:]))
+                features.append(model.predict(batch))
+            features = np.concatenate(features).astype(np.float32)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Saved to a temporary file first so an interrupted run never leaves partial features
+            tmp_path = path[:-len('.npy')] + '.tmp.npy'
+            np.save(tmp_path, features)
+            os.replace(tmp_path, path)
+
+        return np.load(path, mmap_mode='r')
+
+    def stim_features(self, stim_images, backbone_name, normalize=True):
+        # Features of every stimulus of stim_images (StimulusImages), in stimIndex order
+        key = hashlib.sha1(json.dumps({'stimNames': list(stim_images.stimNames), 'size': list(stim_images.size),
+                                       'channels': int(stim_images.images.shape[3]), 'source': stim_images.source,
+                                       'normalize': bool(normalize)}).encode()).hexdigest()[:16]
+        return self.features(stim_images.gather(np.arange(len(stim_images.stimNames)), normalize), backbone_name,
+                             'stims_' + key)
+
+    def sample_features(self, inputs, backbone_name, transform=None):
+        """ This functions returns the features of every sample input (fixation maps, colored paths).
+            Inputs memory mapped from a materialized split are keyed by their file, others by their content.
+            transform - the batch transform of the input (DensifyBatch of sparse maps), part of the key.
+            """
+        filename = getattr(inputs, 'filename', None)
+        transformKey = json.dumps(vars(transform), sort_keys=True, default=str) if transform is not None else None
+        if filename is not None:
+            sha1 = hashlib.sha1(json.dumps({'file': os.path.abspath(filename), 'mtime': os.path.getmtime(filename),
+                                            'shape': list(inputs.shape), 'transform': transformKey}).encode())
+        else:
+            sha1 = hashlib.sha1((content_key(inputs) + str(transformKey)).encode())
+        return self.features(inputs, backbone_name, 'samples_' + sha1.hexdigest()[:16], transform)
+
+    def image_inputs(self, images, backbone_name):
+        # SampleFeatures in place of the SampleImages images input of a model
+        return SampleFeatures(self.stim_features(images.stim_images, backbone_name, images.normalize),
+                              images.stimIndex)
@@ -1,5 +1,4 @@
 import numpy
-from sklearn.utils import shuffle
 from matplotlib import pyplot as plt
 import pandas as pd
 import logging
@@ -10,6 +9,7 @@ from keras.layers import Dense, Conv2D , Flatten
 from tensorflow.keras import initializers
 from tensorflow.keras import regularizers
 from keras import backend as K
+from modules.models.training import fit_batches, predict_batches
 
 logger = logging.getLogger(__file__)
 
@@ -66,23 +66,13 @@ class BinaryNN:
         #valX = shuffle(valX, random_state=self.seed)
         #trainY = shuffle(trainY, random_state=123)
         #valY = shuffle(valY, random_state=1112)
-        # shuffle data
-        trainX, trainY = shuffle(trainX, trainY, random_state=self.seed)
-        valX, valY = shuffle(valX, valY, random_state=self.seed)
-
         # train the model
-        print("[INFO] training model...")
-        self.history = self.model.fit(
-            trainX, trainY,
-            validation_data=(valX, valY),
-            epochs=self.num_epochs, batch_size=self.batch_size)
+        self.history = fit_batches(self.model, [trainX], trainY,
+                                   [valX], valY, self.batch_size, self.num_epochs, self.seed)
 
     def test_model(self, testX, testY):
-        # shuffle data
-        testX, testY = shuffle(testX, testY, random_state=self.seed)
-
         print('[INFO] Evaluate on test data')
-        y_pred = self.model.predict(testX)
+        y_pred = predict_batches(self.model, [testX], self.batch_size)
         y_pred = y_pred.flatten()
         self.corr = numpy.corrcoef(y_pred, testY)
         print(self.corr)
@@ -1,5 +1,4 @@
 import numpy
-from sklearn.utils import shuffle
 from matplotlib import pyplot as plt
 import pandas as pd
 import logging
@@ -10,6 +9,8 @@ from keras.layers.core import Dropout
 from keras.models import Sequential
 from keras.layers import Dense, Conv2D, Flatten, BatchNormalization, MaxPool2D
 from keras import regularizers
+from modules.models.training import fit_batches, predict_batches
+from modules.models.input_pipeline import DensifyBatch
 
 logger = logging.getLogger(__file__)
 
@@ -34,6 +35,8 @@ class BinarySimpleCnn:
         self.loss_function = None
         self.stimType = 'Face'
         self.input_type = 'fixation-map'
+        # Sparse fixation maps are densified per batch at the model input size and channels
+        self.densify = DensifyBatch(self.stimSize, self.channel)
         self.datapath = "/export/home/DATA/schonberglab/pycharm_eyePredict/etp_data/processed/"
 
 
@@ -62,23 +65,14 @@ class BinarySimpleCnn:
         return
 
     def train_model(self, trainX, trainY, valX, valY):
-        # shuffle data
-        trainX, trainY = shuffle(trainX, trainY, random_state=self.seed)
-        valX, valY = shuffle(valX, valY, random_state=self.seed)
-
         # train the model
-        print("[INFO] training model...")
-        self.history = self.model.fit(
-            trainX, trainY,
-            validation_data=(valX, valY),
-            epochs=self.num_epochs, batch_size=self.batch_size)
+        self.history = fit_batches(self.model, [trainX], trainY,
+                                   [valX], valY, self.batch_size, self.num_epochs, self.seed,
+                                   transforms=[self.densify])
 
     def test_model(self, testX, testY):
-        # shuffle data
-        testX, testY = shuffle(testX, testY, random_state=self.seed)
-
         print('[INFO] Evaluate on test data')
-        y_pred = self.model.predict(testX)
+        y_pred = predict_batches(self.model, [testX], self.batch_size, transforms=[self.densify])
         corr = numpy.corrcoef(y_pred, testY)
         print(corr)
         #results = self.model.evaluate(testX, testY, batch_size=self.batch_size)
@@ -1,18 +1,18 @@
 import numpy
 from keras.layers import Dense, BatchNormalization
 from modules.models import cnn
-from sklearn.utils import shuffle
 from sklearn.metrics import roc_curve
 from sklearn.metrics import auc
 from matplotlib import pyplot as plt
 from keras.layers import concatenate
 from keras.models import Model
+from modules.models.training import fit_batches
+from modules.models.input_pipeline import DensifyBatch
 import pandas as pd
 import logging
 from keras import optimizers
 from keras import initializers
 import numpy
-from sklearn.utils import shuffle
 from matplotlib import pyplot as plt
 import pandas as pd
 import logging
@@ -46,6 +46,8 @@ class BinaryTwoStreamCnn:
         self.num_epochs = 100
         self.stimSize = stim_size
         self.num_class = 1
+        # Sparse fixation maps are densified per batch at the map model input size and channels
+        self.transforms = [DensifyBatch(self.stimSize, self.channel), None]
 
     def define_model(self):
         input_shape = (self.stimSize[1], self.stimSize[0], self.channel)
@@ -98,19 +100,13 @@ class BinaryTwoStreamCnn:
         return
 
     def train_model(self):
-        # shuffle data
-        trainMapsX, trainImagesX, trainY = shuffle(self.trainMapsX, self.trainImagesX, self.trainY, random_state=self.seed)
-        valMapsX, valImagesX, valY = shuffle(self.valMapsX, self.valImagesX, self.valY, random_state=self.seed)
-
         #trainY = to_categorical(trainY)
         #valY = to_categorical(valY)
 
         # train the model
-        print("[INFO] training model...")
-        self.history = self.model.fit(
-            [trainMapsX, trainImagesX], trainY,
-            validation_data=([valMapsX, valImagesX], valY),
-            epochs=self.num_epochs, batch_size=self.batch_size)
+        self.history = fit_batches(self.model, [self.trainMapsX, self.trainImagesX], self.trainY,
+                                   [self.valMapsX, self.valImagesX], self.valY, self.batch_size, self.num_epochs,
+                                   self.seed, transforms=self.transforms)
 
 
     def metrices(self, currpath):
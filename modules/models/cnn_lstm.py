@@ -4,10 +4,10 @@ from keras.layers import Dense
 from keras.layers import LSTM
 from keras.layers import TimeDistributed
 from modules.models import cnn
-from sklearn.utils import shuffle
 from sklearn.metrics import roc_curve
 from sklearn.metrics import auc
 from matplotlib import pyplot as plt
+from modules.models.training import fit_batches, evaluate_batches, predict_batches
 
 
 # CNN LSTM for sequence classification
@@ -45,16 +45,9 @@ class CnnLstm:
         return
 
     def train_model(self):
-        # shuffle data
-        print("[INFO] Shuffle dataset...")
-        trainPatchesX, trainY = shuffle(self.trainPatchesX, self.trainY, random_state=self.seed)
-        valPatchesX, valY = shuffle(self.valPatchesX,  self.valY, random_state=self.seed)
-
         # train the model
-        print("[INFO] training model...")
-        self.history = self.model.fit(trainPatchesX, trainY,
-            validation_data=(valPatchesX, valY),
-            epochs=self.num_epochs, batch_size=self.batch_size)
+        self.history = fit_batches(self.model, [self.trainPatchesX], self.trainY,
+                                   [self.valPatchesX], self.valY, self.batch_size, self.num_epochs, self.seed)
 
     def metrices(self, currpath):
         # plot metrics
@@ -79,15 +72,12 @@ class CnnLstm:
         fig.savefig(currpath + "/etp_data/processed/figs/" + self.run_name + "train_val_loss.pdf", bbox_inches='tight')
         plt.show()
 
-        # shuffle data
-        testPatchesX, testY = shuffle(self.testPatchesX, self.testY, random_state=self.seed)
-
         #model evaluate
-        results = self.model.evaluate(testPatchesX, testY, batch_size=self.batch_size)
+        results = evaluate_batches(self.model, [self.testPatchesX], self.testY, self.batch_size)
         print('test loss, test acc:', results)
         # make predictions on the testing data
-        predY = self.model.predict(testPatchesX).ravel()
-        fpr_keras, tpr_keras, thresholds_keras = roc_curve(testY, predY)
+        predY = predict_batches(self.model, [self.testPatchesX], self.batch_size).ravel()
+        fpr_keras, tpr_keras, thresholds_keras = roc_curve(self.testY, predY)
 
         auc_keras = auc(fpr_keras, tpr_keras)
 
@@ -3,12 +3,12 @@ from keras.layers import Dense
 from keras.layers import LSTM
 from keras.layers import TimeDistributed
 from modules.models import cnn
-from sklearn.utils import shuffle
 from sklearn.metrics import roc_curve
 from sklearn.metrics import auc
 from matplotlib import pyplot as plt
 from keras.layers import concatenate
 from keras.models import Model
+from modules.models.training import fit_batches, evaluate_batches
 from keras import optimizers
 
 
@@ -61,16 +61,10 @@ class CnnLstmImgConcat:
         return
 
     def train_model(self):
-        # shuffle data
-        trainPatchesX, trainImagesX, trainY = shuffle(self.trainPatchesX, self.trainImagesX, self.trainY, random_state=self.seed)
-        valPatchesX, valImagesX, valY = shuffle(self.valPatchesX, self.valImagesX, self.valY, random_state=self.seed)
-
         # train the model
-        print("[INFO] training model...")
-        self.history = self.model.fit(
-            [trainPatchesX, trainImagesX], trainY,
-            validation_data=([valPatchesX, valImagesX], valY),
-            epochs=self.num_epochs, batch_size=self.batch_size)
+        self.history = fit_batches(self.model, [self.trainPatchesX, self.trainImagesX], self.trainY,
+                                   [self.valPatchesX, self.valImagesX], self.valY, self.batch_size, self.num_epochs,
+                                   self.seed)
 
 
     def metrices(self, currpath):
@@ -96,18 +90,14 @@ class CnnLstmImgConcat:
         fig.savefig(currpath + "/etp_data/processed/figs/" + self.run_name + "train_val_loss.pdf", bbox_inches='tight')
         plt.show()
 
-        # shuffle data
-        testPatchesX, testImagesX, testY = shuffle(self.testPatchesX, self.testImagesX, self.testY, random_state=self.seed)
-
-
         # model evaluate
-        results = self.model.evaluate([testPatchesX, testImagesX], testY, batch_size=128)
+        results = evaluate_batches(self.model, [self.testPatchesX, self.testImagesX], self.testY, 128)
         print('test loss, test acc:', results)
 
         """
         # make predictions on the testing data
-        predY = self.model.predict([testPatchesX, testImagesX]).ravel()
-        fpr_keras, tpr_keras, thresholds_keras = roc_curve(testY, predY)
+        predY = predict_batches(self.model, [self.testPatchesX, self.testImagesX], 128).ravel()
+        fpr_keras, tpr_keras, thresholds_keras = roc_curve(self.testY, predY)
 
         auc_keras = auc(fpr_keras, tpr_keras)
 
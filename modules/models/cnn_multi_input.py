@@ -1,12 +1,14 @@
 import numpy
 from keras.layers import Dense, BatchNormalization
 from modules.models import cnn
-from sklearn.utils import shuffle
+from modules.models.backbone_features import feature_head
 from sklearn.metrics import roc_curve
 from sklearn.metrics import auc
 from matplotlib import pyplot as plt
 from keras.layers import concatenate
 from keras.models import Model
+from modules.models.training import fit_batches, evaluate_batches
+from modules.models.input_pipeline import DensifyBatch
 import pandas as pd
 import logging
 from keras import optimizers
@@ -17,7 +19,7 @@ logger = logging.getLogger(__file__)
 
 # CNN multi input
 class CnnMultiInput:
-    def __init__(self, seed, dataset, saliency, run_name, stim_size, run_number):
+    def __init__(self, seed, dataset, saliency, run_name, stim_size, run_number, feature_cache=None, backbone='vgg16'):
         # fix random seed for reproducibility
         numpy.random.seed(seed)
         self.trainMapsX, self.valMapsX, self.testMapsX, \
@@ -35,12 +37,31 @@ class CnnMultiInput:
         self.num_epochs = 100
         self.stimSize = stim_size
         self.num_class = 10
+        # With a FeatureCache the frozen backbones run once, on every stimulus and map, and only the towers heads
+        # are trained on the cached pooled features
+        self.feature_cache = feature_cache
+        self.backbone = backbone
+        # Sparse fixation maps are densified per batch at the map tower input size and channels
+        self.transforms = [DensifyBatch(self.stimSize, self.channel), None]
+        if self.feature_cache is not None:
+            self.trainMapsX, self.valMapsX, self.testMapsX = [
+                self.feature_cache.sample_features(mapsX, self.backbone, self.transforms[0])
+                for mapsX in (self.trainMapsX, self.valMapsX, self.testMapsX)]
+            self.trainImagesX, self.valImagesX, self.testImagesX = [
+                self.feature_cache.image_inputs(imagesX, self.backbone)
+                for imagesX in (self.trainImagesX, self.valImagesX, self.testImagesX)]
+            self.transforms = None
 
     def define_model(self):
         weightInit = initializers.RandomNormal(stddev=0.10, seed=self.seed)
         # create the two CNN models
-        cnn_map = cnn.map_vggNet(self.stimSize[0], self.stimSize[1], self.channel)
-        cnn_image = cnn.image_vggNet(self.stimSize[0], self.stimSize[1], self.channel)
+        if self.feature_cache is not None:
+            # heads of map_vggNet (trained) and image_vggNet (frozen) on the backbones features
+            cnn_map = feature_head(self.trainMapsX.shape[1], "map")
+            cnn_image = feature_head(self.trainImagesX.shape[1], "image", trainable=False)
+        else:
+            cnn_map = cnn.map_vggNet(self.stimSize[0], self.stimSize[1], self.channel)
+            cnn_image = cnn.image_vggNet(self.stimSize[0], self.stimSize[1], self.channel)
 
         # create the input to our final set of layers as the *output* of both CNNs
         combinedInput = concatenate([cnn_map.output, cnn_image.output])
@@ -62,19 +83,13 @@ class CnnMultiInput:
         return
 
     def train_model(self):
-        # shuffle data
-        trainMapsX, trainImagesX, trainY = shuffle(self.trainMapsX, self.trainImagesX, self.trainY, random_state=self.seed)
-        valMapsX, valImagesX, valY = shuffle(self.valMapsX, self.valImagesX, self.valY, random_state=self.seed)
-
         #trainY = to_categorical(trainY)
         #valY = to_categorical(valY)
 
         # train the model
-        print("[INFO] training model...")
-        self.history = self.model.fit(
-            [trainMapsX, trainImagesX], trainY,
-            validation_data=([valMapsX, valImagesX], valY),
-            epochs=self.num_epochs, batch_size=self.batch_size)
+        self.history = fit_batches(self.model, [self.trainMapsX, self.trainImagesX], self.trainY,
+                                   [self.valMapsX, self.valImagesX], self.valY, self.batch_size, self.num_epochs,
+                                   self.seed, transforms=self.transforms)
 
 
     def metrices(self, currpath):
@@ -100,21 +115,18 @@ class CnnMultiInput:
         fig.savefig(currpath + "/etp_data/processed/figs/" + str(self.run_number) + "_train_val_loss.pdf", bbox_inches='tight')
         plt.show()
 
-        # shuffle data
-        testMapsX, testImagesX, testY = shuffle(self.testMapsX, self.testImagesX, self.testY, random_state=self.seed)
-        # shuffle data
-        # testPatchesX, testY = shuffle(testPatchesX, testY, random_state=seed)
-
         # model evaluate
-        results = self.model.evaluate([testMapsX, testImagesX], testY, batch_size=None)
+        results = evaluate_batches(self.model, [self.testMapsX, self.testImagesX], self.testY, self.batch_size,
+                                   transforms=self.transforms)
         print('test loss, test acc:', results)
         results_df = pd.DataFrame(results, columns=[self.run_name + ", loss, acc"])
         results_df.to_csv(currpath + "/etp_data/processed/" + str(self.run_number) + "_results.csv", index=False)
 
         """
         # make predictions on the testing data
-        predY = self.model.predict([testMapsX, testImagesX]).ravel()
-        fpr_keras, tpr_keras, thresholds_keras = roc_curve(testY, predY)
+        predY = predict_batches(self.model, [self.testMapsX, self.testImagesX], self.batch_size,
+                                transforms=self.transforms).ravel()
+        fpr_keras, tpr_keras, thresholds_keras = roc_curve(self.testY, predY)
 
         auc_keras = auc(fpr_keras, tpr_keras)
 
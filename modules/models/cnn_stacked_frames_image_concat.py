@@ -1,12 +1,13 @@
 import numpy
 from keras.layers import Dense
 from modules.models import cnn
-from sklearn.utils import shuffle
+from modules.models.backbone_features import feature_head
 from sklearn.metrics import roc_curve
 from sklearn.metrics import auc
 from matplotlib import pyplot as plt
 from keras.layers import concatenate
 from keras.models import Model
+from modules.models.training import fit_batches, evaluate_batches
 import pandas as pd
 import logging
 from keras import optimizers
@@ -16,7 +17,8 @@ logger = logging.getLogger(__file__)
 
 # CNN multi input
 class CnnStackedFramesImageConcat:
-    def __init__(self, seed, dataset, saliency, run_name, stim_size, patch_size, run_number, num_patches):
+    def __init__(self, seed, dataset, saliency, run_name, stim_size, patch_size, run_number, num_patches,
+                 feature_cache=None, backbone='vgg16'):
         # fix random seed for reproducibility
         numpy.random.seed(seed)
         self.trainMapsX, self.valMapsX, self.testMapsX, \
@@ -39,11 +41,23 @@ class CnnStackedFramesImageConcat:
         self.lr = 0.0001
         self.momentum = 0.9
         self.decay_rate = self.lr / self.num_epochs
+        # With a FeatureCache the frozen image backbone runs once per stimulus, the image input is its cached
+        # pooled features
+        self.feature_cache = feature_cache
+        self.backbone = backbone
+        if self.feature_cache is not None:
+            self.trainImagesX, self.valImagesX, self.testImagesX = [
+                self.feature_cache.image_inputs(imagesX, self.backbone)
+                for imagesX in (self.trainImagesX, self.valImagesX, self.testImagesX)]
 
     def define_model(self):
         # create the two CNN models
         cnn_map = cnn.cnn_for_image_concat(self.patch_size, self.patch_size, self.channel * self.num_patches)
-        cnn_image = cnn.image_vggNet(self.stim_size[0], self.stim_size[1], self.channel)
+        if self.feature_cache is not None:
+            # image_vggNet head (frozen, as in image_vggNet) on the backbone features
+            cnn_image = feature_head(self.trainImagesX.shape[1], "image", trainable=False)
+        else:
+            cnn_image = cnn.image_vggNet(self.stim_size[0], self.stim_size[1], self.channel)
 
         # create the input to our final set of layers as the *output* of both CNNs
         combinedInput = concatenate([cnn_map.output, cnn_image.output])
@@ -65,19 +79,13 @@ class CnnStackedFramesImageConcat:
         return
 
     def train_model(self):
-        # shuffle data
-        trainMapsX, trainImagesX, trainY = shuffle(self.trainMapsX, self.trainImagesX, self.trainY, random_state=self.seed)
-        valMapsX, valImagesX, valY = shuffle(self.valMapsX, self.valImagesX, self.valY, random_state=self.seed)
-
         #trainY = to_categorical(trainY)
         #valY = to_categorical(valY)
 
         # train the model
-        print("[INFO] training model...")
-        self.history = self.model.fit(
-            [trainMapsX, trainImagesX], trainY,
-            validation_data=([valMapsX, valImagesX], valY),
-            epochs=self.num_epochs, batch_size=self.batch_size)
+        self.history = fit_batches(self.model, [self.trainMapsX, self.trainImagesX], self.trainY,
+                                   [self.valMapsX, self.valImagesX], self.valY, self.batch_size, self.num_epochs,
+                                   self.seed)
 
 
     def metrices(self, currpath):
@@ -103,13 +111,8 @@ class CnnStackedFramesImageConcat:
         fig.savefig(currpath + "/etp_data/processed/figs/" + str(self.run_number) + "_train_val_loss.pdf", bbox_inches='tight')
         plt.show()
 
-        # shuffle data
-        testMapsX, testImagesX, testY = shuffle(self.testMapsX, self.testImagesX, self.testY, random_state=self.seed)
-        # shuffle data
-        # testPatchesX, testY = shuffle(testPatchesX, testY, random_state=seed)
-
         # model evaluate
-        results = self.model.evaluate([testMapsX, testImagesX], testY, batch_size=None)
+        results = evaluate_batches(self.model, [self.testMapsX, self.testImagesX], self.testY, self.batch_size)
         print('test loss, test acc:', results)
         results_df = pd.DataFrame(results, columns=[self.run_name + ", loss, acc"])
         results_df.to_csv(currpath + "/etp_data/processed/" + str(self.run_number) + "_results.csv", index=False)
\ No newline at end of file
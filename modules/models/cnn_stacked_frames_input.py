@@ -1,7 +1,6 @@
 import numpy
 from keras.layers import Dense
 from modules.models import cnn
-from sklearn.utils import shuffle
 from sklearn.metrics import roc_curve
 from sklearn.metrics import auc
 from matplotlib import pyplot as plt
@@ -10,6 +9,7 @@ from keras.models import Model
 import pandas as pd
 import logging
 from keras import optimizers
+from modules.models.training import fit_batches, evaluate_batches
 
 logger = logging.getLogger(__file__)
 
@@ -60,19 +60,12 @@ class CnnStackedFrames:
         return
 
     def train_model(self):
-        # shuffle data
-        trainMapsX, trainImagesX, trainY = shuffle(self.trainMapsX, self.trainImagesX, self.trainY, random_state=self.seed)
-        valMapsX, valImagesX, valY = shuffle(self.valMapsX, self.valImagesX, self.valY, random_state=self.seed)
-
         #trainY = to_categorical(trainY)
         #valY = to_categorical(valY)
 
         # train the model
-        print("[INFO] training model...")
-        self.history = self.model.fit(
-            trainMapsX, trainY,
-            validation_data=(valMapsX, valY),
-            epochs=self.num_epochs, batch_size=self.batch_size)
+        self.history = fit_batches(self.model, [self.trainMapsX], self.trainY,
+                                   [self.valMapsX], self.valY, self.batch_size, self.num_epochs, self.seed)
 
 
     def metrices(self, currpath):
@@ -98,13 +91,8 @@ class CnnStackedFrames:
         fig.savefig(currpath + "/etp_data/processed/figs/" + str(self.run_number) + "_train_val_loss.pdf", bbox_inches='tight')
         plt.show()
 
-        # shuffle data
-        testMapsX, testImagesX, testY = shuffle(self.testMapsX, self.testImagesX, self.testY, random_state=self.seed)
-        # shuffle data
-        # testPatchesX, testY = shuffle(testPatchesX, testY, random_state=seed)
-
         # model evaluate
-        results = self.model.evaluate(testMapsX, testY, batch_size=None)
+        results = evaluate_batches(self.model, [self.testMapsX], self.testY, self.batch_size)
         print('test loss, test acc:', results)
         results_df = pd.DataFrame(results, columns=[self.run_name + ", loss, acc"])
         results_df.to_csv(currpath + "/etp_data/processed/" + str(self.run_number) + "_results.csv", index=False)
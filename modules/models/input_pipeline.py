@@ -0,0 +1,92 @@
+import numpy as np
+from keras.utils import Sequence
+from modules.data.padding import pad_sequences
+
+
+def take(x, index):
+    # Rows index of an input - arrays (memory mapped ones too) and SampleImages by fancy indexing, lists and
+    # RaggedBlock (variable length scanpaths, sparse maps) row by row
+    if isinstance(x, np.ndarray) or hasattr(x, 'stimIndex'):
+        return x[index]
+    return [x[i] for i in index]
+
+
+class PadBatch:
+
+    def __init__(self, maxlen=None, dtype='int32', padding='pre', truncating='pre'):
+        # Pads the variable length scanpaths of a batch, only the batch is ever held padded.
+        # maxlen None pads every batch to its longest scanpath (bucketed mode, for masked or variable length
+        # inputs), batches of length buckets then stay short
+        self.maxlen = maxlen
+        self.dtype = dtype
+        self.padding = padding
+        self.truncating = truncating
+
+    def __call__(self, batch):
+        return pad_sequences(batch, maxlen=self.maxlen, dtype=self.dtype, padding=self.padding,
+                             truncating=self.truncating)
+
+
+class DensifyBatch:
+
+    def __init__(self, size=None, channels=3):
+        """ Densifies the sparse fixation maps of a batch at the model input size (width, height) and channels,
+            only the batch is ever held dense. Dense batches (materialized dense maps, colored paths) are returned
+            as they are.
+            """
+        self.size = size
+        self.channels = channels
+
+    def __call__(self, batch):
+        import scipy.sparse
+        from modules.data.fixation_maps import densify
+        if isinstance(batch, np.ndarray) or not len(batch) or not scipy.sparse.issparse(batch[0]):
+            return batch
+        return densify(batch, size=self.size, channels=self.channels)
+
+
+def prefetch_args(workers=4, max_queue_size=8):
+    """ This functions returns the fit_generator / evaluate_generator / predict_generator arguments preparing the
+        next batches in workers threads while the model runs, at most max_queue_size batches are held ahead so the
+        memory used stays bounded whatever the dataset size.
+        Threads share the (memory mapped) inputs, nothing is copied to the workers.
+        """
+    return {'workers': workers, 'use_multiprocessing': False, 'max_queue_size': max_queue_size}
+
+
+class BatchSequence(Sequence):
+
+    def __init__(self, inputs, y, batch_size, transforms=None, order=None):
+        """ Keras input of a model fed by batches, read in the samples order.
+            inputs - list of the model inputs, arrays (memory mapped ones too), SampleImages, lists, RaggedBlock or
+            SparseMapsBlock, every input is indexed with the samples of a batch only, so images referenced by
+            stimIndex are gathered and memory mapped inputs are read per batch instead of held for all samples.
+            y - the labels, None for predictions.
+            transforms - per input a function applied to its batch (PadBatch, DensifyBatch) or None.
+            order - the samples indices in the order batches read them, np.concatenate(length_buckets(lengths))
+            batches scanpaths of similar lengths together for PadBatch(maxlen=None). The samples order by default.
+            """
+        self.inputs = inputs
+        self.y = y
+        self.batch_size = batch_size
+        self.transforms = transforms if transforms is not None else [None] * len(inputs)
+        self.order = np.arange(len(inputs[0]) if y is None else len(y)) if order is None else np.asarray(order)
+
+    def __len__(self):
+        return int(np.ceil(len(self.order) / float(self.batch_size)))
+
+    def batch_index(self, batch):
+        # Samples of a batch, in the batches order
+        return self.order[batch * self.batch_size:(batch + 1) * self.batch_size]
+
+    def __getitem__(self, batch):
+        batch_index = self.batch_index(batch)
+        batchX = []
+        for x, transform in zip(self.inputs, self.transforms):
+            batch_x = take(x, batch_index)
+            batchX.append(transform(batch_x) if transform is not None else batch_x)
+        if len(batchX) == 1:
+            batchX = batchX[0]
+        if self.y is None:
+            return batchX
+        return batchX, self.y[batch_index]
@@ -2,11 +2,11 @@ import numpy
 from keras.models import Sequential
 from keras.layers import Dense
 from keras.layers import LSTM
-from sklearn.utils import shuffle
 from sklearn.metrics import roc_curve
 from sklearn.metrics import auc
 from matplotlib import pyplot as plt
-from keras.preprocessing import sequence
+from modules.models.input_pipeline import PadBatch
+from modules.models.training import fit_batches, evaluate_batches, predict_batches
 
 
 # SIMPLE LSTM for sequence classification
@@ -23,11 +23,8 @@ class SimpleLstm:
         self.batch_size = 16
         self.num_epochs = 10
         self.max_review_length = 1500
-        self.trainScanpathX = sequence.pad_sequences(self.trainScanpathX, maxlen=self.max_review_length)
-        self.valScanpathX = sequence.pad_sequences(self.valScanpathX,
-                                                     maxlen=self.max_review_length)
-        self.testScanpathX = sequence.pad_sequences(self.testScanpathX,
-                                                     maxlen=self.max_review_length)
+        # Scanpaths are kept at their lengths and padded per batch
+        self.pad = PadBatch(self.max_review_length)
 
     def define_model(self):
         self.model = Sequential()
@@ -40,16 +37,10 @@ class SimpleLstm:
 
 
     def train_model(self):
-        # shuffle data
-        print("[INFO] Shuffle dataset...")
-        trainScanpathX, trainY = shuffle(self.trainScanpathX, self.trainY, random_state=self.seed)
-        valScanpathX, valY = shuffle(self.valScanpathX,  self.valY, random_state=self.seed)
-
         # train the model
-        print("[INFO] training model...")
-        self.history = self.model.fit(trainScanpathX, trainY,
-            validation_data=(valScanpathX, valY),
-            epochs=self.num_epochs, batch_size=self.batch_size)
+        self.history = fit_batches(self.model, [self.trainScanpathX], self.trainY,
+                                   [self.valScanpathX], self.valY, self.batch_size, self.num_epochs,
+                                   self.seed, transforms=[self.pad])
 
 
     def metrices(self, currpath):
@@ -75,15 +66,12 @@ class SimpleLstm:
         fig.savefig(currpath + "/etp_data/processed/figs/" + self.run_name + "train_val_loss.pdf", bbox_inches='tight')
         plt.show()
 
-        # shuffle data
-        testScanpathX, testY = shuffle(self.testScanpathX, self.testY, random_state=self.seed)
-
         #model evaluate
-        results = self.model.evaluate(testScanpathX, testY, batch_size=self.batch_size)
+        results = evaluate_batches(self.model, [self.testScanpathX], self.testY, self.batch_size, transforms=[self.pad])
         print('test loss, test acc:', results)
         # make predictions on the testing data
-        predY = self.model.predict(testScanpathX).ravel()
-        fpr_keras, tpr_keras, thresholds_keras = roc_curve(testY, predY)
+        predY = predict_batches(self.model, [self.testScanpathX], self.batch_size, transforms=[self.pad]).ravel()
+        fpr_keras, tpr_keras, thresholds_keras = roc_curve(self.testY, predY)
 
         auc_keras = auc(fpr_keras, tpr_keras)
 
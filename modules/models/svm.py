@@ -1,4 +1,4 @@
-from keras.preprocessing import sequence
+from modules.data.padding import pad_sequences
 from sklearn.model_selection import KFold
 from sklearn import svm
 import numpy
@@ -16,9 +16,8 @@ class SVM:
         self.batch_size = 16
         self.num_epochs = 1
         self.max_review_length = 1500
-        self.X = numpy.asanyarray(df.scanpath)
         self.y = numpy.asanyarray(df.binary_bid)
-        self.X = sequence.pad_sequences(self.X, maxlen=self.max_review_length)
+        self.X = pad_sequences(df.scanpath.tolist(), maxlen=self.max_review_length)
 
         dataset_size = len(self.X)
         self.X = self.X.reshape(dataset_size, -1)
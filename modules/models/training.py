@@ -0,0 +1,44 @@
+import numpy as np
+from modules.models.input_pipeline import BatchSequence, prefetch_args
+
+
+class ShuffledBatchSequence(BatchSequence):
+
+    def __init__(self, inputs, y, batch_size, seed, transforms=None):
+        """ BatchSequence of the train samples in a new order every epoch, the order is a permutation of the
+            samples indices, inputs are never copied.
+            """
+        super().__init__(inputs, y, batch_size, transforms)
+        self.random_state = np.random.RandomState(seed)
+        # The first epoch order is permuted as every next epoch order
+        self.on_epoch_end()
+
+    def batch_index(self, batch):
+        # Rows of a batch are read in file order, memory mapped inputs are read with fewer seeks
+        return np.sort(super().batch_index(batch))
+
+    def on_epoch_end(self):
+        # A new order array, batches still prepared by workers keep the order they started with
+        self.order = self.random_state.permutation(len(self.order))
+
+
+def fit_batches(model, trainX, trainY, valX, valY, batch_size, epochs, seed, transforms=None):
+    """ This functions trains model on batches of the train inputs (a list of model inputs), train samples are
+        shuffled through a permutation of their indices after every epoch, inputs are never copied.
+        Validation batches are read in order. Returns the keras history.
+        """
+    trainBatches = ShuffledBatchSequence(trainX, trainY, batch_size, seed, transforms=transforms)
+    valBatches = BatchSequence(valX, valY, batch_size, transforms=transforms)
+
+    print("[INFO] training model...")
+    return model.fit_generator(trainBatches, validation_data=valBatches, epochs=epochs, **prefetch_args())
+
+
+def evaluate_batches(model, testX, testY, batch_size, transforms=None):
+    # Test samples are evaluated in their order, shuffling them changes nothing in the results
+    return model.evaluate_generator(BatchSequence(testX, testY, batch_size, transforms=transforms), **prefetch_args())
+
+
+def predict_batches(model, testX, batch_size, transforms=None):
+    # Predictions in the samples order, so they line up with the unshuffled labels
+    return model.predict_generator(BatchSequence(testX, None, batch_size, transforms=transforms), **prefetch_args())
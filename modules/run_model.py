@@ -1,12 +1,35 @@
 from modules.data.datasets import DatasetBuilder
-#from modules.models.torch_nn import TorchNn
-from modules.models.binary_NN import BinaryNN
-from modules.models.linear_regression_torch import linearRegressionModel
-from modules.models.binary_simple_cnn import BinarySimpleCnn
 import datetime
+import os
+# The models (keras, torch) are imported by the run functions, so the experiment scheduler imports this module
+# without loading them
 
 
-datasetbuilder = DatasetBuilder()
+_datasetbuilder = None
+
+
+def dataset_builder():
+    # One DatasetBuilder per process, shared by all the runs of the process
+    global _datasetbuilder
+    if _datasetbuilder is None:
+        _datasetbuilder = DatasetBuilder()
+    return _datasetbuilder
+
+
+# Model inputs of every run, the experiment scheduler materializes their splits before the runs start
+RUN_INPUTS = {
+    'binary_nn': {'color_split': None, 'is_scanpath': True, 'is_fixation': False, 'is_coloredpath': False,
+                  'is_img': False},
+    'simple_cnn': {'color_split': 110, 'is_scanpath': True, 'is_fixation': False, 'is_coloredpath': False,
+                   'is_img': False},
+    'linear_reg_torch': {'color_split': None, 'is_scanpath': True, 'is_fixation': False, 'is_coloredpath': False,
+                         'is_img': False},
+}
+
+# Settings of the patches and colored path datasets of the split by subject runs
+PATCHES = {'num_patches': 30, 'patch_size': 60, 'saliency': False}
+COLORED_PATH = {'timePeriodMilisec': 0, 'colors_seed': 0}
+
 #stims_array, scanpath_df, fixation_df = datasetbuilder.processed_data_loader()
 #train, val, test = datasetbuilder.train_test_val_split(stimType, scanpath_df, fixation_df, seed)
 #train.reset_index(inplace=True)
@@ -27,23 +50,87 @@ testImg, testX, testY, stim_size = datasetbuilder.preper_data_for_model(test, st
                                                                   is_fixation=False,
                                                                   is_coloredpath=False, color_split=110, is_img=False)
 """
-def run_binary_nn_model(seed, stimType, bin_count, stims_array, scanpath_df, fixation_df):
+def bid_labels(bin_count):
+    # binary_bid, binary_bid_n and five_bins_bid label flags of the split by subject runs
+    if bin_count == 2:
+        return True, False, False
+    if bin_count == 5:
+        return False, False, True
+    raise ValueError('The split by subject runs have 2 or 5 bins labels, got ' + str(bin_count) + ' bins')
+
+
+def stim_size(stimType):
+    size = dataset_builder().get_stim_size(stimType)
+    return (size[0], size[1])
+
+
+# Split functions, called in the scheduler process with
+# (model, seed, stimType, bin_count, scanpath_lan, stims_array, scanpath_df, fixation_df), materialize the split of a
+# run and return its name in the split store. The run functions open it memory mapped in the worker processes.
+def model_run_split(model, seed, stimType, bin_count, scanpath_lan, stims_array, scanpath_df, fixation_df):
+    return dataset_builder().model_run_split(stims_array, scanpath_df, fixation_df, stimType, seed, scanpath_lan,
+                                             bin_count=bin_count, **RUN_INPUTS[model])
+
+
+def patches_split(model, seed, stimType, bin_count, scanpath_lan, stims_array, scanpath_df, fixation_df,
+                  stacked_frames=False):
+    datasetbuilder = dataset_builder()
+    scanpaths, images, labels, stim_size = datasetbuilder.load_scanpath_related_datasets(scanpath_df, stimType)
+    df = datasetbuilder.create_patches_dataset(os.getcwd(), scanpaths, images, labels, PATCHES['num_patches'],
+                                               PATCHES['patch_size'], PATCHES['saliency'])
+    dataset_params = {'num_patches': PATCHES['num_patches'], 'patch_size': PATCHES['patch_size'],
+                      'patch_source': 'saliency_fine_grained' if PATCHES['saliency'] else 'stims',
+                      'stacked_frames': stacked_frames}
+    if stacked_frames:
+        df = datasetbuilder.create_stacked_frames_dataset(df)
+    return datasetbuilder.stratify_by_subject_split(df, seed, False, True, False, *bid_labels(bin_count),
+                                                    dataset_params=dataset_params)
+
+
+def stacked_frames_split(model, seed, stimType, bin_count, scanpath_lan, stims_array, scanpath_df, fixation_df):
+    return patches_split(model, seed, stimType, bin_count, scanpath_lan, stims_array, scanpath_df, fixation_df,
+                         stacked_frames=True)
 
-    scanpath_lan = 3000
-    color_split = None
-    is_scanpath = True
-    is_fixation = False
-    is_coloredpath = False
-    is_img = False
 
+def scanpath_split(model, seed, stimType, bin_count, scanpath_lan, stims_array, scanpath_df, fixation_df):
+    datasetbuilder = dataset_builder()
+    scanpaths, images, labels, stim_size = datasetbuilder.load_scanpath_related_datasets(scanpath_df, stimType)
+    df = datasetbuilder.get_scanpath_for_simple_lstm(scanpaths, images, labels)
+    return datasetbuilder.stratify_by_subject_split(df, seed, False, False, False, *bid_labels(bin_count))
 
-    trainImg, trainX, trainY, valImg, valX, valY, stim_size = \
-        datasetbuilder.get_train_dev_data_for_model_run(stims_array, scanpath_df, fixation_df, stimType, seed, scanpath_lan, color_split,
-                                                                                       is_scanpath,
-                                                                                       is_fixation,
-                                                                                       is_coloredpath,
-                                                                                       is_img
-                                                        , bin_count)
+
+def svm_split(model, seed, stimType, bin_count, scanpath_lan, stims_array, scanpath_df, fixation_df):
+    if bin_count != 2:
+        raise ValueError('The svm run classifies binary bids, got ' + str(bin_count) + ' bins')
+    return scanpath_split(model, seed, stimType, bin_count, scanpath_lan, stims_array, scanpath_df, fixation_df)
+
+
+def fixations_split(model, seed, stimType, bin_count, scanpath_lan, stims_array, scanpath_df, fixation_df,
+                    colored_path=False):
+    datasetbuilder = dataset_builder()
+    maps, images, labels, stim_size = datasetbuilder.load_fixations_related_datasets(fixation_df, stimType)
+    scanpaths, images, labels, stim_size = datasetbuilder.load_scanpath_related_datasets(scanpath_df, stimType)
+    df = datasetbuilder.get_fixations_for_cnn(scanpaths, maps, images, labels)
+    dataset_params = {}
+    if colored_path:
+        colorpath = datasetbuilder.get_time_colored_dataset(df, stimType, COLORED_PATH['timePeriodMilisec'],
+                                                            COLORED_PATH['colors_seed'])
+        df['colored_path'] = colorpath.colored_path.values
+        dataset_params = dict(COLORED_PATH)
+    return datasetbuilder.stratify_by_subject_split(df, seed, not colored_path, False, colored_path,
+                                                    *bid_labels(bin_count), dataset_params=dataset_params)
+
+
+def colored_path_split(model, seed, stimType, bin_count, scanpath_lan, stims_array, scanpath_df, fixation_df):
+    return fixations_split(model, seed, stimType, bin_count, scanpath_lan, stims_array, scanpath_df, fixation_df,
+                           colored_path=True)
+
+
+# Run functions, called in the worker processes with (split name, seed, stimType, bin_count, scanpath_lan)
+def run_binary_nn_model(name, seed, stimType, bin_count, scanpath_lan=3000):
+    from modules.models.binary_NN import BinaryNN
+
+    trainImg, trainX, trainY, valImg, valX, valY, stim_size = dataset_builder().open_model_run_split(name, stimType)
 
     run_name = datetime.datetime.now()
     binary_nn = BinaryNN(seed, run_name, stim_size, scanpath_lan, stimType, bin_count)
@@ -58,20 +145,11 @@ def run_binary_nn_model(seed, stimType, bin_count, stims_array, scanpath_df, fix
     return
 
 
-def run_simple_cnn_model(seed, stimType):
-    scanpath_lan = None
-    color_split = 110
-    is_scanpath = True
-    is_fixation = False
-    is_coloredpath = False
-    is_img = False
+def run_simple_cnn_model(name, seed, stimType, bin_count, scanpath_lan=None):
+    from modules.models.binary_simple_cnn import BinarySimpleCnn
+    color_split = RUN_INPUTS['simple_cnn']['color_split']
 
-    trainImg, trainX, trainY, valImg, valX, valY, stim_size = \
-        datasetbuilder.get_train_dev_data_for_model_run(stimType, seed, scanpath_lan, color_split,
-                                                        is_scanpath,
-                                                        is_fixation,
-                                                        is_coloredpath,
-                                                        is_img)
+    trainImg, trainX, trainY, valImg, valX, valY, stim_size = dataset_builder().open_model_run_split(name, stimType)
 
     run_name = datetime.datetime.now()
     binary_simple_cnn = BinarySimpleCnn(seed, run_name, stim_size, color_split)
@@ -83,23 +161,10 @@ def run_simple_cnn_model(seed, stimType):
 
     return
 
-def run_linearRegTorch_model(seed, stimType, bin_count, stims_array, scanpath_df, fixation_df):
-
-    scanpath_lan = 300
-    color_split = None
-    is_scanpath = True
-    is_fixation = False
-    is_coloredpath = False
-    is_img = False
+def run_linearRegTorch_model(name, seed, stimType, bin_count, scanpath_lan=300):
+    from modules.models.linear_regression_torch import linearRegressionModel
 
-
-    trainImg, trainX, trainY, valImg, valX, valY, stim_size = \
-        datasetbuilder.get_train_dev_data_for_model_run(stims_array, scanpath_df, fixation_df, stimType, seed, scanpath_lan, color_split,
-                                                                                       is_scanpath,
-                                                                                       is_fixation,
-                                                                                       is_coloredpath,
-                                                                                       is_img
-                                                        , bin_count)
+    trainImg, trainX, trainY, valImg, valX, valY, stim_size = dataset_builder().open_model_run_split(name, stimType)
 
     run_name = datetime.datetime.now()
     linearReg = linearRegressionModel(seed, run_name, stim_size, scanpath_lan, stimType, bin_count)
@@ -111,14 +176,128 @@ def run_linearRegTorch_model(seed, stimType, bin_count, stims_array, scanpath_df
     return
 
 
+def run_cnn_lstm_model(name, seed, stimType, bin_count, scanpath_lan=None):
+    from modules.models.cnn_lstm import CnnLstm
+
+    split_dataset = dataset_builder().open_stratify_by_subject_split(name)
+    run_name = "_cnn_lstm_run_1_" + stimType
+    cnn_lstm = CnnLstm(seed, split_dataset, PATCHES['saliency'], PATCHES['patch_size'], run_name)
+    # Build train and evaluate model
+    cnn_lstm.define_model()
+    cnn_lstm.train_model()
+    cnn_lstm.metrices(os.getcwd())
+
+
+def run_cnn_lstm_img_concat_model(name, seed, stimType, bin_count, scanpath_lan=None):
+    from modules.models.cnn_lstm_img_concat import CnnLstmImgConcat
+
+    split_dataset = dataset_builder().open_stratify_by_subject_split(name)
+    run_name = "_cnn_lstm_vggnet_patchImage_" + stimType
+    cnn_lstm_img_concat = CnnLstmImgConcat(seed, split_dataset, PATCHES['saliency'], PATCHES['patch_size'], run_name,
+                                           stim_size(stimType))
+    # Build train and evaluate model
+    cnn_lstm_img_concat.define_model()
+    cnn_lstm_img_concat.train_model()
+    cnn_lstm_img_concat.metrices(os.getcwd())
+
+
+def run_simple_lstm_model(name, seed, stimType, bin_count, scanpath_lan=None):
+    from modules.models.simple_lstm import SimpleLstm
+
+    split_dataset = dataset_builder().open_stratify_by_subject_split(name)
+    run_name = "_simple_lstm_run_1_" + stimType
+    simple_lstm = SimpleLstm(seed, split_dataset, run_name)
+    # Build train and evaluate model
+    simple_lstm.define_model()
+    simple_lstm.train_model()
+    simple_lstm.metrices(os.getcwd())
+
+
+def run_cnn_multi_input_model(name, seed, stimType, bin_count, scanpath_lan=None):
+    from modules.models.cnn_multi_input import CnnMultiInput
+    from modules.models.backbone_features import FeatureCache
+
+    split_dataset = dataset_builder().open_stratify_by_subject_split(name)
+    run_name = "vggNet_biggerBatch64_" + stimType
+    # frozen VGG16 features of the stims and maps are computed once, only the heads are trained
+    feature_cache = FeatureCache(dataset_builder().datapath + "features/")
+    cnn_multi_input = CnnMultiInput(seed, split_dataset, False, run_name, stim_size(stimType),
+                                    datetime.datetime.now(), feature_cache)
+    # Build train and evaluate model
+    cnn_multi_input.define_model()
+    cnn_multi_input.train_model()
+    cnn_multi_input.metrices(os.getcwd())
+
+
+def run_cnn_stacked_frames_model(name, seed, stimType, bin_count, scanpath_lan=None):
+    from modules.models.cnn_stacked_frames_input import CnnStackedFrames
+
+    split_dataset = dataset_builder().open_stratify_by_subject_split(name)
+    run_name = "vgg16_stacked_frames_only" + stimType
+    cnn_stacked_frames = CnnStackedFrames(seed, split_dataset, PATCHES['saliency'], run_name, PATCHES['patch_size'],
+                                          datetime.datetime.now(), PATCHES['num_patches'])
+    # Build train and evaluate model
+    cnn_stacked_frames.define_model()
+    cnn_stacked_frames.train_model()
+    cnn_stacked_frames.metrices(os.getcwd())
+
+
+def run_cnn_stacked_frames_image_concat_model(name, seed, stimType, bin_count, scanpath_lan=None):
+    from modules.models.cnn_stacked_frames_image_concat import CnnStackedFramesImageConcat
+    from modules.models.backbone_features import FeatureCache
+
+    split_dataset = dataset_builder().open_stratify_by_subject_split(name)
+    run_name = "cnn_stacked_frames_vggNetImage_concat_" + stimType
+    feature_cache = FeatureCache(dataset_builder().datapath + "features/")
+    cnn_stacked_frames = CnnStackedFramesImageConcat(seed, split_dataset, PATCHES['saliency'], run_name,
+                                                     stim_size(stimType), PATCHES['patch_size'],
+                                                     datetime.datetime.now(), PATCHES['num_patches'], feature_cache)
+    # Build train and evaluate model
+    cnn_stacked_frames.define_model()
+    cnn_stacked_frames.train_model()
+    cnn_stacked_frames.metrices(os.getcwd())
+
+
+def run_svm_model(name, seed, stimType, bin_count, scanpath_lan=None):
+    import numpy as np
+    import pandas as pd
+    from modules.models.svm import SVM
+
+    trainX, valX, testX, trainImg, valImg, testImg, trainY, valY, testY = \
+        dataset_builder().open_stratify_by_subject_split(name)
+    # The svm cross validates on all the samples of the split
+    df = pd.DataFrame({'scanpath': list(trainX) + list(valX) + list(testX),
+                       'binary_bid': np.concatenate([trainY, valY, testY])})
+    run_name = "svm_run_" + stimType
+    svm = SVM(seed, df, run_name)
+    # Build train and evaluate model
+    svm.run_model()
+
+
+def run_binary_two_stream_model(name, seed, stimType, bin_count, scanpath_lan=None):
+    from modules.models.binary_two_stream_cnn import BinaryTwoStreamCnn
+
+    split_dataset = dataset_builder().open_stratify_by_subject_split(name)
+    run_name = "binary_simple_cnn_" + stimType
+    binary_two_stream_cnn = BinaryTwoStreamCnn(seed, split_dataset, False, run_name, stim_size(stimType),
+                                               datetime.datetime.now())
+    # Build train and evaluate model
+    binary_two_stream_cnn.define_model()
+    binary_two_stream_cnn.train_model()
+    binary_two_stream_cnn.metrices(os.getcwd())
+
+
 #2 bin -> 10 bin -> 5 bin -> 10 bin
 
-#seed = 1010
-stims_array, scanpath_df, fixation_df =  datasetbuilder.load_data_pickle()
-stimType = "Face"
+if __name__ == '__main__':
+    from modules.scheduler import ExperimentScheduler, experiment_grid
 
-#for bin_count in [2, 5, 10]:
-bin_count = 5
-for seed in range(20130, 20131):
+    datasetbuilder = dataset_builder()
+    #seed = 1010
+    #for bin_count in [2, 5, 10]:
     #run_binary_nn_model(seed, stimType, bin_count, stims_array, scanpath_df, fixation_df)
-    run_linearRegTorch_model(seed, stimType, bin_count, stims_array, scanpath_df, fixation_df)
\ No newline at end of file
+    grid = experiment_grid(models=['linear_reg_torch'], stimTypes=["Face"], bin_counts=[5],
+                           seeds=range(20130, 20131), scanpath_lans=[300])
+    scheduler = ExperimentScheduler(datasetbuilder.datapath + "runs/", datasetbuilder.experiment_workers,
+                                    datasetbuilder.worker_threads)
+    scheduler.run(grid)
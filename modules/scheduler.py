@@ -0,0 +1,177 @@
+import os
+import sys
+import json
+import time
+import itertools
+import traceback
+import contextlib
+import multiprocessing
+from modules import run_model
+
+
+# Grid model name -> (split function, run function) of run_model.
+# The split function runs in the scheduler process, materializes the split of the cell and returns its name, the run
+# function runs in a worker process with (split name, seed, stimType, bin_count, scanpath_lan) and memory maps it.
+# The split by subject runs (ported from main.py) label by bin_count (2 or 5 bins), their datasets do not depend on
+# scanpath_lan
+MODEL_RUNS = {
+    'binary_nn': (run_model.model_run_split, run_model.run_binary_nn_model),
+    'simple_cnn': (run_model.model_run_split, run_model.run_simple_cnn_model),
+    'linear_reg_torch': (run_model.model_run_split, run_model.run_linearRegTorch_model),
+    'cnn_lstm': (run_model.patches_split, run_model.run_cnn_lstm_model),
+    'cnn_lstm_img_concat': (run_model.patches_split, run_model.run_cnn_lstm_img_concat_model),
+    'simple_lstm': (run_model.scanpath_split, run_model.run_simple_lstm_model),
+    'cnn_multi_input': (run_model.colored_path_split, run_model.run_cnn_multi_input_model),
+    'cnn_stacked_frames': (run_model.stacked_frames_split, run_model.run_cnn_stacked_frames_model),
+    'cnn_stacked_frames_image_concat': (run_model.stacked_frames_split,
+                                        run_model.run_cnn_stacked_frames_image_concat_model),
+    'svm': (run_model.svm_split, run_model.run_svm_model),
+    'binary_two_stream_cnn': (run_model.fixations_split, run_model.run_binary_two_stream_model),
+}
+
+# Thread pools of the numeric libraries, limited in every worker so the workers do not oversubscribe the cores.
+# BLAS / OpenMP read them once, when numpy is first imported, so they are set before the workers start
+THREAD_ENV_VARS = ['OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'NUMEXPR_NUM_THREADS',
+                   'TF_NUM_INTRAOP_THREADS', 'TF_NUM_INTEROP_THREADS']
+
+
+def experiment_grid(models, stimTypes, bin_counts, seeds, scanpath_lans):
+    """ This functions returns the runs (cells) of the grid models x stimTypes x bin_counts x seeds x scanpath_lans,
+        one dict per run.
+        """
+    for model in models:
+        if model not in MODEL_RUNS:
+            raise ValueError('Unknown model ' + str(model) + ', expected one of ' + ', '.join(MODEL_RUNS))
+    return [{'model': model, 'stimType': stimType, 'bin_count': bin_count, 'seed': seed, 'scanpath_lan': scanpath_lan}
+            for model, stimType, bin_count, seed, scanpath_lan in
+            itertools.product(models, stimTypes, bin_counts, seeds, scanpath_lans)]
+
+
+def cell_name(cell):
+    return '_'.join([cell['model'], cell['stimType'], str(cell['bin_count']) + 'bins', 'seed' + str(cell['seed']),
+                     'len' + str(cell['scanpath_lan'])])
+
+
+@contextlib.contextmanager
+def thread_limits(threads):
+    """ Sets the thread pools variables to threads in this process environment while the block runs, processes
+        spawned in the block inherit them and start with their numeric libraries limited. The previous values
+        are restored on exit.
+        """
+    previous = {var: os.environ.get(var) for var in THREAD_ENV_VARS}
+    for var in THREAD_ENV_VARS:
+        os.environ[var] = str(threads)
+    try:
+        yield
+    finally:
+        for var, value in previous.items():
+            if value is None:
+                os.environ.pop(var, None)
+            else:
+                os.environ[var] = value
+
+
+def run_cell(cell):
+    """ This functions runs one cell of the grid in the worker process and returns the cell with its status, and
+        the traceback when it failed.
+        """
+    start = time.time()
+    try:
+        # The worker only opens the split materialized for the cell, memory mapped
+        MODEL_RUNS[cell['model']][1](cell['split'], cell['seed'], cell['stimType'], cell['bin_count'],
+                                     cell['scanpath_lan'])
+        status = {'status': 'done'}
+    except Exception:
+        status = {'status': 'failed', 'error': traceback.format_exc()}
+    finally:
+        # Graphs of the finished run are released before the next run of the worker
+        if 'keras' in sys.modules:
+            sys.modules['keras'].backend.clear_session()
+    status['seconds'] = time.time() - start
+
+    return dict(cell, **status)
+
+
+class ExperimentScheduler:
+
+    def __init__(self, runs_dir, n_workers=1, threads_per_worker=1):
+        """ Runs the cells of an experiment grid in n_workers processes, every worker limited to
+            threads_per_worker threads.
+            A finished run is recorded as runs_dir/<cell name>.json, recorded runs are skipped, so an
+            interrupted or extended grid only runs its missing cells.
+            """
+        self.runs_dir = runs_dir
+        self.n_workers = n_workers
+        self.threads_per_worker = threads_per_worker
+
+    def record_path(self, cell):
+        return os.path.join(self.runs_dir, cell_name(cell) + '.json')
+
+    def is_done(self, cell):
+        return os.path.isfile(self.record_path(cell))
+
+    def pending(self, cells):
+        return [cell for cell in cells if not self.is_done(cell)]
+
+    def record(self, result):
+        if not os.path.isdir(self.runs_dir):
+            os.makedirs(self.runs_dir, exist_ok=True)
+        # Written to a temporary file first so an interrupted run is never recorded as done
+        tmp_path = self.record_path(result) + '.tmp'
+        with open(tmp_path, 'w') as recordFile:
+            json.dump(result, recordFile, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.record_path(result))
+
+    @staticmethod
+    def materialize_splits(cells, data):
+        """ This functions materializes the split of every distinct data cell (split function and model inputs,
+            stimType, seed, scanpath_lan, bin_count) once, in this process, and returns the cells with the name of
+            their split, the runs memory map them.
+            """
+        stims_array, scanpath_df, fixation_df = data
+        materialized = {}
+        split_cells = []
+        for cell in cells:
+            split_function = MODEL_RUNS[cell['model']][0]
+            key = (split_function.__name__, json.dumps(run_model.RUN_INPUTS.get(cell['model']), sort_keys=True),
+                   cell['stimType'], cell['seed'], cell['scanpath_lan'], cell['bin_count'])
+            if key not in materialized:
+                materialized[key] = split_function(cell['model'], cell['seed'], cell['stimType'], cell['bin_count'],
+                                                   cell['scanpath_lan'], stims_array, scanpath_df, fixation_df)
+            split_cells.append(dict(cell, split=materialized[key]))
+
+        return split_cells
+
+    def run(self, cells, data=None):
+        """ This functions runs the cells not recorded yet and returns the status of every run.
+            data - the (stims_array, scanpath_df, fixation_df) the splits are built from, the processed data by
+            default.
+            """
+        cells = list(cells)
+        pending = self.pending(cells)
+        print('Log..... ' + str(len(cells) - len(pending)) + ' runs already done, running ' + str(len(pending)) +
+              ' runs with ' + str(self.n_workers) + ' workers')
+        if not pending:
+            return []
+
+        if data is None:
+            data = run_model.dataset_builder().processed_data_loader()
+        pending = self.materialize_splits(pending, data)
+
+        # Fresh (spawned) workers, started with the thread limits in their environment before they import numpy
+        context = multiprocessing.get_context('spawn')
+        results = []
+        # Kept set while the pool runs, so workers the pool starts again are limited too
+        with thread_limits(self.threads_per_worker), \
+                context.Pool(processes=min(self.n_workers, len(pending))) as pool:
+            # Runs are recorded as soon as they finish, whatever the order they finish in
+            for result in pool.imap_unordered(run_cell, pending):
+                print('Log..... ' + cell_name(result) + ' ' + result['status'] + ' in ' +
+                      str(round(result['seconds'], 1)) + 's')
+                if result['status'] == 'done':
+                    self.record(result)
+                else:
+                    print(result['error'])
+                results.append(result)
+
+        return results
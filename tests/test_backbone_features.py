@@ -0,0 +1,41 @@
+import numpy as np
+import scipy.sparse
+from modules.models.backbone_features import content_key
+from modules.data.split_store import SplitStore, SparseMapsBlock
+
+
+def fixation_maps(seed, n_maps=5):
+    rng = np.random.RandomState(seed)
+    return [scipy.sparse.random(30, 40, density=0.05, format='csr', random_state=rng) for _ in range(n_maps)]
+
+
+def test_same_sparse_maps_built_twice_have_the_same_key():
+    assert content_key(fixation_maps(0)) == content_key(fixation_maps(0))
+
+
+def test_other_sparse_maps_have_another_key():
+    assert content_key(fixation_maps(0)) != content_key(fixation_maps(1))
+    assert content_key(fixation_maps(0)) != content_key(fixation_maps(0, n_maps=4))
+
+
+def test_sparse_maps_block_keyed_by_its_maps(tmp_path):
+    store = SplitStore(str(tmp_path))
+    for name in ('first', 'second'):
+        store.write(name, {'train': {'inputs': fixation_maps(0)}})
+    blocks = [store.read(name)[1]['train']['inputs'] for name in ('first', 'second')]
+    assert isinstance(blocks[0], SparseMapsBlock)
+    assert content_key(blocks[0]) == content_key(blocks[1]) == content_key(fixation_maps(0))
+
+
+def test_empty_sparse_maps_blocks_have_the_same_key():
+    def empty_block():
+        return SparseMapsBlock(np.empty(0), np.empty(0, dtype=np.int32), np.zeros(1, dtype=np.int64),
+                               np.empty((0, 2), dtype=np.int64))
+
+    assert content_key(empty_block()) == content_key(empty_block())
+
+
+def test_arrays_keyed_by_values_and_shape():
+    values = np.arange(24, dtype=np.float32)
+    assert content_key(values.reshape(2, 12)) == content_key(values.copy().reshape(2, 12))
+    assert content_key(values.reshape(2, 12)) != content_key(values.reshape(3, 8))
@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('keras')
+
+from modules.data.padding import length_buckets, pad_sequences
+from modules.models.input_pipeline import BatchSequence, PadBatch
+
+
+def scanpaths(lengths):
+    return [np.ones((length, 2)) for length in lengths]
+
+
+def test_pad_batch_to_fixed_length():
+    assert PadBatch(6)(scanpaths([2, 4])).shape == (2, 6, 2)
+
+
+def test_pad_batch_to_longest_sequence_of_the_batch():
+    batch = scanpaths([2, 4])
+    padded = PadBatch()(batch)
+    assert padded.shape == (2, 4, 2)
+    assert np.array_equal(padded, pad_sequences(batch, maxlen=4))
+
+
+def test_bucketed_batches_pad_to_their_bucket_length():
+    lengths = [5, 1, 9, 2, 8, 3, 7, 4]
+    labels = np.arange(len(lengths))
+    order = np.concatenate(length_buckets(lengths, n_buckets=4))
+    batches = BatchSequence([scanpaths(lengths)], labels, 2, transforms=[PadBatch()], order=order)
+    assert len(batches) == 4
+    assert [batches[batch][0].shape[1] for batch in range(len(batches))] == [2, 4, 7, 9]
+    assert sorted(np.concatenate([batches[batch][1] for batch in range(len(batches))])) == labels.tolist()
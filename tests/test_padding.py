@@ -0,0 +1,40 @@
+import numpy as np
+from modules.data.padding import pad_sequences, length_buckets, pad_buckets
+
+
+def scanpaths(lengths):
+    return [np.arange(1, 2 * length + 1).reshape(length, 2) for length in lengths]
+
+
+def test_pad_sequences_pre_and_post():
+    sequences = scanpaths([1, 3])
+    pre = pad_sequences(sequences, maxlen=4)
+    assert pre.shape == (2, 4, 2)
+    assert np.array_equal(pre[0], [[0, 0], [0, 0], [0, 0], [1, 2]])
+    post = pad_sequences(sequences, maxlen=4, padding='post')
+    assert np.array_equal(post[1], [[1, 2], [3, 4], [5, 6], [0, 0]])
+
+
+def test_pad_sequences_truncates_and_masks():
+    padded, mask = pad_sequences(scanpaths([3]), maxlen=2, truncating='post', return_mask=True)
+    assert np.array_equal(padded[0], [[1, 2], [3, 4]])
+    assert mask.tolist() == [[True, True]]
+    padded, mask = pad_sequences(scanpaths([1]), maxlen=3, return_mask=True)
+    assert mask.tolist() == [[False, False, True]]
+
+
+def test_length_buckets_groups_similar_lengths():
+    buckets = length_buckets([5, 1, 9, 2, 8, 3, 7, 4], n_buckets=4)
+    assert [bucket.tolist() for bucket in buckets] == [[1, 3], [5, 7], [0, 6], [4, 2]]
+    assert len(length_buckets([1, 2], n_buckets=4)) == 2
+
+
+def test_pad_buckets_pads_every_bucket_to_its_longest_sequence():
+    lengths = [5, 1, 9, 2, 8, 3, 7, 4]
+    sequences = scanpaths(lengths)
+    buckets = pad_buckets(sequences, n_buckets=4, maxlen=8)
+    assert [padded.shape[1] for indices, padded in buckets] == [2, 4, 7, 8]
+    for indices, padded in buckets:
+        assert np.array_equal(padded, pad_sequences([sequences[i] for i in indices], maxlen=padded.shape[1]))
+    indices, padded, mask = pad_buckets(sequences, n_buckets=2, return_mask=True)[0]
+    assert mask.sum(axis=1).tolist() == [lengths[i] for i in indices]
@@ -0,0 +1,42 @@
+import numpy as np
+from modules.data.colored_path import colored_path
+from modules.data.scanpath_animation import render_scanpath
+
+# Scanpath datapoints are (timeStamp, x, y) rows, drawings read (x, y) from the last two columns.
+# A line from (10, 40) to (50, 40) on an 80 x 60 stim, the timeStamps 0 and 1 would draw it along the left border
+SCANPATH = np.array([[0, 10, 40], [1, 50, 40]])
+STIM_SIZE = [80, 60]
+
+
+class FramesWriter:
+
+    def __init__(self):
+        self.frames = []
+
+    def write(self, frame_number, frame):
+        self.frames.append(np.array(frame))
+
+    def close(self):
+        return
+
+
+def test_colored_path_draws_the_x_y_columns():
+    canvas = colored_path(SCANPATH, STIM_SIZE, 0, 'sample')
+    assert canvas.shape == (60, 80, 3)
+    assert canvas[40, 30].any()
+    assert not canvas[:, :5].any()
+    assert not canvas[:30].any()
+
+
+def test_colored_path_of_x_y_points_is_the_same():
+    assert np.array_equal(colored_path(SCANPATH[:, 1:], STIM_SIZE, 0, 'sample'),
+                          colored_path(SCANPATH, STIM_SIZE, 0, 'sample'))
+
+
+def test_render_scanpath_draws_the_x_y_columns():
+    writer = FramesWriter()
+    image = np.full((60, 80, 3), 255, dtype=np.uint8)
+    render_scanpath(image, SCANPATH, writer, putNumbers=False, animation=False)
+    frame = writer.frames[-1]
+    assert frame[40, 30].tolist() == [0, 0, 255]
+    assert (frame[:30, :5] == 255).all()
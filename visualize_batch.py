@@ -0,0 +1,30 @@
+import argparse
+from modules.data.datasets import DatasetBuilder
+from modules.data.vis_batch import BatchVisualizer, VIS_KINDS
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Render the fixation maps, heatmaps and scanpaths of many samples')
+    parser.add_argument('--stimType', default=None, help='visualize the samples of this stim type (Face / Snack)')
+    parser.add_argument('--sampleIds', nargs='+', default=None, help='visualize these samples only')
+    parser.add_argument('--kinds', nargs='+', default=list(VIS_KINDS), choices=VIS_KINDS)
+    parser.add_argument('--scanpath_format', default='.mp4',
+                        help='.mp4, .avi, .gif or "" for a directory of frames per sample')
+    parser.add_argument('--no_animation', action='store_true', help='save the final scanpath frame only')
+    parser.add_argument('--workers', type=int, default=None, help='rendering processes, render_workers by default')
+    parser.add_argument('--dest', default=None, help='output directory, etp_data/visualized_data/ by default')
+    args = parser.parse_args()
+
+    datasetbuilder = DatasetBuilder()
+    stims_array, scanpath_df, fixation_df = datasetbuilder.processed_data_loader()
+    visualizer = BatchVisualizer(datasetbuilder.imgpath, "Stim_0/",
+                                 args.dest or datasetbuilder.imgpath + "visualized_data/", stims_array,
+                                 datasetbuilder.stim_cache.cache_dir,
+                                 args.workers or datasetbuilder.render_workers)
+    written = visualizer.run(fixation_df, scanpath_df, args.stimType, args.sampleIds, args.kinds,
+                             args.scanpath_format, not args.no_animation)
+    print('Log..... Wrote ' + str(len(written)) + ' visualizations')
+
+
+if __name__ == '__main__':
+    main()